@@ -0,0 +1,320 @@
+# accounts.py
+"""
+Many Dexcom Share accounts in one process. Each account keeps its own
+GlucoseEngine (session, last reading, formatter) and PollScheduler, but all
+of them share one pooled HTTP session, one scheduler thread and a small,
+fixed set of fetch threads, so the cost per extra account is its state, not
+a thread or a connection pool.
+
+The scheduler keeps a heap of (due time, account). Each account's next poll
+comes from its own PollScheduler, so polls line up with that sensor's
+reading phase and spread out across the 5-minute cycle by themselves; the
+first polls are staggered over `first_poll_spread` seconds.
+
+With backend="asyncio" the fetch threads are replaced by one event loop
+(async_client.py): up to `max_workers` polls are in flight at once, each is
+cancelled after `poll_timeout` seconds, and removing an account cancels its
+poll if one is running.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import GlucoseEngine
+from scheduler import PollScheduler
+from session_manager import SessionManager
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_FIRST_POLL_SPREAD = 30.0
+DEFAULT_POLL_TIMEOUT = 60.0
+
+
+class Account:
+    """Per-account state: engine, poll timing and last title."""
+
+    __slots__ = ("key", "engine", "poller", "due", "text", "polls", "removed", "task")
+
+    def __init__(self, key, engine, poller):
+        self.key = key
+        self.engine = engine
+        self.poller = poller
+        self.due = None
+        self.text = None
+        self.polls = 0
+        self.removed = False
+        self.task = None  # in-flight poll (asyncio backend)
+
+
+class MultiAccountEngine:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, base_url=None, http_session=None,
+                 first_poll_spread=DEFAULT_FIRST_POLL_SPREAD, clock=time.time, poller_factory=PollScheduler,
+                 style_settings=None, preferences=None, backend="threads", poll_timeout=DEFAULT_POLL_TIMEOUT):
+        # Fetch threads, or with the asyncio backend, polls in flight at once.
+        self.max_workers = max_workers
+        self.base_url = base_url
+        self.backend = backend
+        self.poll_timeout = poll_timeout
+        if backend not in ("threads", "asyncio"):
+            raise ValueError(f"unknown backend {backend!r}")
+        if backend == "asyncio":
+            from async_client import AsyncSession, LoopThread
+            self._loop = LoopThread(name="dexcom-accounts-loop")
+            if http_session is None:
+                http_session = AsyncSession(pool_size=max_workers)
+        elif http_session is None:
+            # The process-wide pooled session; size its pool to at least max_workers.
+            from http_pool import DEFAULT_POOL_SIZE, configure_shared_session
+            http_session = configure_shared_session(pool_size=max(DEFAULT_POOL_SIZE, max_workers))
+        self.http_session = http_session
+        self.first_poll_spread = first_poll_spread
+        self.clock = clock
+        self.poller_factory = poller_factory
+        self.style_settings = style_settings
+        self.preferences = preferences
+        self.accounts = {}
+        self._heap = []
+        self._order = itertools.count()  # tie-breaker so the heap never compares accounts
+        self._cond = threading.Condition()
+        self._executor = None
+        self._thread = None
+        # asyncio backend: set on the loop to wake the scheduler coroutine.
+        self._wakeup = None
+        self._limit = None
+        self._scheduler = None
+        self._stopped = False
+        self._subscribers = []
+        self.stats = {"polls": 0, "errors": 0, "accounts_added": 0, "accounts_removed": 0}
+
+    # --- accounts ---
+
+    def add_account(self, key, username, password, region="us", **engine_kwargs):
+        """Start polling an account. `key` is any hashable id; returns its Account."""
+        engine_kwargs.setdefault("style_settings", self.style_settings)
+        engine_kwargs.setdefault("preferences", self.preferences)
+        # No per-account refresh thread: an expired session is renewed on the poll itself.
+        engine_kwargs.setdefault("sessions", SessionManager(auto_refresh=False))
+        engine = GlucoseEngine(username=username, password=password, region=region, base_url=self.base_url,
+                               http_session=self.http_session, **engine_kwargs)
+        engine.subscribe(lambda text, key=key: self._publish(key, text))
+        # Retries after errors follow the account's breaker, jittered, so accounts
+        # that failed together (a Share outage) do not retry in lockstep.
+        account = Account(key, engine, self.poller_factory(clock=self.clock, breaker=engine.breaker))
+        with self._cond:
+            if key in self.accounts:
+                raise ValueError(f"account {key!r} already added")
+            self.accounts[key] = account
+            self.stats["accounts_added"] += 1
+            # Spread first polls so adding many accounts at once is not one burst.
+            offset = (len(self.accounts) - 1) % max(1, int(self.first_poll_spread * 10)) / 10.0
+            self._schedule(account, self.clock() + offset)
+        return account
+
+    def remove_account(self, key):
+        with self._cond:
+            account = self.accounts.pop(key, None)
+            if account is None:
+                return False
+            account.removed = True
+            self.stats["accounts_removed"] += 1
+            self._cond.notify()
+            task = account.task
+        if task is not None:
+            self._loop.call_soon(task.cancel)
+        account.engine.sessions.stop()
+        return True
+
+    def subscribe(self, callback):
+        """Register callback(key, display_text), called after every poll."""
+        self._subscribers.append(callback)
+
+    def _publish(self, key, text):
+        for callback in list(self._subscribers):
+            try:
+                callback(key, text)
+            except Exception as e:
+                logging.error("Display subscriber failed: %s", e)
+
+    # --- scheduling ---
+
+    def _schedule(self, account, due):
+        # Caller holds the condition.
+        account.due = due
+        heapq.heappush(self._heap, (due, next(self._order), account))
+        self._cond.notify()
+        if self._wakeup is not None:
+            self._loop.call_soon(self._wakeup.set)
+
+    def next_due_in(self):
+        with self._cond:
+            self._drop_removed()
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - self.clock())
+
+    def _drop_removed(self):
+        while self._heap and self._heap[0][2].removed:
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and (self._heap[0][2].removed or self._heap[0][0] <= now):
+            _, _, account = heapq.heappop(self._heap)
+            if not account.removed:
+                due.append(account)
+        return due
+
+    def poll(self, account):
+        """Poll one account now, then reschedule it. Runs on a fetch thread."""
+        ok = False
+        try:
+            account.text = account.engine.tick()
+            ok = account.engine.last_fetch_ok
+            account.poller.observe(account.engine.current_timestamp, ok=ok)
+        except Exception as e:
+            logging.error("Poll failed for %s: %s", account.key, e)
+        self._reschedule(account, ok)
+
+    async def poll_async(self, account):
+        """poll() for the asyncio backend; at most max_workers run at once."""
+        ok = False
+        try:
+            async with self._limit:
+                account.text = await asyncio.wait_for(account.engine.tick_async(), self.poll_timeout)
+            ok = account.engine.last_fetch_ok
+            account.poller.observe(account.engine.current_timestamp, ok=ok)
+        except asyncio.CancelledError:
+            if account.removed:
+                return
+            raise
+        except asyncio.TimeoutError:
+            logging.error("Poll timed out for %s", account.key)
+        except Exception as e:
+            logging.error("Poll failed for %s: %s", account.key, e)
+        finally:
+            account.task = None
+        self._reschedule(account, ok)
+
+    def _reschedule(self, account, ok):
+        now = self.clock()
+        try:
+            delay = account.poller.next_delay(now)
+        except Exception as e:
+            logging.error("Poll scheduler error for %s: %s", account.key, e)
+            delay = account.poller.interval
+        with self._cond:
+            account.polls += 1
+            self.stats["polls"] += 1
+            self.stats["errors"] += int(not ok)
+            if not account.removed:
+                self._schedule(account, now + delay)
+
+    def run_due(self, now=None):
+        """Poll every account that is due and wait for the polls. Returns how many were polled."""
+        with self._cond:
+            due = self._pop_due(self.clock() if now is None else now)
+        if self.backend == "asyncio":
+            self.run_async(self._poll_all(due))
+        else:
+            for account in due:
+                self.poll(account)
+        return len(due)
+
+    def run_async(self, coro, timeout=None):
+        """Run a coroutine on the asyncio backend's loop and wait for it."""
+        self._ensure_loop()
+        return self._loop.run(coro, timeout)
+
+    async def _poll_all(self, accounts):
+        await asyncio.gather(*(self._spawn(account) for account in accounts), return_exceptions=True)
+
+    def _spawn(self, account):
+        # Loop thread only.
+        account.task = asyncio.ensure_future(self.poll_async(account))
+        return account.task
+
+    def _ensure_loop(self):
+        loop = self._loop.start()
+        if self._limit is None:
+            async def init():
+                self._limit = asyncio.Semaphore(self.max_workers)
+                self._wakeup = asyncio.Event()
+            asyncio.run_coroutine_threadsafe(init(), loop).result()
+        return loop
+
+    def start(self):
+        if self.backend == "asyncio":
+            with self._cond:
+                if self._scheduler is not None and not self._scheduler.done():
+                    return
+                self._stopped = False
+            self._ensure_loop()
+            self._scheduler = self._loop.submit(self._run_async())
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dexcom-accounts")
+            self._thread = threading.Thread(target=self._run, name="dexcom-accounts-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+        if self.backend == "asyncio":
+            # Idle connections belong to this loop; close them before it goes.
+            self._loop.call_soon(self.http_session.close)
+            self._loop.stop()
+            self._limit = self._wakeup = self._scheduler = None
+        for account in list(self.accounts.values()):
+            account.engine.sessions.stop()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    self._drop_removed()
+                    timeout = None
+                    if self._heap:
+                        timeout = self._heap[0][0] - self.clock()
+                        if timeout <= 0:
+                            break
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                due = self._pop_due(self.clock())
+                executor = self._executor
+            try:
+                for account in due:
+                    executor.submit(self.poll, account)
+            except RuntimeError:
+                # stop() shut the executor down meanwhile.
+                return
+
+    async def _run_async(self):
+        # The scheduler on the event loop: sleep until the earliest due time
+        # (or a wakeup from _schedule), then start those polls as tasks.
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                self._drop_removed()
+                timeout = self._heap[0][0] - self.clock() if self._heap else None
+                due = self._pop_due(self.clock()) if timeout is not None and timeout <= 0 else []
+                self._wakeup.clear()
+            for account in due:
+                self._spawn(account)
+            if due:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -1,24 +1,30 @@
 # app.py
 import rumps
-import threading
 import logging
 import os
-import json
+import threading
 import time
-import subprocess
-import re
-import urllib.request
-import urllib.error
 
 from Cocoa import (
     NSApplication, NSApplicationActivationPolicyAccessory, NSOperationQueue,
 )
-from pydexcom import Dexcom
-from pydexcom.errors import AccountError
-
-from dialogs import get_credentials, get_style_settings, get_preferences, show_text_window, show_account_info
-from settings import load_settings, save_settings, DEFAULT_SETTINGS, get_settings_dir
+# dialogs (AppKit views), subprocess, pydexcom/requests (via history,
+# http_pool and dexcom_client) and keyring are imported where first used, so
+# the status item is up before any of them load.
+import startup
+from settings import SettingsStore, DEFAULT_SETTINGS, get_settings_dir
 from keychain import get_password, set_password, delete_password
+from engine import GlucoseEngine
+from session_manager import SessionManager
+from scheduler import FetchWorker, PollScheduler, WakeDetector
+from graph import GraphRenderer
+from title import TitlePipeline
+from snapshot import SnapshotCache
+import reachability
+import metrics
+import profiling
+
+PRIVACY_POLICY_URL = "https://github.com/EricSpencer00/DexcomNavBarIcon-macos/blob/main/PRIVACY.md"
 
 class DexcomMenuApp(rumps.App):
     def __init__(self):
@@ -26,19 +32,58 @@ class DexcomMenuApp(rumps.App):
         NSApplication.sharedApplication().setActivationPolicy_(NSApplicationActivationPolicyAccessory)
         super(DexcomMenuApp, self).__init__("Dexcom")
 
-        # Load settings.
-        self.settings = load_settings()
-        self.username = self.settings.get("username", "")
-        # Retrieve password from Keychain instead of file
-        self.password = get_password(self.username) or ""
-        self.region = self.settings.get("region", "us")
-        self.style_settings = self.settings.get("style_settings", DEFAULT_SETTINGS["style_settings"])
-        self.preferences = self.settings.get("preferences", DEFAULT_SETTINGS["preferences"])
-        self.dexcom = None
-
-        # Data display
-        self.current_value = None
-        self.current_trend_arrow = None
+        # Load settings. Changes are kept in memory and written (atomically,
+        # debounced) by the store, from whichever thread makes them.
+        self.settings_store = SettingsStore()
+        self.settings = self.settings_store.settings()
+        before_quit = getattr(getattr(rumps, "events", None), "before_quit", None)
+        if before_quit is not None:
+            # NSApp terminate exits without running Python atexit handlers.
+            before_quit.register(self.settings_store.flush)
+        username = self.settings.get("username", "")
+        self.network = self.settings.get("network", DEFAULT_SETTINGS["network"])
+        self.diagnostics = self.settings.get("diagnostics", DEFAULT_SETTINGS["diagnostics"])
+        # Polling, formatting and reading state live in the UI-free engine. The
+        # Keychain password and the history are loaded on the worker
+        # (_start_background), not here.
+        self.engine = GlucoseEngine(
+            username=username,
+            password="",
+            region=self.settings.get("region", "us"),
+            style_settings=self.settings.get("style_settings", DEFAULT_SETTINGS["style_settings"]),
+            preferences=self.settings.get("preferences", DEFAULT_SETTINGS["preferences"]),
+            sessions=SessionManager(max_age=float(self.network.get("session_max_age", 3600))),
+            # Last reading and Share session from the previous run: the title shows
+            # "Nmin: value" right away and the first fetch can skip the login.
+            cache=SnapshotCache(),
+        )
+        self.engine.on_authenticated = self.persist_settings
+        self.engine.on_account_error = self._handle_account_error
+        # Titles reach the status item only when the text changes.
+        self.titles = TitlePipeline(self.refresh_display_with_text, dispatch=self._on_main_thread)
+        self.engine.subscribe(self._on_display_text)
+        # Renders the history graph on its own thread and caches the PNG.
+        self.graph = GraphRenderer(None, os.path.join(get_settings_dir(), "glucose_graph.png"))
+        # Every login and fetch runs on this one worker, never in parallel. It
+        # also times the polls, aligned to when the next reading should land,
+        # and fetches once right away when the Mac wakes from sleep.
+        self.poll_scheduler = PollScheduler(breaker=self.engine.breaker)
+        self.worker = FetchWorker(self.fetch_data, next_delay=self._next_poll_delay,
+                                  wake_detector=WakeDetector(), on_wake=self.engine.resumed)
+        # Set once the worker has loaded the history and the Keychain password;
+        # menu actions that need them are queued until then (see _when_ready).
+        self._ready = threading.Event()
+        self._ready_lock = threading.Lock()
+        self._after_ready = []
+        # With the asyncio backend the worker hands each tick to this loop and
+        # waits for it, so a stuck request is cancelled rather than left blocking.
+        self.fetch_loop = None
+        # metrics.Exporter when diagnostics.metrics is on (see _start_metrics).
+        self.metrics_exporter = None
+        # profiling.TickProfiler while ticks are being profiled.
+        self.profiler = None
+        # (username, region) whose history is attached; see _open_history.
+        self._history_account = None
 
         # Build menu items.
         self.menu.clear()
@@ -59,28 +104,152 @@ class DexcomMenuApp(rumps.App):
         self.menu["Sign Out"].set_callback(self.sign_out)
         self.menu.add("Privacy Policy")
         self.menu["Privacy Policy"].set_callback(self.open_privacy_policy)
+        if self.diagnostics.get("profiling_menu"):
+            # Hidden unless enabled in settings.json.
+            self.menu.add("Profile Ticks")
+            self.menu["Profile Ticks"].set_callback(self.profile_ticks)
+        ticks = profiling.ticks_from_env()
+        if ticks:
+            self._start_profiling(ticks)
+
+        # Do not force sign-in dialog. The worker authenticates only if we have
+        # stored credentials, as part of the first fetch.
+        self.refresh_display()
+        startup.mark("app init")
 
-        # Do not force sign-in dialog. Authenticate only if we have stored credentials.
-        if self.username and self.password:
-            self.authenticate()
-        else:
-            self.refresh_display()
-
-        # Fetch data immediately and set up a timer to update every 5 minutes.
+        # Fetch data immediately; the worker schedules the following polls.
         self.update_data()
-        self.timer = rumps.Timer(self.update_data, 300)
-        self.timer.start()
+
+    def _start_background(self):
+        """Deferred startup, run on the worker before its first fetch."""
+        try:
+            try:
+                self._start_services()
+            except Exception as e:
+                # Fetching can still go ahead; the password must still be loaded.
+                logging.error("Background startup failed: %s", e)
+            if self.engine.username and not self.engine.password:
+                # Retrieve password from Keychain instead of file
+                self.engine.password = get_password(self.engine.username) or ""
+            startup.mark("keychain")
+        finally:
+            # Whatever failed above, menu actions queued by _when_ready must run.
+            with self._ready_lock:
+                self._ready.set()
+                after_ready, self._after_ready = self._after_ready, []
+            for fn in after_ready:
+                self._on_main_thread(fn)
+
+    def _start_services(self):
+        if self.network.get("backend") == "asyncio":
+            from async_client import AsyncSession, LoopThread
+            self.engine.http_session = AsyncSession(self.network.get("pool_size") or 2,
+                                                    self.network.get("keepalive_idle", 60))
+            self.fetch_loop = LoopThread()
+        else:
+            from http_pool import configure_shared_session
+            configure_shared_session(self.network.get("pool_size"), self.network.get("keepalive_idle"))
+        self._watch_reachability()
+        self._start_metrics()
+        self._open_history()
+        # Show the last stored reading while the login is still in flight.
+        self.engine.restore_last_reading()
+        startup.mark("history")
+
+    def _history_path(self):
+        # One ring per account, so readings of different users or regions never mix.
+        import hashlib
+        key = hashlib.sha1(f"{self.engine.region}:{self.engine.username.lower()}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(get_settings_dir(), f"glucose_history-{key}.ring")
+
+    def _open_history(self):
+        """Attach the signed-in account's history, if the account changed. Runs on the worker."""
+        account = (self.engine.username, self.engine.region) if self.engine.username else None
+        if account == self._history_account:
+            return
+        self._history_account = account
+        # The old store is left to the garbage collector: the graph thread may still be reading it.
+        self.engine.history = self.graph.history = None
+        if account is None:
+            return
+        from history import HistorySync
+        path = self._history_path()
+        legacy_json_path = None
+        legacy_ring = os.path.join(get_settings_dir(), "glucose_history.ring")
+        try:
+            if not os.path.exists(path):
+                # The single pre-account history belonged to whoever was signed
+                # in when it was written; adopt it once (an older
+                # glucose_history.json is imported the same way).
+                if os.path.exists(legacy_ring):
+                    os.replace(legacy_ring, path)
+                legacy_json_path = os.path.join(get_settings_dir(), "glucose_history.json")
+            # Incremental sync also keeps the on-disk history current for graphing.
+            history = HistorySync(path, legacy_json_path=legacy_json_path)
+            self.engine.history = self.graph.history = history
+        except Exception as e:
+            logging.error("Error opening glucose history: %s", e)
+
+    def _watch_reachability(self):
+        # Ticks are skipped while the Share host for the account's region is
+        # unreachable, and the poller re-checks on the short offline TTL.
+        from dexcom_client import region_for
+        from pydexcom.const import DEXCOM_BASE_URLS
+        url = self.engine.base_url or DEXCOM_BASE_URLS[region_for(self.engine.region)]
+        self.engine.reachability = self.poll_scheduler.reachability = reachability.for_url(url)
+
+    def _start_metrics(self):
+        # Sources are read only when a snapshot is exported.
+        from breaker import CLOSED, OPEN, HALF_OPEN
+        from keychain import get_provider
+        breaker = self.engine.breaker
+        metrics.register("engine", self.engine.stats)
+        metrics.register("sessions", self.engine.sessions.stats)
+        metrics.register("breaker", lambda: dict(breaker.stats, consecutive_failures=breaker.failures,
+                                                 **{"state_" + s: int(breaker.state == s) for s in (CLOSED, OPEN, HALF_OPEN)}))
+        metrics.register("reachability", lambda: self.engine.reachability.stats if self.engine.reachability else {})
+        metrics.register("worker", self.worker.stats)
+        metrics.register("titles", self.titles.stats)
+        metrics.register("graph", self.graph.stats)
+        metrics.register("settings", self.settings_store.stats)
+        metrics.register("snapshot", self.engine.cache.stats)
+        metrics.register("keychain", get_provider().stats)
+        metrics.register("http", lambda: getattr(self.engine.http_session, "stats", None) or {})
+        self.metrics_exporter = metrics.exporter_from_settings(self.diagnostics, get_settings_dir())
+        if self.metrics_exporter is None:
+            return
+        self.metrics_exporter.start()
+        before_quit = getattr(getattr(rumps, "events", None), "before_quit", None)
+        if before_quit is not None:
+            before_quit.register(self.metrics_exporter.stop)
+
+    def _when_ready(self, fn):
+        # Menu actions that read or change credentials must not race the Keychain
+        # load: until the worker has finished it, fn is queued to run on the main
+        # thread afterwards instead of blocking the run loop. Repeat clicks merge.
+        with self._ready_lock:
+            if not self._ready.is_set():
+                if fn not in self._after_ready:
+                    self._after_ready.append(fn)
+                return
+        fn()
 
     def sign_out(self, _=None):
+        self._when_ready(self._sign_out)
+
+    def _sign_out(self):
         try:
-            delete_password(self.username)
+            delete_password(self.engine.username)
         except Exception:
             pass
-        self.username = ""
-        self.password = ""
-        self.dexcom = None
-        self.persist_settings()
+        # On the worker, after any fetch in flight: a reading fetched for this
+        # account must not land after its credentials are gone.
+        self.worker.submit(self._signed_out)
         rumps.notification("Signed Out", "", "Credentials cleared.")
+
+    def _signed_out(self):
+        self.engine.clear_credentials()
+        self.persist_settings()
         # Do not open sign-in automatically
         self.refresh_display()
 
@@ -90,8 +259,12 @@ class DexcomMenuApp(rumps.App):
 
     def open_account(self, _):
         """Account menu handler. If signed in, show info with Sign Out option; if not, allow sign-in."""
-        if self.username and self.password:
-            should_sign_out = show_account_info(self.username)
+        self._when_ready(self._open_account)
+
+    def _open_account(self):
+        from dialogs import get_credentials, show_account_info
+        if self.engine.has_credentials():
+            should_sign_out = show_account_info(self.engine.username)
             if should_sign_out:
                 self.sign_out()
             return
@@ -100,12 +273,17 @@ class DexcomMenuApp(rumps.App):
         if not creds or not creds[0] or creds[1] == "":
             # User cancelled; do nothing
             return
-        self.username, self.password, self.region = creds
         try:
-            set_password(self.username, self.password)
+            set_password(creds[0], creds[1])
         except Exception as e:
             logging.error("Failed to save password to Keychain: %s", e)
-        self.authenticate()
+        # Switch accounts and log in on the fetch worker, after any fetch in
+        # flight, so the previous account's tick can't land on the new one.
+        self.worker.submit(lambda: self._signed_in(*creds), fetch=True)
+
+    def _signed_in(self, username, password, region):
+        self.engine.set_credentials(username, password, region)
+        self._watch_reachability()
         self.persist_settings()
 
     def open_account_settings(self, _):
@@ -113,34 +291,38 @@ class DexcomMenuApp(rumps.App):
         self.open_account(_)
 
     def open_style_settings(self, _):
-        new_style = get_style_settings(self.style_settings)
+        from dialogs import get_style_settings
+        new_style = get_style_settings(self.engine.style_settings)
         if new_style:
-            self.style_settings = new_style
+            self.engine.style_settings = new_style
             rumps.alert("Style Updated", "New style settings have been applied.")
             self.refresh_display()
             self.persist_settings()
 
     def open_preferences(self, _):
-        new_prefs = get_preferences(self.preferences)
+        from dialogs import get_preferences
+        new_prefs = get_preferences(self.engine.preferences)
         if new_prefs:
             # Update style_settings show_brackets if present in prefs
             if "show_brackets" in new_prefs:
-                self.style_settings["show_brackets"] = new_prefs["show_brackets"]
+                self.engine.style_settings["show_brackets"] = new_prefs["show_brackets"]
                 del new_prefs["show_brackets"]
-            self.preferences = new_prefs
+            self.engine.preferences = new_prefs
             rumps.alert("Preferences Updated", "New preferences have been applied.")
             self.refresh_display()
             self.persist_settings()
 
     def open_privacy_policy(self, _):
         """Open Privacy Policy in browser when online, otherwise show local text in a window."""
-        url = "https://github.com/EricSpencer00/DexcomNavBarIcon-macos/blob/main/PRIVACY.md"
-        try:
-            # Try a quick HEAD/GET to detect connectivity to GitHub
-            req = urllib.request.Request(url, method="HEAD")
-            urllib.request.urlopen(req, timeout=4)
-            subprocess.Popen(["open", url])
-        except Exception:
+        # The (cached) connectivity check runs off the main thread; the result comes back on it.
+        reachability.for_url(PRIVACY_POLICY_URL).check_async(
+            lambda online: self._on_main_thread(lambda: self._show_privacy_policy(online)))
+
+    def _show_privacy_policy(self, online):
+        if online:
+            import subprocess
+            subprocess.Popen(["open", PRIVACY_POLICY_URL])
+        else:
             # Fallback: show local PRIVACY.md content
             local_path = os.path.join(os.path.dirname(__file__), "PRIVACY.md")
             try:
@@ -148,270 +330,146 @@ class DexcomMenuApp(rumps.App):
                     content = f.read()
             except Exception:
                 content = "Privacy policy is unavailable offline."
+            from dialogs import show_text_window
             show_text_window("Privacy Policy", content)
 
-    def authenticate(self):
+    def _handle_account_error(self, e):
+        # Called on the fetch worker: clear credentials here so the worker stops
+        # retrying, and alert on the main thread.
         try:
-            # Attempt Dexcom authentication
-            # pydexcom uses 'ous=True' for outside-US regions
-            if str(self.region).lower() in ("us", "usa", "united states"):
-                self.dexcom = Dexcom(username=self.username, password=self.password)
-            else:
-                self.dexcom = Dexcom(username=self.username, password=self.password, ous=True)
-            # Authentication succeeded; persist settings (without password).
-            self.persist_settings()
-        except AccountError as e:
-            rumps.alert("Authentication Error", str(e))
-            # Clear stored password
-            try:
-                delete_password(self.username)
-            except Exception:
-                pass
-            self.username = ""
-            self.password = ""
-            self.dexcom = None
-            self.persist_settings()
-            # Do not force open of account dialog; allow user to open later
-        except Exception as e:
-            logging.error("Unexpected error during authentication: %s", e)
-            self.dexcom = None
+            delete_password(self.engine.username)
+        except Exception:
+            pass
+        self.engine.clear_credentials()
+        self.persist_settings()
+        message = str(e)
+        # Do not force open of account dialog; allow user to open later
+        NSOperationQueue.mainQueue().addOperationWithBlock_(lambda: rumps.alert("Authentication Error", message))
 
     def manual_update(self, _):
         self.update_data()
 
     def update_data(self, _=None):
-        thread = threading.Thread(target=self.fetch_data)
-        thread.daemon = True
-        thread.start()
+        # Merged into the running fetch if one is already in flight.
+        self.worker.request()
+
+    def profile_ticks(self, _=None):
+        # Profiles the next scheduled ticks; no extra fetch is made for it.
+        self._start_profiling(max(1, int(self.diagnostics.get("profile_ticks", profiling.DEFAULT_TICKS))))
+
+    def _start_profiling(self, ticks):
+        if self.profiler is None:
+            self.profiler = profiling.TickProfiler(ticks, get_settings_dir(), on_done=self._profiling_done)
+
+    def _profiling_done(self, paths):
+        self.profiler = None
+        self._on_main_thread(lambda: rumps.notification("Profile Saved", "", paths["collapsed"]))
 
     def fetch_data(self):
-        if not self.dexcom:
-            # Only try to authenticate if we have credentials
-            if self.username and self.password:
-                self.authenticate()
-            if not self.dexcom:
-                NSOperationQueue.mainQueue().addOperationWithBlock_(lambda: self.refresh_display_with_text("[--][?]"))
-                return
-        try:
-            try:
-                reading = self.dexcom.get_current_glucose_reading()
-            except Exception as e:
-                # Session likely expired; rebuild it and retry once
-                logging.warning("Fetch failed (%s); re-authenticating and retrying", e)
-                self.dexcom = None
-                self.authenticate()
-                if not self.dexcom:
-                    raise
-                reading = self.dexcom.get_current_glucose_reading()
-            if reading is not None:
-                self.current_value = reading.value
-                self.current_trend_arrow = getattr(reading, "trend_arrow", None)
-                # No local persistence of history per requirement
-                # Prepare display text
-                # Save a cached snapshot (if cache implementation exists) with timestamp
-                try:
-                    if hasattr(self, 'cache') and self.cache:
-                        self.cache.save({
-                            'value': reading.value,
-                            'trend_arrow': getattr(reading, 'trend_arrow', None),
-                            'timestamp': int(time.time())
-                        })
-                except Exception:
-                    pass
-
-                display_text = self._format_display_text(self.current_value, self.current_trend_arrow)
-            else:
-                display_text = "[N/A][?]"
-        except Exception as e:
-            logging.error("Error fetching Dexcom data: %s", e)
-            # On error, try using cached data if available and present age
-            display_text = "[Err][?]"
+        # Runs on the worker thread; the engine publishes to _on_display_text.
+        if not self._ready.is_set():
+            self._start_background()
+        # After a sign-in or sign-out, switch histories before the tick reads one.
+        self._open_history()
+        profiler = self.profiler
+        if profiler is None:
+            self._tick()
+        else:
+            # One profiled tick per fetch: the schedule and request rate do not change.
+            profiler.run(self._tick)
+
+    def _tick(self):
+        if self.fetch_loop is not None:
+            from async_client import DEFAULT_TICK_TIMEOUT
             try:
-                cached = None
-                if hasattr(self, 'cache') and self.cache:
-                    cached = self.cache.get()
-                if cached:
-                    val = cached.get('value')
-                    ts = cached.get('timestamp')
-                    arrow = cached.get('trend_arrow')
-                    now_ts = int(time.time())
-                    age_min = None
-                    if ts:
-                        age_min = int((now_ts - int(ts)) / 60)
-                    # Only show arrow if <=5 minutes old
-                    arrow_symbol = ''
-                    if age_min is None or age_min <= 5:
-                        arrow_symbol = self.get_arrow_symbol(arrow)
-                    if age_min is not None:
-                        if arrow_symbol:
-                            display_text = f"{age_min}min: {val} {arrow_symbol}"
-                        else:
-                            display_text = f"{age_min}min: {val}"
-                    else:
-                        display_text = f"[{val}][{arrow_symbol or '?'}]"
-            except Exception:
-                pass
+                self.fetch_loop.run(self.engine.tick_async(), timeout=DEFAULT_TICK_TIMEOUT)
+            except TimeoutError as e:
+                logging.error("Fetch timed out: %s", e)
+        else:
+            self.engine.tick()
+        startup.mark("first fetch")
+        if not self.engine.has_credentials():
+            # Signed out (or the account was rejected): nothing failed, and
+            # nothing is polled until a sign-in requests a fetch.
+            return
+        self.poll_scheduler.observe(self.engine.current_timestamp, ok=self.engine.last_fetch_ok,
+                                    offline=self.engine.offline)
 
-        NSOperationQueue.mainQueue().addOperationWithBlock_(lambda: self.refresh_display_with_text(display_text))
+    def _next_poll_delay(self):
+        # None: no scheduled poll; the worker idles until request().
+        if not self.engine.has_credentials():
+            return None
+        return self.poll_scheduler.next_delay()
 
-    def _units_normalized(self):
-        # Normalize units like "mg/dL", "mgdl", "MGDL" -> "mgdl"; "mmol", "mmol/L" -> "mmol"
-        units = str(self.preferences.get("units", "mgdl"))
-        units = re.sub(r"[^a-z]", "", units.lower())
-        if units.startswith("mmol"):
-            return "mmol"
-        return "mgdl"
+    def _on_display_text(self, text):
+        # Worker thread; unchanged titles are dropped before the main-queue hop.
+        self.titles.submit(text)
 
-    def get_arrow_symbol(self, trend_arrow):
-        # Map Dexcom trend to configured arrows
-        arrow_map = {
-            "FLAT": self.style_settings.get("arrow_steady", "→"),
-            "DOUBLE_UP": self.style_settings.get("arrow_rising", "↑"),
-            "SINGLE_UP": self.style_settings.get("arrow_rising", "↑"),
-            "FORTY_FIVE_UP": self.style_settings.get("arrow_rising", "↑"),
-            "DOUBLE_DOWN": self.style_settings.get("arrow_falling", "↓"),
-            "SINGLE_DOWN": self.style_settings.get("arrow_falling", "↓"),
-            "FORTY_FIVE_DOWN": self.style_settings.get("arrow_falling", "↓"),
-        }
-        if not trend_arrow:
-            return "?"
-        key = str(trend_arrow).upper()
-        return arrow_map.get(key, str(trend_arrow))
+    def _on_main_thread(self, fn):
+        queued = time.perf_counter()
 
-    def _format_display_text(self, value, trend_arrow):
-        try:
-            numeric = float(value)
-        except Exception:
-            numeric = 0.0
+        def run():
+            metrics.observe("main_queue_delay", time.perf_counter() - queued)
+            fn()
+        NSOperationQueue.mainQueue().addOperationWithBlock_(run)
 
-        units = self._units_normalized()
-        if units == "mgdl":
-            # Show as int, no .0
-            display_value = int(round(numeric))
-        else:
-            display_value = round(numeric * 0.0555, 1)
-
-        # Choose number format based on thresholds.
-        low = float(self.preferences.get("low_threshold", 70))
-        high = float(self.preferences.get("high_threshold", 180))
-        if numeric < low:
-            number_format = self.style_settings.get("number_low", "%s")
-        elif numeric > high:
-            number_format = self.style_settings.get("number_high", "%s")
-        else:
-            number_format = self.style_settings.get("number_normal", "%s")
+    def get_arrow_symbol(self, trend_arrow):
+        return self.engine.get_arrow_symbol(trend_arrow)
 
-        number_text = number_format % display_value
-        arrow_symbol = self.get_arrow_symbol(trend_arrow)
-        if self.style_settings.get("show_brackets", True):
-            return f"[{number_text}][{arrow_symbol}]"
-        return f"{number_text} {arrow_symbol}"
+    def _format_display_text(self, value, trend_arrow):
+        return self.engine.format_display_text(value, trend_arrow)
 
     def refresh_display(self):
         # Recompute display from current values
-        if self.current_value is None:
-            self.title = "[--][?]"
-            return
-        text = self._format_display_text(self.current_value, self.current_trend_arrow)
-        self.refresh_display_with_text(text)
+        self.titles.submit(self.engine.current_display_text())
 
     def refresh_display_with_text(self, text):
         # Use plain text title for compatibility
-        self.title = text
+        with metrics.timer("render"):
+            self.title = text
+        startup.mark("first title")
 
     def persist_settings(self):
         settings = {
-            "username": self.username,
+            "username": self.engine.username,
             # Do not store password in settings file
-            "region": self.region,
-            "style_settings": self.style_settings,
-            "preferences": self.preferences
+            "region": self.engine.region,
+            "style_settings": self.engine.style_settings,
+            "preferences": self.engine.preferences,
+            "network": self.network,
+            "diagnostics": self.diagnostics,
         }
-        save_settings(settings)
+        self.settings_store.update(settings)
 
     # ----------------- History, Prediction and Graphing -----------------
 
     def update_history(self, reading):
-        """Deprecated: local history persistence disabled."""
+        """Deprecated: history is written by HistorySync on every fetch."""
         return
 
     def predict_future_readings(self, count=3):
-        """Predict the next 'count' glucose readings using a simple linear regression."""
-        history_file = os.path.join(get_settings_dir(), "glucose_history.json")
-        if not os.path.exists(history_file):
-            return []
-        try:
-            import numpy as np  # optional dependency
-        except Exception:
+        """Predict the next 'count' glucose readings from the incremental trend predictor."""
+        if self.engine.history is None:
             return []
-        try:
-            with open(history_file, "r") as f:
-                history = json.load(f)
-        except Exception:
-            return []
-        if len(history) < 2:
-            if history:
-                return [history[-1]["value"]] * count
-            else:
-                return []
-        history.sort(key=lambda x: x["timestamp"])
-        times = np.array([entry["timestamp"] for entry in history])
-        values = np.array([entry["value"] for entry in history])
-        m, b = np.polyfit(times, values, 1)
-        last_time = times[-1]
-        avg_delta = np.mean(np.diff(times))
-        predictions = []
-        for i in range(1, count + 1):
-            future_time = last_time + i * avg_delta
-            pred_value = m * future_time + b
-            predictions.append(round(pred_value, 1))
-        return predictions
+        return [round(p.value, 1) for p in self.engine.history.predict(count)]
 
     def generate_graph(self):
-        """Generate and save a graph of past glucose readings and predicted future values."""
-        history_file = os.path.join(get_settings_dir(), "glucose_history.json")
-        if not os.path.exists(history_file):
-            return None
-        try:
-            import numpy as np  # optional dependency
-            import matplotlib.pyplot as plt  # optional dependency
-        except Exception:
-            return None
-        try:
-            with open(history_file, "r") as f:
-                history = json.load(f)
-        except Exception:
-            return None
-        if len(history) == 0:
-            return None
-        history.sort(key=lambda x: x["timestamp"])
-        times = np.array([entry["timestamp"] for entry in history])
-        values = np.array([entry["value"] for entry in history])
-        predictions = self.predict_future_readings(count=3)
-        last_time = times[-1]
-        avg_delta = np.mean(np.diff(times)) if len(times) > 1 else 300
-        future_times = np.array([last_time + (i + 1) * avg_delta for i in range(3)])
-        plt.figure(figsize=(8, 4))
-        plt.plot(times, values, marker="o", label="Past Readings")
-        if predictions:
-            plt.plot(future_times, predictions, marker="x", linestyle="--", label="Predictions")
-        plt.xlabel("Timestamp")
-        plt.ylabel("Glucose (mg/dL)")
-        plt.title("Glucose History and Future Predictions")
-        plt.legend()
-        plt.tight_layout()
-        graph_path = os.path.join(get_settings_dir(), "glucose_graph.png")
-        plt.savefig(graph_path)
-        plt.close()
-        return graph_path
+        """Render (or reuse) the graph of past readings and predictions on the calling thread."""
+        return self.graph.render(self.engine.style_settings, self.engine.preferences)
 
     def show_history_graph(self, _):
-        """Open the generated glucose graph in the default image viewer."""
-        graph_path = self.generate_graph()
-        if graph_path and os.path.exists(graph_path):
-            subprocess.Popen(["open", graph_path])
-        else:
-            rumps.alert("Graph Error", "No graph available.")
+        """Render the glucose graph off the main thread, then open it in the default image viewer."""
+        self.graph.request(self.engine.style_settings, self.engine.preferences, callback=self._open_graph)
+
+    def _open_graph(self, graph_path):
+        # Called on the graph thread.
+        def show():
+            if graph_path and os.path.exists(graph_path):
+                import subprocess
+                subprocess.Popen(["open", graph_path])
+            else:
+                rumps.alert("Graph Error", "No graph available.")
+        NSOperationQueue.mainQueue().addOperationWithBlock_(show)
 
 if __name__ == "__main__":
     from Cocoa import NSApplication, NSApplicationActivationPolicyAccessory
@@ -0,0 +1,376 @@
+# async_client.py
+"""
+asyncio backend for the Dexcom Share login and readings endpoints. Requests
+go over plain asyncio streams with HTTP/1.1 keep-alive, so one event loop can
+drive many polls at once (multi-account, stand-in load tests) without a
+thread each. Every request has a timeout, and a cancelled poll closes its
+connection instead of leaving a thread blocked in a socket read.
+
+Selected with "backend": "asyncio" in the network settings; "threads" (the
+default) uses the requests-based client in dexcom_client.py. Readings come
+back as pydexcom GlucoseReading objects and failures raise the same pydexcom
+errors, so the engine treats both backends alike.
+"""
+import asyncio
+import concurrent.futures
+import json as jsonlib
+import logging
+import ssl
+import threading
+from typing import Optional
+from urllib.parse import urlencode, urlsplit
+
+from pydexcom import Dexcom, GlucoseReading
+from pydexcom.const import (
+    DEXCOM_APPLICATION_IDS, DEXCOM_AUTHENTICATE_ENDPOINT, DEXCOM_BASE_URLS, DEXCOM_GLUCOSE_READINGS_ENDPOINT,
+    DEXCOM_LOGIN_ID_ENDPOINT, MAX_MAX_COUNT, MAX_MINUTES,
+)
+from pydexcom.errors import SessionError
+
+from dexcom_client import DEFAULT_TIMEOUT, region_for
+from http_pool import DEFAULT_KEEPALIVE_IDLE, DEFAULT_POOL_SIZE, _keepalive_socket_options
+
+DEFAULT_TICK_TIMEOUT = 60  # seconds for a whole tick: login, session retry and readings
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, status_code, content=b""):
+        super().__init__(f"HTTP {status_code}: {content[:200]!r}")
+        self.status_code = status_code
+
+
+class AsyncResponse:
+    __slots__ = ("status_code", "headers", "content")
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return jsonlib.loads(self.content) if self.content else None
+
+
+class _StaleConnection(Exception):
+    # A pooled connection the server had already closed; safe to retry on a new one.
+    pass
+
+
+class AsyncSession:
+    """
+    The asyncio counterpart of http_pool's requests.Session: keeps up to
+    `pool_size` idle keep-alive connections per host. Connections belong to
+    the event loop that opened them, so use one AsyncSession per loop.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keepalive_idle=DEFAULT_KEEPALIVE_IDLE, timeout=DEFAULT_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._socket_options = _keepalive_socket_options(keepalive_idle)
+        self._ssl = None
+        self._idle = {}  # (scheme, host, port) -> [(reader, writer)]
+        self.stats = {"requests": 0, "connects": 0, "reuses": 0, "timeouts": 0}
+
+    async def post(self, url, params=None, json=None, timeout=None):
+        """POST `json` to `url`; returns an AsyncResponse. Raises TimeoutError after `timeout` seconds."""
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        target = (parts.path or "/") + ("?" + urlencode(params) if params else "")
+        body = jsonlib.dumps({} if json is None else json).encode("utf-8")
+        request = (
+            f"POST {target} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Content-Type: application/json\r\n"
+            "Accept-Encoding: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("latin-1") + body
+        self.stats["requests"] += 1
+        try:
+            return await asyncio.wait_for(self._exchange(key, request), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+
+    async def _exchange(self, key, request):
+        reader, writer, reused = await self._connection(key)
+        try:
+            try:
+                response, keep_alive = await self._roundtrip(reader, writer, request, reused)
+            except _StaleConnection:
+                writer.close()
+                reader, writer, _ = await self._open(key)
+                response, keep_alive = await self._roundtrip(reader, writer, request, False)
+        except BaseException:
+            # Timed out, cancelled or broken mid-response: never reuse it.
+            writer.close()
+            raise
+        if keep_alive:
+            self._release(key, reader, writer)
+        else:
+            writer.close()
+        return response
+
+    async def _connection(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                self.stats["reuses"] += 1
+                return reader, writer, True
+            writer.close()
+        return await self._open(key)
+
+    async def _open(self, key):
+        scheme, host, port = key
+        ssl_context = None
+        if scheme == "https":
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context()
+            ssl_context = self._ssl
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            for option in self._socket_options:
+                try:
+                    sock.setsockopt(*option)
+                except OSError:
+                    pass
+        self.stats["connects"] += 1
+        return reader, writer, False
+
+    def _release(self, key, reader, writer):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.pool_size:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _roundtrip(self, reader, writer, request, reused):
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            if reused:
+                raise _StaleConnection()
+            raise
+        if not status_line:
+            if reused:
+                raise _StaleConnection()
+            raise ConnectionError("connection closed before the response")
+        fields = status_line.decode("latin-1").split(None, 2)
+        version, status = fields[0], int(fields[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            content = await self._read_chunked(reader)
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return AsyncResponse(status, headers, content), keep_alive
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # Skip trailers up to the blank line.
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    def close(self):
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle.clear()
+
+
+class AsyncShareClient:
+    """Share client with the same surface as ShareClient, but async: `await client.get_glucose_readings()`."""
+
+    # pydexcom's error mapping and ID checks only read the attributes set in
+    # __init__, so they are borrowed rather than copied.
+    _handle_response = Dexcom._handle_response
+    _validate_session_id = Dexcom._validate_session_id
+    _validate_account_id = Dexcom._validate_account_id
+    _validate_username = Dexcom._validate_username
+    _validate_password = Dexcom._validate_password
+
+    def __init__(self, *, username: str, password: str, region="us", base_url: Optional[str] = None,
+                 http_session: Optional[AsyncSession] = None, account_id: Optional[str] = None,
+                 session_id: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT):
+        region = region_for(region)
+        self._base_url = (base_url or DEXCOM_BASE_URLS[region]).rstrip("/")
+        self._application_id = DEXCOM_APPLICATION_IDS[region]
+        self._http = http_session if http_session is not None else AsyncSession()
+        self._timeout = timeout
+        self._username = username
+        self._password = password
+        self._account_id = account_id
+        self._session_id = None
+        self._resume_session_id = session_id if account_id else None
+        # Loop the client logs in on; _session() hops onto it from other threads.
+        self._loop = None
+        self.logins = 0
+
+    @property
+    def account_id(self) -> Optional[str]:
+        return self._account_id
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return self._session_id
+
+    async def _post(self, endpoint, params=None, json=None):
+        response = await self._http.post(f"{self._base_url}/{endpoint}", params=params,
+                                         json={} if json is None else json, timeout=self._timeout)
+        if response.status_code >= 400:
+            try:
+                error = self._handle_response(response)
+            except ValueError:
+                error = None
+            raise error or HTTPStatusError(response.status_code, response.content)
+        return response.json()
+
+    async def login(self) -> None:
+        """Create a Share session (by account ID when known), or adopt the session ID passed in."""
+        self._loop = asyncio.get_running_loop()
+        if self._resume_session_id:
+            self._session_id, self._resume_session_id = self._resume_session_id, None
+            self._validate_account_id()
+            self._validate_session_id()
+            return
+        self._validate_password()
+        if self._account_id is None:
+            self._validate_username()
+            self._account_id = await self._post(DEXCOM_AUTHENTICATE_ENDPOINT, json={
+                "accountName": self._username,
+                "password": self._password,
+                "applicationId": self._application_id,
+            })
+        self._validate_account_id()
+        self._session_id = await self._post(DEXCOM_LOGIN_ID_ENDPOINT, json={
+            "accountId": self._account_id,
+            "password": self._password,
+            "applicationId": self._application_id,
+        })
+        self._validate_session_id()
+        self.logins += 1
+
+    def _session(self) -> None:
+        """Blocking login for SessionManager's refresh thread; runs on the client's loop."""
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError("client has no running event loop")
+        future = asyncio.run_coroutine_threadsafe(self.login(), self._loop)
+        try:
+            future.result(self._timeout * 2)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError("session refresh timed out") from None
+
+    async def get_glucose_readings(self, minutes: int = MAX_MINUTES, max_count: int = MAX_MAX_COUNT):
+        params = {"minutes": minutes, "maxCount": max_count}
+        try:
+            # A default or missing session ID gets an empty non-JSON reply, so check first.
+            self._validate_session_id()
+            records = await self._post(DEXCOM_GLUCOSE_READINGS_ENDPOINT, params=dict(params, sessionId=self._session_id))
+        except SessionError:
+            # Expired session: log in again (by account ID) and retry once, like pydexcom.
+            await self.login()
+            records = await self._post(DEXCOM_GLUCOSE_READINGS_ENDPOINT, params=dict(params, sessionId=self._session_id))
+        return [GlucoseReading(record) for record in records or []]
+
+    async def get_latest_glucose_reading(self):
+        readings = await self.get_glucose_readings(max_count=1)
+        return readings[0] if readings else None
+
+    async def get_current_glucose_reading(self):
+        readings = await self.get_glucose_readings(minutes=10, max_count=1)
+        return readings[0] if readings else None
+
+
+async def create_client(username: str, password: str, region="us", base_url: Optional[str] = None,
+                        http_session: Optional[AsyncSession] = None, account_id: Optional[str] = None,
+                        session_id: Optional[str] = None) -> AsyncShareClient:
+    """Log in (or resume `session_id`) and return a ready client. Raises pydexcom errors on failure."""
+    client = AsyncShareClient(username=username, password=password, region=region, base_url=base_url,
+                              http_session=http_session, account_id=account_id, session_id=session_id)
+    await client.login()
+    return client
+
+
+async def _cancel_tasks():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class LoopThread:
+    """An asyncio event loop on a daemon thread, for callers that are not async themselves."""
+
+    def __init__(self, name="dexcom-asyncio"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self.loop
+
+    def submit(self, coro):
+        """Schedule coro on the loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro, timeout=None):
+        """Run coro on the loop and wait for its result. On timeout the coroutine is cancelled."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            if future.cancel():
+                raise TimeoutError(f"timed out after {timeout} s") from None
+            raise
+
+    def call_soon(self, fn, *args):
+        """Run fn(*args) on the loop thread."""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(fn, *args)
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            loop, thread, self.loop, self._thread = self.loop, self._thread, None, None
+        if loop is None:
+            return
+        # Like asyncio.run: cancel what is still running and let it unwind first.
+        try:
+            asyncio.run_coroutine_threadsafe(_cancel_tasks(), loop).result(timeout)
+        except Exception as e:
+            logging.error("Error cancelling event loop tasks: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            try:
+                loop.close()
+            except Exception as e:
+                logging.error("Error closing event loop: %s", e)
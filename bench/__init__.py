@@ -0,0 +1 @@
+# Benchmarks and simulations. Run from the repo root, e.g. `python -m bench.time_to_title`.
@@ -0,0 +1,114 @@
+"""
+Multi-account engine benchmark against the local Share stand-in: memory per
+account, request throughput with a fixed set of fetch threads, and how evenly
+the shared scheduler spreads the next cycle of polls. Fails if the next cycle
+bunches up: more than a tenth of the accounts (plus a few) due in one second
+means the per-account phases were lost.
+
+Usage: python -m bench.accounts [--accounts 10 100 500] [--workers 4] [--latency 0.02]
+"""
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from accounts import MultiAccountEngine
+from http_pool import create_session
+from share_standin import READING_INTERVAL, ShareStandin, StandinConfig
+
+
+def poll_all(engine, workers):
+    """Poll every account once on `workers` threads; returns the wall time in seconds."""
+    accounts = list(engine.accounts.values())
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(engine.poll, accounts))
+    return time.perf_counter() - t0
+
+
+def peak_per_second(due_times):
+    """Most polls scheduled inside any one-second window."""
+    due = sorted(due_times)
+    peak, lo = 0, 0
+    for hi, t in enumerate(due):
+        while t - due[lo] >= 1.0:
+            lo += 1
+        peak = max(peak, hi - lo + 1)
+    return peak
+
+
+def max_peak(count):
+    """Most polls in one second the spread may reach for `count` accounts."""
+    return count // 10 + 5
+
+
+def run(count, workers, latency):
+    standin = ShareStandin(StandinConfig(latency=latency, trace_seed=3))
+    base_url = standin.start()
+    try:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        engine = MultiAccountEngine(max_workers=workers, base_url=base_url,
+                                    http_session=create_session(pool_size=workers))
+        for i in range(count):
+            engine.add_account(i, f"follower-{i}", "secret")
+        added = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        requests_before = standin.snapshot_stats()["requests"]
+        cold = poll_all(engine, workers)
+        cold_requests = standin.snapshot_stats()["requests"] - requests_before
+        warm, warm_requests = 0.0, 0
+        for _ in range(2):
+            requests_before = standin.snapshot_stats()["requests"]
+            warm += poll_all(engine, workers)
+            warm_requests += standin.snapshot_stats()["requests"] - requests_before
+
+        gc.collect()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        # Memory of a logged-in account: add one more and poll it.
+        extra = engine.add_account("extra", "follower-extra", "secret")
+        engine.poll(extra)
+        logged_in = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+
+        now = time.time()
+        next_cycle = [a.due - now for a in engine.accounts.values() if a.due is not None]
+        engine.stop()
+    finally:
+        standin.stop()
+    return {
+        "accounts": count,
+        "KiB/account (added)": (added - before) / count / 1024,
+        "KiB/account (logged in)": logged_in / 1024,
+        "cold req/s": cold_requests / cold,
+        "warm req/s": warm_requests / warm,
+        "warm ms/poll": warm / (2 * count) * 1000 * workers,
+        "peak polls/s": peak_per_second(next_cycle),
+        "mean polls/s": count / READING_INTERVAL,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in latency per request, seconds")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+    rows = [run(count, args.workers, args.latency) for count in args.accounts]
+    print(f"{args.workers} fetch threads, {args.latency * 1000:.0f} ms stand-in latency")
+    for key in rows[0]:
+        print(f"{key:<26}" + "".join(f"{row[key]:>10.1f}" if isinstance(row[key], float) else f"{row[key]:>10}"
+                                     for row in rows))
+    for row in rows:
+        assert row["peak polls/s"] <= max_peak(row["accounts"]), \
+            f"{row['peak polls/s']} of {row['accounts']} accounts due in one second"
+
+
+if __name__ == "__main__":
+    main()
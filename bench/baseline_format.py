@@ -0,0 +1,84 @@
+"""
+Reference copy of the title formatting DexcomMenuApp did before
+formatter.DisplayFormatter (its _units_normalized, get_arrow_symbol and
+_format_display_text methods, as functions over the settings dicts).
+bench.formatter times it and checks the compiled formatter's output against
+it. Keep it as it is: it is the behaviour being preserved, not app code.
+"""
+import re
+
+
+def units_normalized(preferences):
+    # Normalize units like "mg/dL", "mgdl", "MGDL" -> "mgdl"; "mmol", "mmol/L" -> "mmol"
+    units = str(preferences.get("units", "mgdl"))
+    units = re.sub(r"[^a-z]", "", units.lower())
+    if units.startswith("mmol"):
+        return "mmol"
+    return "mgdl"
+
+
+def get_arrow_symbol(trend_arrow, style_settings):
+    # Map Dexcom trend to configured arrows
+    arrow_map = {
+        "FLAT": style_settings.get("arrow_steady", "→"),
+        "DOUBLE_UP": style_settings.get("arrow_rising", "↑"),
+        "SINGLE_UP": style_settings.get("arrow_rising", "↑"),
+        "FORTY_FIVE_UP": style_settings.get("arrow_rising", "↑"),
+        "DOUBLE_DOWN": style_settings.get("arrow_falling", "↓"),
+        "SINGLE_DOWN": style_settings.get("arrow_falling", "↓"),
+        "FORTY_FIVE_DOWN": style_settings.get("arrow_falling", "↓"),
+    }
+    if not trend_arrow:
+        return "?"
+    key = str(trend_arrow).upper()
+    return arrow_map.get(key, str(trend_arrow))
+
+
+def format_display_text(value, trend_arrow, style_settings, preferences):
+    try:
+        numeric = float(value)
+    except Exception:
+        numeric = 0.0
+
+    units = units_normalized(preferences)
+    if units == "mgdl":
+        # Show as int, no .0
+        display_value = int(round(numeric))
+    else:
+        display_value = round(numeric * 0.0555, 1)
+
+    # Choose number format based on thresholds.
+    low = float(preferences.get("low_threshold", 70))
+    high = float(preferences.get("high_threshold", 180))
+    if numeric < low:
+        number_format = style_settings.get("number_low", "%s")
+    elif numeric > high:
+        number_format = style_settings.get("number_high", "%s")
+    else:
+        number_format = style_settings.get("number_normal", "%s")
+
+    number_text = number_format % display_value
+    arrow_symbol = get_arrow_symbol(trend_arrow, style_settings)
+    if style_settings.get("show_brackets", True):
+        return f"[{number_text}][{arrow_symbol}]"
+    return f"{number_text} {arrow_symbol}"
+
+
+def format_cached_text(cached, style_settings, now):
+    # The cached-reading branch of the old fetch_data.
+    val = cached.get('value')
+    ts = cached.get('timestamp')
+    arrow = cached.get('trend_arrow')
+    now_ts = int(now)
+    age_min = None
+    if ts:
+        age_min = int((now_ts - int(ts)) / 60)
+    # Only show arrow if <=5 minutes old
+    arrow_symbol = ''
+    if age_min is None or age_min <= 5:
+        arrow_symbol = get_arrow_symbol(arrow, style_settings)
+    if age_min is not None:
+        if arrow_symbol:
+            return f"{age_min}min: {val} {arrow_symbol}"
+        return f"{age_min}min: {val}"
+    return f"[{val}][{arrow_symbol or '?'}]"
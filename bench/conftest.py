@@ -0,0 +1,105 @@
+"""
+pytest-benchmark setup for the hot-path suite (bench/test_hot_paths.py).
+
+Runs on Linux: rumps and Cocoa are replaced by small stand-ins before app.py
+is imported, Foundation is hidden so settings fall back to a temporary HOME,
+and the Keychain is the in-memory backend. Results are stored under
+bench/baselines unless --benchmark-storage says otherwise.
+
+    python -m pytest bench --benchmark-save=baseline      # record a baseline
+    python -m pytest bench --benchmark-compare --benchmark-compare-fail=mean:25%
+"""
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_STORAGE = "file://./.benchmarks"  # pytest-benchmark's own default
+
+# Before anything imports settings: its paths are resolved at import time.
+os.environ["HOME"] = tempfile.mkdtemp(prefix="dexcom-bench-home-")
+sys.modules["Foundation"] = None
+
+import keychain  # noqa: E402
+
+keychain.set_provider(keychain.CredentialProvider(keychain.MemoryBackend()))
+
+
+class _MenuItem:
+    def __init__(self, title):
+        self.title = title
+        self.callback = None
+
+    def set_callback(self, callback):
+        self.callback = callback
+
+
+class _Menu(dict):
+    def add(self, title):
+        self[title] = _MenuItem(title)
+
+
+class _App:
+    def __init__(self, name, *args, **kwargs):
+        self.name = name
+        self.title = name
+        self.menu = _Menu()
+
+    def run(self):
+        pass
+
+
+class _MainQueue:
+    # Runs blocks inline; the suite has no run loop.
+    def addOperationWithBlock_(self, block):
+        block()
+
+
+class _NSOperationQueue:
+    @staticmethod
+    def mainQueue():
+        return _MainQueue()
+
+
+class _NSApplication:
+    @staticmethod
+    def sharedApplication():
+        return _NSApplication()
+
+    def setActivationPolicy_(self, policy):
+        pass
+
+
+def _stub_modules():
+    rumps = types.ModuleType("rumps")
+    rumps.App = _App
+    rumps.alert = lambda *args, **kwargs: 1
+    rumps.notification = lambda *args, **kwargs: None
+    cocoa = types.ModuleType("Cocoa")
+    cocoa.NSApplication = _NSApplication
+    cocoa.NSApplicationActivationPolicyAccessory = 1
+    cocoa.NSOperationQueue = _NSOperationQueue
+    sys.modules["rumps"] = rumps
+    sys.modules["Cocoa"] = cocoa
+
+
+_stub_modules()
+
+
+def pytest_configure(config):
+    if getattr(config.option, "benchmark_storage", None) == DEFAULT_STORAGE:
+        config.option.benchmark_storage = "file://" + BASELINES
+
+
+@pytest.fixture
+def menu_app(monkeypatch):
+    """DexcomMenuApp with no worker running: nothing fetches, history is attached by the test."""
+    import app
+    monkeypatch.setattr(app.DexcomMenuApp, "update_data", lambda self, _=None: None)
+    menu_app = app.DexcomMenuApp()
+    yield menu_app
+    menu_app.graph.stop()
+    menu_app.engine.sessions.stop()
@@ -0,0 +1,107 @@
+"""
+Thread vs asyncio fetch backend on the local Share stand-in: polls/sec and
+client CPU per poll when many accounts are polled with the same concurrency.
+
+The stand-in runs in a child process so its CPU is not counted. Each run adds
+the accounts, polls them all once (login included), then times warm rounds.
+
+Usage: python -m bench.fetch_backends [--accounts 50 200] [--concurrency 4 32] [--latency 0.05]
+"""
+import argparse
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from accounts import MultiAccountEngine
+from http_pool import create_session
+from share_standin import ShareStandin, StandinConfig
+
+
+def _serve(conn, latency):
+    standin = ShareStandin(StandinConfig(latency=latency, trace_seed=5))
+    conn.send(standin.start())
+    conn.recv()
+    standin.stop()
+
+
+def build(backend, base_url, concurrency):
+    if backend == "threads":
+        return MultiAccountEngine(max_workers=concurrency, base_url=base_url,
+                                  http_session=create_session(pool_size=concurrency))
+    return MultiAccountEngine(max_workers=concurrency, base_url=base_url, backend="asyncio")
+
+
+def poll_round(engine, executor):
+    """Poll every account once and wait for all of them."""
+    accounts = list(engine.accounts.values())
+    if executor is None:
+        async def poll_all():
+            import asyncio
+            await asyncio.gather(*(engine.poll_async(account) for account in accounts))
+        engine.run_async(poll_all())
+    else:
+        list(executor.map(engine.poll, accounts))
+
+
+def run(backend, base_url, count, concurrency, rounds):
+    engine = build(backend, base_url, concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency) if backend == "threads" else None
+    try:
+        for i in range(count):
+            engine.add_account(i, f"{backend}-{concurrency}-{i}", "secret")
+        w0, c0 = time.perf_counter(), time.process_time()
+        poll_round(engine, executor)
+        cold_wall, cold_cpu = time.perf_counter() - w0, time.process_time() - c0
+        w0, c0 = time.perf_counter(), time.process_time()
+        for _ in range(rounds):
+            poll_round(engine, executor)
+        warm_wall, warm_cpu = time.perf_counter() - w0, time.process_time() - c0
+        errors = engine.stats["errors"]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        engine.stop()
+    polls = count * rounds
+    return {
+        "cold polls/s": count / cold_wall,
+        "warm polls/s": polls / warm_wall,
+        "cold cpu ms/poll": cold_cpu / count * 1000,
+        "warm cpu ms/poll": warm_cpu / polls * 1000,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 32],
+                        help="fetch threads (threads) or polls in flight (asyncio)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in latency per request, seconds")
+    parser.add_argument("--rounds", type=int, default=3, help="warm rounds per run")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve, args=(child_conn, args.latency), daemon=True)
+    server.start()
+    base_url = conn.recv()
+    try:
+        print(f"stand-in latency {args.latency * 1000:.0f} ms, {args.rounds} warm rounds")
+        header = (f"{'backend':<9}{'accounts':>9}{'conc.':>6}{'cold/s':>9}{'warm/s':>9}"
+                  f"{'cold cpu ms':>13}{'warm cpu ms':>13}{'errors':>8}")
+        print(header)
+        print("-" * len(header))
+        for count in args.accounts:
+            for concurrency in args.concurrency:
+                for backend in ("threads", "asyncio"):
+                    r = run(backend, base_url, count, concurrency, args.rounds)
+                    print(f"{backend:<9}{count:>9}{concurrency:>6}{r['cold polls/s']:>9.1f}{r['warm polls/s']:>9.1f}"
+                          f"{r['cold cpu ms/poll']:>13.3f}{r['warm cpu ms/poll']:>13.3f}{r['errors']:>8}")
+    finally:
+        conn.send("stop")
+        server.join(5)
+
+
+if __name__ == "__main__":
+    main()
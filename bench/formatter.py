@@ -0,0 +1,88 @@
+"""
+Title formatting micro-benchmarks: the old per-call formatting
+(bench/baseline_format.py, a reference copy of what DexcomMenuApp did before)
+vs. a compiled DisplayFormatter (cold memo, memo hit), plus the cost of
+compiling one. Before timing, checks the compiled titles match the reference
+output across values, trends, units, styles and cached-reading ages.
+
+Usage: python -m bench.formatter [--number 200000]
+"""
+import argparse
+import itertools
+import timeit
+
+from bench import baseline_format as baseline
+from formatter import DisplayFormatter
+from settings import DEFAULT_SETTINGS
+
+STYLE = dict(DEFAULT_SETTINGS["style_settings"])
+PREFS = dict(DEFAULT_SETTINGS["preferences"])
+MMOL_PREFS = dict(PREFS, units="mmol/L")
+NOW = 1_700_000_000
+CACHED = {"value": 123, "trend_arrow": "→", "timestamp": NOW}
+TRENDS = ["FLAT", "flat", "SINGLE_UP", "DOUBLE_UP", "FORTY_FIVE_UP", "SINGLE_DOWN", "DOUBLE_DOWN",
+          "FORTY_FIVE_DOWN", "NOT_COMPUTABLE", "", None]
+
+
+def check_output():
+    """Compare compiled titles with the reference; returns the number of cases checked."""
+    styles = [STYLE, dict(STYLE, show_brackets=False, number_low="LOW %s", number_high="HIGH %s",
+                          arrow_steady="=", arrow_rising="+", arrow_falling="-")]
+    prefs = [PREFS, MMOL_PREFS, dict(PREFS, units="MMOL", low_threshold=80, high_threshold=160)]
+    checked = 0
+    for style, pref in itertools.product(styles, prefs):
+        compiled = DisplayFormatter(style, pref)
+        for value, trend in itertools.product(list(range(39, 402)) + [72.5, "123", "n/a", None], TRENDS):
+            expected = baseline.format_display_text(value, trend, style, pref)
+            got = compiled.format(value, trend)
+            assert got == expected, f"{value!r}, {trend!r}: {got!r} != reference {expected!r}"
+            assert compiled.arrow(trend) == baseline.get_arrow_symbol(trend, style)
+            checked += 1
+        for age, trend, ts in itertools.product([0, 59, 60, 299, 300, 359, 360, 7200], TRENDS, [NOW, None]):
+            cached = {"value": 123, "trend_arrow": trend, "timestamp": ts}
+            expected = baseline.format_cached_text(cached, style, NOW + age)
+            got = compiled.format_cached(cached, NOW + age)
+            assert got == expected, f"cached {age} s, {trend!r}: {got!r} != reference {expected!r}"
+            checked += 1
+    return checked
+
+
+def cases():
+    compiled = DisplayFormatter(STYLE, PREFS)
+    compiled_mmol = DisplayFormatter(STYLE, MMOL_PREFS)
+    values = list(range(40, 400))
+    state = {"i": 0}
+
+    def cold():
+        # Bypass the memo: what a tick with a not-yet-seen value costs.
+        i = state["i"] = state["i"] + 1
+        return compiled._render(values[i % len(values)], "→")
+
+    return [
+        ("format: reference (mg/dL)", lambda: baseline.format_display_text(123, "→", STYLE, PREFS)),
+        ("format: reference (mmol)", lambda: baseline.format_display_text(123, "→", STYLE, MMOL_PREFS)),
+        ("format: compiled, render", cold),
+        ("format: compiled, memo hit", lambda: compiled.format(123, "→")),
+        ("format: compiled mmol, hit", lambda: compiled_mmol.format(123, "→")),
+        ("arrow: reference", lambda: baseline.get_arrow_symbol("SINGLE_UP", STYLE)),
+        ("arrow: compiled", lambda: compiled.arrow("SINGLE_UP")),
+        ("cached: reference", lambda: baseline.format_cached_text(CACHED, STYLE, NOW + 120)),
+        ("cached: compiled", lambda: compiled.format_cached(CACHED, now=NOW + 120)),
+        ("compile formatter", lambda: DisplayFormatter(STYLE, PREFS)),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    print(f"output matches the reference on {check_output()} cases")
+    print(f"best of {args.repeat} x {args.number} calls, ns per call")
+    for name, fn in cases():
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        print(f"{name:<30}{best / args.number * 1e9:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
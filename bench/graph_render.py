@@ -0,0 +1,117 @@
+"""
+Graph render latency: a fresh pyplot figure per call (the old generate_graph)
+vs. GraphRenderer's persistent Agg figure, for a cold render, a redraw after
+one new reading, and a repeat open with nothing new (PNG cache hit).
+Headless; no display needed.
+
+Usage: python -m bench.graph_render [--days 30] [--repeat 5]
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from graph import GraphRenderer  # noqa: E402
+from history import HistorySync  # noqa: E402
+from ring_store import RingStore  # noqa: E402
+from share_standin import SyntheticTrace  # noqa: E402
+
+READING_INTERVAL = 300
+STYLE = {"show_brackets": True}
+PREFS = {"units": "mg/dL", "low_threshold": 70.0, "high_threshold": 180.0}
+
+
+class _Reading:
+    def __init__(self, ts, value):
+        self.value = value
+        self.trend_arrow = "→"
+        self.datetime = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+
+
+class _OneReadingClient:
+    """Stands in for the Dexcom client: each sync returns the next trace reading."""
+
+    def __init__(self, trace, ts):
+        self.trace = trace
+        self.ts = ts
+
+    def get_glucose_readings(self, minutes=None, max_count=None):
+        self.ts += READING_INTERVAL
+        return [_Reading(self.ts, self.trace.reading(self.ts)[0])]
+
+
+def make_history(directory, days):
+    trace = SyntheticTrace(seed=0, phase=0)
+    now = int(time.time()) // READING_INTERVAL * READING_INTERVAL
+    times = trace.reading_times(now, days * 1440, days * 288)[::-1]
+    path = os.path.join(directory, "history.ring")
+    store = RingStore(path, capacity=len(times) + 1000)
+    store.extend((ts, trace.reading(ts)[0], 4) for ts in times)
+    store.close()
+    history = HistorySync(path, retention_days=days + 1, window_days=days + 1)
+    return history, _OneReadingClient(trace, times[-1])
+
+
+def legacy_render(history, path):
+    # The old generate_graph: new pyplot figure, full plot, savefig, close.
+    times, values, _ = history.columns()
+    predictions = history.predict(3)
+    plt.figure(figsize=(8, 4))
+    plt.plot(times, values, marker="o", label="Past Readings")
+    plt.plot([p.timestamp for p in predictions], [p.value for p in predictions], marker="x", linestyle="--",
+             label="Predictions")
+    plt.xlabel("Timestamp")
+    plt.ylabel("Glucose (mg/dL)")
+    plt.title("Glucose History and Future Predictions")
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        history, client = make_history(tmp, args.days)
+        legacy_path = os.path.join(tmp, "legacy.png")
+        renderer = GraphRenderer(history, os.path.join(tmp, "graph.png"))
+        results = {"legacy (per call)": [], "renderer cold": [], "renderer +1 reading": [], "renderer cache hit": []}
+        results["renderer cold"].append(timed(lambda: renderer.render(STYLE, PREFS)))
+        for _ in range(args.repeat):
+            results["legacy (per call)"].append(timed(lambda: legacy_render(history, legacy_path)))
+            history.sync(client)
+            results["renderer +1 reading"].append(timed(lambda: renderer.render(STYLE, PREFS)))
+            results["renderer cache hit"].append(timed(lambda: renderer.render(STYLE, PREFS)))
+        # Off-main-thread path: time from request() to the callback.
+        history.sync(client)
+        done = []
+        t0 = time.perf_counter()
+        renderer.request(STYLE, PREFS, callback=lambda path: done.append(time.perf_counter()))
+        while not done:
+            time.sleep(0.001)
+        results["request -> callback"] = [(done[0] - t0) * 1000]
+        renderer.stop()
+        history.store.close()
+    print(f"{len(history.window)} readings ({args.days} days); ms, {args.repeat} runs")
+    print(f"{'':<22}{'min':>9}{'median':>9}{'max':>9}")
+    for name, samples in results.items():
+        samples = sorted(samples)
+        print(f"{name:<22}{samples[0]:>9.1f}{samples[len(samples) // 2]:>9.1f}{samples[-1]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
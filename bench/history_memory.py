@@ -0,0 +1,69 @@
+"""
+In-memory history representation: list of reading dicts (as cached by the
+old fetch path) vs. the array-backed HistoryWindow. Reports memory per 10k
+readings and the cost of getting NumPy columns for prediction/graphing.
+
+Usage: python -m bench.history_memory [--readings 10000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from history_window import HistoryWindow
+
+READING_INTERVAL = 300
+
+
+def build_dicts(n, start):
+    return [{'value': 100 + i % 200, 'trend_arrow': '→', 'timestamp': start + i * READING_INTERVAL}
+            for i in range(n)]
+
+
+def build_window(n, start):
+    window = HistoryWindow(max_readings=n)
+    window.extend((start + i * READING_INTERVAL, 100 + i % 200, 4) for i in range(n))
+    return window
+
+
+def measure(build, n, start):
+    tracemalloc.start()
+    obj = build(n, start)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def best_of(fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readings", type=int, default=10000)
+    args = parser.parse_args(argv)
+    import numpy as np
+
+    n, start = args.readings, 1_700_000_000
+    dicts, dict_bytes = measure(build_dicts, n, start)
+    window, window_bytes = measure(build_window, n, start)
+    scale = 10000 / n
+
+    def dict_columns():
+        return (np.array([e["timestamp"] for e in dicts]), np.array([e["value"] for e in dicts]))
+
+    print(f"{'':<22}{'dicts':>14}{'HistoryWindow':>16}")
+    print(f"{'KiB per 10k readings':<22}{dict_bytes * scale / 1024:>14.1f}{window_bytes * scale / 1024:>16.1f}")
+    print(f"{'columns (us)':<22}{best_of(dict_columns):>14.1f}{best_of(window.numpy_columns):>16.1f}")
+    last_day = start + (n - 288) * READING_INTERVAL
+    print(f"{'last 24h slice (us)':<22}"
+          f"{best_of(lambda: [e for e in dicts if e['timestamp'] >= last_day]):>14.1f}"
+          f"{best_of(lambda: window.numpy_columns(last_day)):>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+History storage benchmark: whole-file JSON (glucose_history.json, as the
+prediction/graph code used to read it) vs. the memory-mapped RingStore, at
+90 days of 5-minute readings.
+
+Usage: python -m bench.history_store [--days 90]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from ring_store import RingStore, trend_code
+
+READING_INTERVAL = 300
+
+
+def make_entries(days, seed=0):
+    rng = random.Random(seed)
+    start = int(time.time()) - days * 86400
+    value = 120.0
+    entries = []
+    for k in range(days * 86400 // READING_INTERVAL):
+        value = max(40.0, min(400.0, value + rng.gauss(0, 4)))
+        entries.append({"value": int(value), "trend_arrow": "→", "timestamp": start + k * READING_INTERVAL})
+    return entries
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def bench_json(path, entries, repeat):
+    with open(path, "w") as f:
+        json.dump(entries, f)
+    newest = entries[-1]["timestamp"]
+
+    def load_sorted():
+        with open(path) as f:
+            history = json.load(f)
+        history.sort(key=lambda x: x["timestamp"])
+        return history
+
+    def append_one():
+        history = load_sorted()
+        history.append({"value": 100, "trend_arrow": "→", "timestamp": history[-1]["timestamp"] + READING_INTERVAL})
+        with open(path, "w") as f:
+            json.dump(history, f)
+
+    def last_day():
+        return [e for e in load_sorted() if e["timestamp"] >= newest - 86400]
+
+    return {
+        "load (full)": best_of(load_sorted, repeat),
+        "append 1": best_of(append_one, repeat),
+        "range 24h": best_of(last_day, repeat),
+        "size KiB": os.path.getsize(path) / 1024,
+    }
+
+
+def bench_ring(path, entries, repeat):
+    store = RingStore(path, capacity=len(entries) + 1000)
+    store.extend((e["timestamp"], e["value"], trend_code(e["trend_arrow"])) for e in entries)
+    store.close()
+    newest = entries[-1]["timestamp"]
+    ts = [newest]
+
+    def open_store():
+        RingStore(path, capacity=len(entries) + 1000).close()
+
+    store = RingStore(path, capacity=len(entries) + 1000)
+
+    def append_one():
+        ts[0] += READING_INTERVAL
+        store.append(ts[0], 100, 4)
+
+    result = {
+        "open": best_of(open_store, repeat),
+        "load (full)": best_of(store.range, repeat),
+        "append 1": best_of(append_one, repeat),
+        "range 24h": best_of(lambda: store.range(newest - 86400, newest), repeat),
+        "size KiB": os.path.getsize(path) / 1024,
+    }
+    store.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    entries = make_entries(args.days)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "json": bench_json(os.path.join(tmp, "history.json"), entries, args.repeat),
+            "ring": bench_ring(os.path.join(tmp, "history.ring"), entries, args.repeat),
+        }
+    print(f"{len(entries)} readings ({args.days} days); best of {args.repeat}, ms unless noted")
+    rows = ["open", "load (full)", "append 1", "range 24h", "size KiB"]
+    print(f"{'':<14}{'json':>12}{'ring':>12}")
+    for row in rows:
+        cells = "".join(f"{results[k][row]:>12.2f}" if row in results[k] else f"{'-':>12}" for k in ("json", "ring"))
+        print(f"{row:<14}{cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Credential lookup cost: reading the backend on every get_password() (the old
+keychain.py) vs. the memoizing CredentialProvider. Backends:
+
+    memory    MemoryBackend, the floor: what the provider itself costs
+    keychain  MemoryBackend behind a fixed delay per read (--latency), the
+              order of a Keychain lookup through keyring
+    security  one subprocess per read, like shelling out to
+              `security find-generic-password -w`
+    keyring   the system keyring (--keyring; writes a test entry)
+
+Usage: python -m bench.keychain [--number 2000] [--latency 0.002]
+"""
+import argparse
+import subprocess
+import sys
+import time
+import timeit
+
+from keychain import SERVICE_NAME, CredentialProvider, KeyringBackend, MemoryBackend
+
+USERNAME = "bench-user"
+SLOW_NUMBER = 50  # uncached lookups timed for the subprocess backend
+
+
+class DelayedBackend(MemoryBackend):
+    """MemoryBackend whose reads take `latency` seconds."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def get(self, service, username):
+        time.sleep(self.latency)
+        return super().get(service, username)
+
+
+class SubprocessBackend(MemoryBackend):
+    """MemoryBackend whose reads go through a child process, like the `security` CLI."""
+
+    def get(self, service, username):
+        password = super().get(service, username)
+        out = subprocess.run([sys.executable, "-S", "-c", "import sys; print(sys.argv[1])", password or ""],
+                             capture_output=True, text=True, check=True)
+        return out.stdout.rstrip("\n") or None
+
+
+def backends(args):
+    """(name, backend, uncached lookups to time)."""
+    out = [("memory", MemoryBackend(), args.number),
+           ("keychain", DelayedBackend(args.latency), args.number),
+           ("security", SubprocessBackend(), min(args.number, SLOW_NUMBER))]
+    if args.keyring:
+        out.append(("keyring", KeyringBackend(), args.number))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per read for the keychain row")
+    parser.add_argument("--keyring", action="store_true", help="also time the system keyring (writes a test entry)")
+    args = parser.parse_args(argv)
+    print(f"{args.number} lookups (uncached subprocess: {SLOW_NUMBER}), us per call")
+    print(f"{'backend':<10}{'uncached':>12}{'provider':>12}")
+    for name, backend, number in backends(args):
+        try:
+            backend.set(SERVICE_NAME, USERNAME, "secret")
+        except Exception as e:
+            print(f"{name:<10}unavailable: {e}")
+            continue
+        provider = CredentialProvider(backend)
+        uncached = timeit.timeit(lambda: backend.get(SERVICE_NAME, USERNAME), number=number)
+        cached = timeit.timeit(lambda: provider.get_password(USERNAME), number=args.number)
+        print(f"{name:<10}{uncached / number * 1e6:>12.2f}{cached / args.number * 1e6:>12.2f}"
+              f"   backend reads: {provider.stats['reads']}")
+        backend.delete(SERVICE_NAME, USERNAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Share outage simulation: how hard many clients hit Dexcom while it is down,
+whether they retry in lockstep, and how soon each one recovers.
+
+Every client fails its first poll within `--spread` seconds of the outage
+starting (clients that share a network blip, or accounts polled together) and
+then retries under one of three policies:
+  fixed300   the old fixed 5-minute timer
+  backoff    PollScheduler's exponential error backoff
+  breaker    PollScheduler following a CircuitBreaker (jittered backoff,
+             open/half-open probes)
+
+Usage: python -m bench.outage [--clients 200] [--hours 2] [--spread 1]
+"""
+import argparse
+import logging
+import random
+
+from breaker import CircuitBreaker
+from headless import percentile
+from scheduler import PollScheduler
+
+
+def simulate_client(policy, first_poll, outage, rng):
+    """Request times for one client, until its first successful poll after the outage."""
+    now = [first_poll]
+    breaker = None
+    if policy == "breaker":
+        breaker = CircuitBreaker(clock=lambda: now[0], rng=rng.random)
+    sched = PollScheduler(clock=lambda: now[0], breaker=breaker)
+    sched.last_reading_ts = -60.0  # it had a reading just before the outage
+    requests = []
+    t = first_poll
+    while True:
+        now[0] = t
+        if breaker is None or breaker.allow():
+            requests.append(t)
+            if t >= outage:
+                return requests
+            if breaker is not None:
+                breaker.record_failure()
+        sched.observe(None, ok=False, now=t)
+        t += 300.0 if policy == "fixed300" else sched.next_delay(now=t)
+
+
+def peak_per_second(times):
+    counts = {}
+    for t in times:
+        counts[int(t)] = counts.get(int(t), 0) + 1
+    return max(counts.values()) if counts else 0
+
+
+def run(policy, clients, outage, spread, seed):
+    rng = random.Random(seed)
+    during, retries, recovery = [], [], []
+    for _ in range(clients):
+        requests = simulate_client(policy, rng.uniform(0, spread), outage, random.Random(rng.random()))
+        during.extend(t for t in requests if t < outage)
+        retries.extend(t for t in requests[1:] if t < outage)
+        recovery.append(requests[-1] - outage)
+    return {
+        "req/client/hour": len(during) / clients / (outage / 3600),
+        # The first failure is the outage itself; lockstep shows in the retries.
+        "peak retries/s": peak_per_second(retries),
+        "recovery p50 s": percentile(recovery, 50),
+        "recovery p95 s": percentile(recovery, 95),
+        "recovery max s": max(recovery),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--hours", type=float, default=2.0, help="outage length")
+    parser.add_argument("--spread", type=float, default=1.0, help="seconds over which first failures are spread")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print(f"{args.clients} clients, {args.hours:g} h outage, first failures within {args.spread:g} s")
+    header = f"{'policy':<10}{'req/client/h':>14}{'peak retry/s':>14}{'recov p50 s':>13}{'recov p95 s':>13}{'recov max s':>13}"
+    print(header)
+    print("-" * len(header))
+    for policy in ("fixed300", "backoff", "breaker"):
+        r = run(policy, args.clients, args.hours * 3600, args.spread, args.seed)
+        print(f"{policy:<10}{r['req/client/hour']:>14.1f}{r['peak retries/s']:>14}{r['recovery p50 s']:>13.0f}"
+              f"{r['recovery p95 s']:>13.0f}{r['recovery max s']:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Poll scheduling simulation: fixed 300 s timer vs. the reading-aligned
+PollScheduler, on synthetic 5-minute CGM traces with a per-reading upload lag
+and occasional missed readings.
+
+Reports mean display staleness (age of the reading on screen, time-weighted),
+mean arrival-to-display latency and requests per hour after the first hour,
+and fails if the adaptive policy makes more requests per hour than the fixed
+timer. The first hour is left out of the rate so the start-up fetch, which
+neither policy schedules, does not count against the one whose first slot
+comes sooner.
+
+Usage: python -m bench.poll_schedule [--hours 24] [--seeds 20]
+"""
+import argparse
+import random
+
+from scheduler import PollScheduler, READING_INTERVAL
+
+CURRENT_WINDOW = 600  # get_current_glucose_reading only returns the last 10 minutes
+WARMUP = 3600  # seconds before requests are counted
+
+
+def make_trace(seed, hours, lag_range=(10.0, 60.0), gap_rate=0.02):
+    """[(reading_ts, available_at)] for a sensor with a random phase."""
+    rng = random.Random(seed)
+    start = 1_700_000_000 + rng.uniform(0, READING_INTERVAL)
+    trace = []
+    for k in range(int(hours * 3600 / READING_INTERVAL) + 2):
+        if rng.random() < gap_rate:
+            continue
+        ts = start + k * READING_INTERVAL
+        trace.append((ts, ts + rng.uniform(*lag_range)))
+    return trace
+
+
+def newest_available(trace, t):
+    best = None
+    for ts, available_at in trace:
+        if available_at > t:
+            break
+        if ts >= t - CURRENT_WINDOW:
+            best = ts
+    return best
+
+
+def simulate(trace, hours, next_delay, observe=None, start_offset=0.0):
+    start = trace[0][0] + start_offset
+    end = start + hours * 3600
+    arrivals = dict(trace)
+    t = start
+    requests = 0
+    counted_from = start + WARMUP
+    shown_ts = None
+    stale_area = 0.0
+    stale_time = 0.0
+    latencies = []
+    while t < end:
+        requests += t >= counted_from
+        ts = newest_available(trace, t)
+        if observe:
+            observe(ts, t)
+        if ts is not None and (shown_ts is None or ts > shown_ts):
+            latencies.append(t - arrivals[ts])
+            shown_ts = ts
+        nxt = min(end, t + next_delay(t))
+        if shown_ts is not None:
+            stale_area += (nxt - t) * ((t + nxt) / 2 - shown_ts)
+            stale_time += nxt - t
+        t = nxt
+    return {
+        "staleness": stale_area / stale_time if stale_time else 0.0,
+        "latency": sum(latencies) / len(latencies) if latencies else 0.0,
+        "requests_per_hour": requests * 3600 / (end - counted_from),
+    }
+
+
+def run_fixed(trace, hours, rng):
+    return simulate(trace, hours, lambda t: 300.0, start_offset=rng.uniform(0, READING_INTERVAL))
+
+
+def run_adaptive(trace, hours, rng):
+    sched = PollScheduler()
+    return simulate(trace, hours, lambda t: sched.next_delay(now=t),
+                    observe=lambda ts, t: sched.observe(ts, ok=True, now=t),
+                    start_offset=rng.uniform(0, READING_INTERVAL))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--seeds", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'policy':<10}{'staleness s':>13}{'arrival->display s':>20}{'req/hour':>10}")
+    results = {}
+    for name, runner in (("fixed300", run_fixed), ("adaptive", run_adaptive)):
+        totals = {"staleness": 0.0, "latency": 0.0, "requests_per_hour": 0.0}
+        for seed in range(args.seeds):
+            result = runner(make_trace(seed, args.hours), args.hours, random.Random(seed + 1000))
+            for key in totals:
+                totals[key] += result[key] / args.seeds
+        print(f"{name:<10}{totals['staleness']:>13.1f}{totals['latency']:>20.1f}{totals['requests_per_hour']:>10.2f}")
+        results[name] = totals
+    fixed, adaptive = results["fixed300"], results["adaptive"]
+    assert adaptive["requests_per_hour"] <= fixed["requests_per_hour"], \
+        f"adaptive polls {adaptive['requests_per_hour']:.2f}/h, fixed timer {fixed['requests_per_hour']:.2f}/h"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Trend prediction benchmark: np.polyfit over the whole in-memory history on
+every call (the old predict_future_readings) vs. the incremental
+TrendPredictor, on a synthetic CGM trace. Reports 5/10/15-minute-ahead mean
+absolute error, 95% band coverage, and cost per new reading.
+
+Usage: python -m bench.predictor [--days 7] [--seed 0] [--half-life 600]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from predictor import DEFAULT_HALF_LIFE, TrendPredictor
+from share_standin import SyntheticTrace
+
+READING_INTERVAL = 300
+HORIZON = 3
+
+
+def make_trace(days, seed):
+    trace = SyntheticTrace(seed=seed, phase=0)
+    end = 1_700_000_000 - 1_700_000_000 % READING_INTERVAL
+    times = trace.reading_times(end, days * 1440, days * 288)[::-1]
+    return np.array(times, dtype=np.int64), np.array([trace.reading(ts)[0] for ts in times], dtype=np.float64)
+
+
+def polyfit_predict(times, values, count):
+    # Same arithmetic as the old DexcomMenuApp.predict_future_readings.
+    m, b = np.polyfit(times, values, 1)
+    avg_delta = np.mean(np.diff(times))
+    return [m * (times[-1] + i * avg_delta) + b for i in range(1, count + 1)]
+
+
+def run_polyfit(times, values, window=None):
+    preds, elapsed = {}, 0.0
+    for k in range(2, len(times)):
+        lo = 0 if window is None else max(0, k + 1 - window)
+        t0 = time.perf_counter()
+        preds[k] = polyfit_predict(times[lo:k + 1], values[lo:k + 1], HORIZON)
+        elapsed += time.perf_counter() - t0
+    return preds, None, elapsed
+
+
+def run_incremental(times, values, half_life=DEFAULT_HALF_LIFE):
+    predictor = TrendPredictor(half_life=half_life, horizon=HORIZON)
+    preds, bands, elapsed = {}, {}, 0.0
+    ts_list, value_list = times.tolist(), values.tolist()
+    for k in range(len(ts_list)):
+        t0 = time.perf_counter()
+        predictor.update(ts_list[k], value_list[k])
+        out = predictor.predict()
+        elapsed += time.perf_counter() - t0
+        if k >= 2:
+            preds[k] = [p.value for p in out]
+            bands[k] = [(p.low, p.high) for p in out]
+    return preds, bands, elapsed
+
+
+def score(values, preds, bands):
+    errors = [[] for _ in range(HORIZON)]
+    covered = total = 0
+    for k, pred in preds.items():
+        for i in range(HORIZON):
+            if k + i + 1 < len(values):
+                actual = values[k + i + 1]
+                errors[i].append(abs(pred[i] - actual))
+                if bands is not None:
+                    low, high = bands[k][i]
+                    covered += low <= actual <= high
+                    total += 1
+    mae = [float(np.mean(e)) for e in errors]
+    return mae, (covered / total if total else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--half-life", type=float, default=DEFAULT_HALF_LIFE, help="seconds")
+    args = parser.parse_args(argv)
+    times, values = make_trace(args.days, args.seed)
+    runs = {
+        "polyfit (all)": run_polyfit(times, values),
+        "polyfit (1h)": run_polyfit(times, values, window=12),
+        "incremental": run_incremental(times, values, args.half_life),
+    }
+    print(f"{len(times)} readings ({args.days} days), seed {args.seed}")
+    print(f"{'':<16}{'MAE +5m':>9}{'+10m':>8}{'+15m':>8}{'band cov':>10}{'us/reading':>12}")
+    for name, (preds, bands, elapsed) in runs.items():
+        mae, coverage = score(values, preds, bands)
+        cov = f"{coverage:>10.1%}" if coverage is not None else f"{'-':>10}"
+        print(f"{name:<16}{mae[0]:>9.1f}{mae[1]:>8.1f}{mae[2]:>8.1f}{cov}{elapsed / len(preds) * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Hot-path benchmarks (pytest-benchmark): settings load/save, title
+formatting, history load and prediction at 1 day / 30 days / 1 year of
+readings, and graph rendering. See bench/conftest.py for how to record and
+compare baselines.
+"""
+import itertools
+import json
+import os
+
+import pytest
+
+import settings
+from bench.graph_render import make_history
+from formatter import DisplayFormatter
+from history import HistorySync
+
+DAYS = [1, 30, 365]
+ARROWS = ["FLAT", "SINGLE_UP", "FORTY_FIVE_DOWN", "DOUBLE_DOWN", None]
+# A day's worth of distinct titles: in range most of the time, with the usual
+# trends. Fits in the formatter's memo, as real ticks do.
+DAY_READINGS = list(itertools.product(range(90, 180), ARROWS))
+# Every value Share reports (40-400 mg/dL), for the uncached render.
+ALL_READINGS = list(itertools.product(range(40, 401), ARROWS))
+
+
+@pytest.fixture(scope="module", params=DAYS, ids=lambda days: f"{days}d")
+def history_file(request, tmp_path_factory):
+    """(path, days) of a ring store holding `days` of 5-minute readings."""
+    days = request.param
+    history, _ = make_history(str(tmp_path_factory.mktemp(f"history-{days}d")), days)
+    history.store.close()
+    return history.path, days
+
+
+# --- settings ---
+
+@pytest.fixture
+def user_settings():
+    data = settings._deepcopy_defaults()
+    data["username"] = "bench-user"
+    data["style_settings"].update(number_high="HIGH %s", show_brackets=False)
+    data["preferences"].update(units="mmol/L", low_threshold=80.0)
+    data["network"]["backend"] = "asyncio"
+    return data
+
+
+def test_load_settings(benchmark, tmp_path, user_settings):
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps(settings._persisted(user_settings), indent=4))
+    loaded = benchmark(settings.load_settings, str(path))
+    assert loaded["preferences"]["units"] == "mmol/L"
+
+
+def test_save_settings(benchmark, tmp_path, monkeypatch, user_settings):
+    monkeypatch.setattr(settings, "SETTINGS_FILE", str(tmp_path / "settings.json"))
+    benchmark(settings.save_settings, user_settings)
+    assert settings.load_settings(settings.SETTINGS_FILE)["username"] == "bench-user"
+
+
+def test_settings_store_update(benchmark, tmp_path, user_settings):
+    # What a settings change costs the caller; the write itself is debounced.
+    store = settings.SettingsStore(str(tmp_path / "settings.json"), debounce=3600)
+    benchmark(store.update, user_settings)
+    store.flush()
+
+
+# --- formatting ---
+
+@pytest.mark.parametrize("units", ["mg/dL", "mmol/L"])
+def test_format_display_text(benchmark, menu_app, units):
+    assert len(DAY_READINGS) <= DisplayFormatter.MEMO_SIZE
+    menu_app.engine.preferences = dict(menu_app.engine.preferences, units=units)
+    menu_app.engine.recompile_formatter()
+
+    def format_all():
+        for value, arrow in DAY_READINGS:
+            menu_app._format_display_text(value, arrow)
+
+    benchmark(format_all)
+    benchmark.extra_info["calls_per_round"] = len(DAY_READINGS)
+
+
+@pytest.mark.parametrize("units", ["mg/dL", "mmol/L"])
+def test_format_display_text_cold(benchmark, menu_app, units):
+    # A title not seen since the last settings change: rendered, not memoized.
+    menu_app.engine.preferences = dict(menu_app.engine.preferences, units=units)
+    render = menu_app.engine.recompile_formatter()._render
+
+    def render_all():
+        for value, arrow in ALL_READINGS:
+            render(value, arrow)
+
+    benchmark(render_all)
+    benchmark.extra_info["calls_per_round"] = len(ALL_READINGS)
+
+
+def test_format_display_text_after_settings_change(benchmark, menu_app):
+    # First title after a style/preferences change: the formatter is rebuilt.
+    def reformat():
+        menu_app.engine.recompile_formatter()
+        return menu_app._format_display_text(123, "FLAT")
+
+    benchmark(reformat)
+
+
+# --- history and prediction ---
+
+def test_history_load(benchmark, history_file):
+    path, days = history_file
+
+    def load():
+        history = HistorySync(path, retention_days=days + 1)
+        history.store.close()
+        return history
+
+    history = benchmark(load)
+    assert history.window.newest() is not None
+
+
+def test_predict_future_readings(benchmark, menu_app, history_file):
+    path, days = history_file
+    menu_app.engine.history = HistorySync(path, retention_days=days + 1)
+    predictions = benchmark(menu_app.predict_future_readings, 3)
+    assert len(predictions) == 3
+    menu_app.engine.history.store.close()
+
+
+# --- graph ---
+
+@pytest.mark.parametrize("days", [1, 30], ids=lambda days: f"{days}d")
+def test_generate_graph(benchmark, menu_app, tmp_path, days):
+    # Each round syncs one new reading first, so every render is a redraw.
+    history, client = make_history(str(tmp_path), days)
+    menu_app.engine.history = menu_app.graph.history = history
+    menu_app.generate_graph()
+
+    def new_reading():
+        history.sync(client)
+
+    benchmark.pedantic(menu_app.generate_graph, setup=new_reading, rounds=10, warmup_rounds=1)
+    assert os.path.exists(menu_app.graph.path)
+    history.store.close()
+
+
+def test_generate_graph_cached(benchmark, menu_app, tmp_path):
+    history, _ = make_history(str(tmp_path), 30)
+    menu_app.engine.history = menu_app.graph.history = history
+    menu_app.generate_graph()
+    benchmark(menu_app.generate_graph)
+    assert menu_app.graph.stats["cache_hits"] > 0
+    history.store.close()
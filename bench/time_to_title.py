@@ -0,0 +1,100 @@
+"""
+Time-to-title benchmark against the local Share stand-in.
+
+Each scenario starts a fresh stand-in (latency / error / session-expiry
+injection), points a GlucoseEngine at it and measures the time from the start
+of a tick until the subscriber receives the rendered title.
+
+In "refreshing" the session manager assumes a shorter lifetime than the
+server's and refreshes in the background first. In the "expiring" scenarios
+the server expires sessions before the manager expects: fetches hit pydexcom's
+SessionError retry (cold), and the manager learns a shorter max_age, which the
+run checks for "expiring".
+
+Usage: python -m bench.time_to_title [--ticks 200]
+"""
+import argparse
+import time
+
+from engine import GlucoseEngine
+from headless import percentile
+from session_manager import SessionManager
+from share_standin import ShareStandin, StandinConfig
+
+# Session manager settings: a short assumed lifetime so the background
+# refresh gets exercised, or a long one the server undercuts.
+REFRESHING = dict(max_age=0.4, refresh_margin=0.1)
+UNDERCUT = dict(max_age=1.0, refresh_margin=0.1, min_max_age=0.05)
+
+SCENARIOS = {
+    "baseline": dict(),
+    "slow": dict(latency=0.05, latency_jitter=0.02),
+    "flaky": dict(error_rate=0.1),
+    "refreshing": dict(session_ttl=0.5),
+    "expiring": dict(session_ttl=0.2, sessions=UNDERCUT),
+    "slow+flaky+expiring": dict(latency=0.05, latency_jitter=0.02, error_rate=0.1, session_ttl=0.2,
+                                sessions=UNDERCUT),
+}
+
+
+def run_scenario(name, ticks, interval, sessions=REFRESHING, **config):
+    standin = ShareStandin(StandinConfig(trace_seed=1, **config))
+    base_url = standin.start()
+    max_age = sessions["max_age"]
+    sessions = SessionManager(**sessions)
+    try:
+        engine = GlucoseEngine(username="bench", password="bench", base_url=base_url, sessions=sessions)
+        started = [0.0]
+        samples = []
+        engine.subscribe(lambda text: samples.append(time.perf_counter() - started[0]))
+        for _ in range(ticks):
+            started[0] = time.perf_counter()
+            engine.tick()
+            if interval:
+                time.sleep(interval)
+        server = standin.snapshot_stats()
+    finally:
+        sessions.stop()
+        standin.stop()
+    ms = [s * 1000 for s in samples]
+    return {
+        "scenario": name,
+        "p50_ms": percentile(ms, 50),
+        "p99_ms": percentile(ms, 99),
+        "logins": engine.stats["logins"],
+        "cold": engine.sessions.stats["cold"],
+        "refreshes": engine.sessions.stats["refreshes"],
+        "errors": engine.stats["errors"],
+        "session_retries": server["session_errors"],
+        "requests": server["requests"],
+        "max_age": sessions.max_age,
+        # Checked only without injected errors, which can open the breaker first.
+        "undercut": bool(config.get("session_ttl")) and config["session_ttl"] < max_age
+                    and not config.get("error_rate"),
+        "assumed_max_age": max_age,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between ticks")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    args = parser.parse_args(argv)
+
+    header = (f"{'scenario':<22}{'p50 ms':>9}{'p99 ms':>9}{'logins':>8}{'cold':>6}{'refresh':>9}{'errors':>8}"
+              f"{'sess.retry':>11}{'requests':>10}{'max_age s':>11}")
+    print(header)
+    print("-" * len(header))
+    for name in args.scenario or list(SCENARIOS):
+        r = run_scenario(name, args.ticks, args.interval, **SCENARIOS[name])
+        print(f"{r['scenario']:<22}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['logins']:>8}{r['cold']:>6}{r['refreshes']:>9}"
+              f"{r['errors']:>8}{r['session_retries']:>11}{r['requests']:>10}{r['max_age']:>11.2f}")
+        if r["undercut"]:
+            # The server expired sessions first: the retry path ran and the manager learned from it.
+            assert r["session_retries"] > 0 and r["cold"] > 0, f"{name}: no server-expired session was hit"
+            assert r["max_age"] < r["assumed_max_age"], f"{name}: max_age stayed at {r['max_age']}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# breaker.py
+"""
+Circuit breaker around Dexcom Share calls. After `failure_threshold`
+consecutive failures the breaker opens and calls are short-circuited (the
+engine shows the last reading with its age instead) until a jittered,
+capped exponential backoff has passed. Then one probe call is let through
+(half-open): success closes the breaker, failure opens it again for longer.
+
+The same backoff spaces out retries before the breaker opens, and the jitter
+keeps many clients that failed together from retrying in lockstep.
+"""
+import logging
+import random
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_BASE_DELAY = 30.0
+DEFAULT_MAX_DELAY = 900.0
+DEFAULT_JITTER = 0.25       # each delay is drawn from (1 +/- jitter) x the exponential delay
+DEFAULT_PROBE_TIMEOUT = 120.0  # a half-open probe that never reports back frees the slot after this
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, jitter=DEFAULT_JITTER, probe_timeout=DEFAULT_PROBE_TIMEOUT,
+                 clock=time.monotonic, rng=random.random):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        self.rng = rng
+        self.state = CLOSED
+        self.failures = 0  # consecutive
+        self._retry_at = None
+        self._probe_at = None
+        self._lock = threading.Lock()
+        self._subscribers = []
+        # Transition counters: "opened" includes re-opening after a failed probe.
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0, "half_opened": 0, "closed": 0}
+
+    def subscribe(self, callback):
+        """Register callback(old_state, new_state), called on every transition."""
+        self._subscribers.append(callback)
+
+    def backoff(self, failures):
+        """Jittered delay after `failures` consecutive failures; the mean stays on the exponential curve."""
+        delay = min(self.max_delay, self.base_delay * 2 ** max(0, failures - 1))
+        return delay * (1.0 + self.jitter * (2.0 * self.rng() - 1.0))
+
+    def allow(self):
+        """True if a call may go out now. While half-open only one probe is allowed at a time."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = self.clock()
+            if self.state == OPEN:
+                if now < self._retry_at:
+                    self.stats["rejected"] += 1
+                    return False
+                transition = self._move(HALF_OPEN)
+            elif self._probe_at is not None and now - self._probe_at < self.probe_timeout:
+                self.stats["rejected"] += 1
+                return False
+            else:
+                transition = None
+            self._probe_at = now
+        self._notify(transition)
+        return True
+
+    def record_success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            self.failures = 0
+            self._retry_at = self._probe_at = None
+            transition = self._move(CLOSED) if self.state != CLOSED else None
+        self._notify(transition)
+
+    def record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self.failures += 1
+            self._retry_at = self.clock() + self.backoff(self.failures)
+            self._probe_at = None
+            transition = None
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                transition = self._move(OPEN)
+        self._notify(transition)
+
+    def reset(self):
+        """Forget past failures (e.g. new credentials) and close."""
+        with self._lock:
+            self.failures = 0
+            self._retry_at = self._probe_at = None
+            transition = self._move(CLOSED) if self.state != CLOSED else None
+        self._notify(transition)
+
+    def retry_in(self):
+        """Seconds until the next attempt is due: 0 when healthy, else the current backoff."""
+        with self._lock:
+            if self._retry_at is None:
+                return 0.0
+            return max(0.0, self._retry_at - self.clock())
+
+    def _move(self, state):
+        # Caller holds the lock; returns the transition to report once it is released.
+        old, self.state = self.state, state
+        self.stats[{OPEN: "opened", HALF_OPEN: "half_opened", CLOSED: "closed"}[state]] += 1
+        return old, state
+
+    def _notify(self, transition):
+        if transition is None:
+            return
+        old, new = transition
+        if new == OPEN:
+            logging.warning("Dexcom circuit breaker open after %d failures; retrying in %.0f s",
+                            self.failures, self.retry_in())
+        elif new == CLOSED:
+            logging.info("Dexcom circuit breaker closed")
+        for callback in list(self._subscribers):
+            try:
+                callback(old, new)
+            except Exception as e:
+                logging.error("Breaker subscriber failed: %s", e)
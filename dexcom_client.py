@@ -0,0 +1,96 @@
+# dexcom_client.py
+"""
+Thin pydexcom wrapper used by the polling engine. Requests go through an
+injected (normally the shared, pooled) requests.Session, can be redirected to
+a local Share stand-in, and re-logins reuse the known account ID so they cost
+a single request. A session ID saved from an earlier run can be resumed
+without logging in at all.
+"""
+from typing import Optional
+
+import requests
+from pydexcom import Dexcom
+from pydexcom.const import Region
+
+from http_pool import get_shared_session
+
+DEFAULT_TIMEOUT = 15  # seconds; pydexcom itself never times out
+
+
+def region_for(region) -> Region:
+    """Map the region string stored in settings.json to a pydexcom Region."""
+    name = str(region or "us").lower()
+    if name in ("us", "usa", "united states"):
+        return Region.US
+    if name == "jp":
+        return Region.JP
+    return Region.OUS
+
+
+class ShareClient(Dexcom):
+    """pydexcom client that posts through an injected session, optionally to another Share host."""
+
+    def __init__(self, *, username: str, password: str, region="us", base_url: Optional[str] = None,
+                 http_session: Optional[requests.Session] = None, account_id: Optional[str] = None,
+                 session_id: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT):
+        # Must be set before Dexcom.__init__ logs in through _post.
+        self._base_url_override = base_url.rstrip("/") if base_url else None
+        self._http = http_session if http_session is not None else get_shared_session()
+        self._timeout = timeout
+        # Bumped on every login, including pydexcom's own retry after a SessionError.
+        self.logins = 0
+        # Used instead of the initial login; if it has expired, pydexcom's
+        # SessionError retry logs in for real on the first request.
+        self._resume_session_id = session_id if account_id else None
+        if account_id:
+            # Known account: skip AuthenticatePublisherAccount and log in by ID.
+            super().__init__(account_id=account_id, password=password, region=region_for(region))
+            self._username = username
+        else:
+            super().__init__(username=username, password=password, region=region_for(region))
+        # pydexcom's own requests.Session is only used by the _post overridden
+        # below; drop it so each client costs no more than its state.
+        self._Dexcom__session = None
+
+    @property
+    def account_id(self) -> Optional[str]:
+        return self._account_id
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return self._session_id
+
+    def _session(self) -> None:
+        if self._resume_session_id:
+            self._session_id, self._resume_session_id = self._resume_session_id, None
+            self._validate_account_id()
+            self._validate_session_id()
+            return
+        super()._session()
+        self.logins += 1
+
+    def _post(self, endpoint, params=None, json=None):
+        base_url = self._base_url_override or self._base_url
+        response = self._http.post(
+            f"{base_url}/{endpoint}",
+            headers={"Accept-Encoding": "application/json"},
+            params=params,
+            json={} if json is None else json,
+            timeout=self._timeout,
+        )
+        try:
+            response.raise_for_status()
+            return response.json()
+        except requests.HTTPError as http_error:
+            error = self._handle_response(response)
+            if error:
+                raise error from http_error
+            raise
+
+
+def create_client(username: str, password: str, region="us", base_url: Optional[str] = None,
+                  http_session: Optional[requests.Session] = None, account_id: Optional[str] = None,
+                  session_id: Optional[str] = None) -> ShareClient:
+    """Log in (or resume `session_id`) and return a ready client. Raises pydexcom errors on failure."""
+    return ShareClient(username=username, password=password, region=region, base_url=base_url,
+                       http_session=http_session, account_id=account_id, session_id=session_id)
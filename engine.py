@@ -0,0 +1,514 @@
+# engine.py
+"""
+UI-free polling core. Owns the Dexcom session, the last reading and the
+title formatting; the menu bar app (and headless.py) only subscribe to the
+rendered text. Nothing here imports Cocoa or rumps.
+"""
+import logging
+import time
+
+import metrics
+from breaker import CircuitBreaker
+from formatter import DisplayFormatter
+from session_manager import SessionManager
+from settings import DEFAULT_SETTINGS
+
+
+class _HistoryReading:
+    # Adapts a stored history entry to the GlucoseReading attributes used here.
+    def __init__(self, entry):
+        self.value = entry["value"]
+        self.trend_arrow = entry.get("trend_arrow")
+        self.timestamp = entry["timestamp"]
+
+
+def _reading_timestamp(reading):
+    if hasattr(reading, "timestamp"):
+        return reading.timestamp
+    try:
+        return reading.datetime.timestamp()
+    except Exception:
+        return None
+
+
+class GlucoseEngine:
+    def __init__(self, username="", password="", region="us", style_settings=None, preferences=None,
+                 base_url=None, cache=None, client_factory=None, http_session=None,
+                 sessions=None, history=None, async_client_factory=None, breaker=None, reachability=None,
+                 clock=time.time):
+        self.username = username
+        self.password = password
+        self.region = region
+        self.style_settings = style_settings if style_settings is not None else dict(DEFAULT_SETTINGS["style_settings"])
+        self.preferences = preferences if preferences is not None else dict(DEFAULT_SETTINGS["preferences"])
+        self.recompile_formatter()
+        self.base_url = base_url
+        self.cache = cache
+        # None means dexcom_client.create_client, imported on first login
+        # (pydexcom and requests are slow to import).
+        self.client_factory = client_factory
+        # Same for tick_async(): None means async_client.create_client.
+        self.async_client_factory = async_client_factory
+        # None means the process-wide pooled session from http_pool. With the
+        # asyncio backend this is an async_client.AsyncSession instead.
+        self.http_session = http_session
+        # Owns the live client and keeps its session warm in the background.
+        self.sessions = sessions if sessions is not None else SessionManager()
+        # Every login, fetch and background refresh goes through the breaker;
+        # while it is open, ticks show the last reading without calling Dexcom.
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        if getattr(self.sessions, "breaker", None) is None:
+            self.sessions.breaker = self.breaker
+        # Optional reachability.Reachability for the Share host: when it says
+        # offline, ticks skip Dexcom (and the breaker) and show the last reading.
+        self.reachability = reachability
+        # Optional HistorySync; when set, each tick is one incremental history fetch.
+        self.history = history
+        # Remembered across re-logins so they skip the account lookup request.
+        self.account_id = None
+        # Wall clock used to age readings; a reading's age always comes from its
+        # own sensor timestamp, never from when it was fetched.
+        self.clock = clock
+
+        # Last reading
+        self.current_value = None
+        self.current_trend_arrow = None
+        # Epoch seconds of the reading itself (sensor time), not of the fetch
+        self.current_timestamp = None
+        self.last_fetch_ok = False
+        # True when the last tick was skipped because the network was down.
+        self.offline = False
+        # While the probe says offline, a real fetch still goes out on the
+        # breaker's backoff: the probe cannot see every route (PAC, VPNs).
+        self._offline_attempts = 0
+        self._offline_retry_at = None
+
+        # Hooks set by the UI layer; called on whichever thread triggered them.
+        self.on_authenticated = None
+        self.on_account_error = None
+        self._subscribers = []
+
+        # Plain counters; cheap enough to bump on every tick.
+        self.stats = {"ticks": 0, "logins": 0, "resumes": 0, "errors": 0, "cache_fallbacks": 0, "short_circuits": 0,
+                      "offline_skips": 0, "offline_attempts": 0, "stale_readings": 0, "wakes": 0}
+        self._saved_session_id = None
+
+    @property
+    def dexcom(self):
+        return self.sessions.client
+
+    @dexcom.setter
+    def dexcom(self, client):
+        if client is None:
+            self.sessions.clear()
+        else:
+            self.sessions.attach(client)
+
+    def subscribe(self, callback):
+        """Register callback(display_text), called after every tick."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def _publish(self, text):
+        for callback in list(self._subscribers):
+            try:
+                callback(text)
+            except Exception as e:
+                logging.error("Display subscriber failed: %s", e)
+
+    def has_credentials(self):
+        return bool(self.username and self.password)
+
+    def set_credentials(self, username, password, region):
+        if (username, region) != (self.username, self.region):
+            # Stored readings belong to the previous account; the owner of the
+            # history (app._open_history) attaches the new account's.
+            self.history = None
+        if username != self.username:
+            self._forget_reading()
+        self.username = username
+        self.password = password
+        self.region = region
+        self.account_id = None
+        self.dexcom = None
+        self.breaker.reset()
+        self._forget_session()
+
+    def clear_credentials(self):
+        self.set_credentials("", "", self.region)
+        self._forget_reading()
+
+    def _forget_reading(self):
+        # The last reading, in memory and in the snapshot, is the old user's.
+        self.current_value = self.current_trend_arrow = self.current_timestamp = None
+        if self.cache is not None and hasattr(self.cache, "clear"):
+            try:
+                self.cache.clear()
+            except Exception as e:
+                logging.error("Error clearing cached reading: %s", e)
+
+    def resumed(self, gap):
+        """
+        The machine just woke after `gap` seconds asleep. Re-publish the last
+        reading so its age shows (and its arrow goes) before the catch-up fetch,
+        and drop backoff and connectivity state that predates the sleep.
+        """
+        self.stats["wakes"] += 1
+        self.breaker.reset()
+        if self.reachability is not None:
+            self.reachability.invalidate()
+        self._publish(self.current_display_text())
+
+    def authenticate(self):
+        """Log in to Dexcom Share (or resume a saved session). Returns True when a session was established."""
+        from pydexcom.errors import AccountError
+        client_factory = self.client_factory
+        if client_factory is None:
+            from dexcom_client import create_client as client_factory
+        kwargs, resume = self._login_kwargs()
+        try:
+            with metrics.timer("login"):
+                client = client_factory(self.username, self.password, self.region, **kwargs)
+        except AccountError as e:
+            self._login_rejected(e)
+            return False
+        except Exception as e:
+            if self._login_failed(e, resume):
+                return self.authenticate()
+            return False
+        self._logged_in(client, resume)
+        return True
+
+    async def authenticate_async(self):
+        """authenticate() for the asyncio backend (async_client)."""
+        from pydexcom.errors import AccountError
+        client_factory = self.async_client_factory
+        if client_factory is None:
+            from async_client import create_client as client_factory
+        kwargs, resume = self._login_kwargs()
+        try:
+            with metrics.timer("login"):
+                client = await client_factory(self.username, self.password, self.region, **kwargs)
+        except AccountError as e:
+            self._login_rejected(e)
+            return False
+        except Exception as e:
+            if self._login_failed(e, resume):
+                return await self.authenticate_async()
+            return False
+        self._logged_in(client, resume)
+        return True
+
+    def _login_kwargs(self):
+        kwargs = {"base_url": self.base_url, "http_session": self.http_session, "account_id": self.account_id}
+        resume = self._saved_session()
+        if resume:
+            kwargs["account_id"], kwargs["session_id"], _ = resume
+        return kwargs, resume
+
+    def _login_rejected(self, e):
+        # Also a failure for the breaker: repeated bad logins get the account locked.
+        self.breaker.record_failure()
+        self.dexcom = None
+        self._forget_session()
+        if self.on_account_error:
+            self.on_account_error(e)
+
+    def _login_failed(self, e, resume):
+        """Returns True if the login should be retried without the saved session."""
+        self.dexcom = None
+        if resume:
+            # Unusable saved session: drop it and log in normally.
+            logging.warning("Could not resume saved session: %s", e)
+            self._forget_session()
+            metrics.inc("login_retries")
+            return True
+        logging.error("Unexpected error during authentication: %s", e)
+        self.breaker.record_failure()
+        if self.reachability is not None:
+            self.reachability.invalidate()
+        return False
+
+    def _logged_in(self, client, resume):
+        self.breaker.record_success()
+        self.sessions.attach(client, age=resume[2] if resume else 0.0)
+        self.account_id = getattr(client, "account_id", None)
+        self.stats["resumes" if resume else "logins"] += 1
+        self._remember_session()
+        if self.on_authenticated:
+            self.on_authenticated()
+
+    # --- saved session (warm start) ---
+
+    def _saved_session(self):
+        """(account_id, session_id, age) from the cache if it is fresh enough to reuse, else None."""
+        if self.cache is None or not hasattr(self.cache, "session"):
+            return None
+        try:
+            return self.cache.session(self.username, self.region,
+                                      self.sessions.max_age - self.sessions.refresh_margin)
+        except Exception as e:
+            logging.error("Error reading saved session: %s", e)
+            return None
+
+    def _remember_session(self):
+        # Cheap when nothing changed: only a new session ID is written out.
+        client = self.dexcom
+        session_id = getattr(client, "session_id", None)
+        if not session_id or session_id == self._saved_session_id:
+            return
+        self._saved_session_id = session_id
+        if self.cache is not None and hasattr(self.cache, "save_session"):
+            try:
+                self.cache.save_session(self.username, self.region, self.account_id, session_id,
+                                        age=self.sessions.age() or 0.0)
+            except Exception as e:
+                logging.error("Error saving session: %s", e)
+
+    def _forget_session(self):
+        self._saved_session_id = None
+        if self.cache is not None and hasattr(self.cache, "clear_session"):
+            try:
+                self.cache.clear_session()
+            except Exception as e:
+                logging.error("Error clearing saved session: %s", e)
+
+    def tick(self):
+        """Fetch the current reading once, publish and return the display text."""
+        self.stats["ticks"] += 1
+        with metrics.timer("tick"):
+            display_text = self._fetch_display_text()
+        self._publish(display_text)
+        return display_text
+
+    async def tick_async(self):
+        """tick() for the asyncio backend; runs on the event loop."""
+        self.stats["ticks"] += 1
+        with metrics.timer("tick"):
+            display_text = await self._fetch_display_text_async()
+        self._publish(display_text)
+        return display_text
+
+    def _fetch_display_text(self):
+        self.last_fetch_ok = False
+        self.offline = False
+        if self.has_credentials() and not self._reachable():
+            return self._offline_text()
+        if not self.dexcom:
+            # Only try to authenticate if we have credentials
+            if self.has_credentials():
+                if not self.breaker.allow():
+                    return self._short_circuit()
+                self.sessions.record_cold()
+                self.authenticate()
+            if not self.dexcom:
+                return self._cached_display_text() if self.breaker.failures else "[--][?]"
+        elif not self.breaker.allow():
+            return self._short_circuit()
+        try:
+            # Single request: the session manager refreshes ahead of expiry, and an
+            # expired session is re-logged in by pydexcom (by account ID) and retried.
+            with metrics.timer("fetch"):
+                if self.history is not None:
+                    self.sessions.call(self.history.sync)
+                    reading = self._history_reading()
+                else:
+                    reading = self.sessions.call(lambda client: client.get_current_glucose_reading())
+            return self._apply_reading(reading)
+        except Exception as e:
+            return self._fetch_failed(e)
+
+    async def _fetch_display_text_async(self):
+        self.last_fetch_ok = False
+        self.offline = False
+        if self.has_credentials() and self.reachability is not None:
+            import asyncio
+            # A real probe blocks for up to its timeout; keep it off the event loop.
+            if not await asyncio.get_running_loop().run_in_executor(None, self._reachable):
+                return self._offline_text()
+        if not self.dexcom:
+            if self.has_credentials():
+                if not self.breaker.allow():
+                    return self._short_circuit()
+                self.sessions.record_cold()
+                await self.authenticate_async()
+            if not self.dexcom:
+                return self._cached_display_text() if self.breaker.failures else "[--][?]"
+        elif not self.breaker.allow():
+            return self._short_circuit()
+        try:
+            with metrics.timer("fetch"):
+                if self.history is not None:
+                    await self.sessions.call_async(self.history.sync_async)
+                    reading = self._history_reading()
+                else:
+                    reading = await self.sessions.call_async(lambda client: client.get_current_glucose_reading())
+            return self._apply_reading(reading)
+        except Exception as e:
+            return self._fetch_failed(e)
+
+    def _history_reading(self):
+        entry = self.history.latest()
+        return _HistoryReading(entry) if entry else None
+
+    def _apply_reading(self, reading):
+        self.last_fetch_ok = True
+        self.breaker.record_success()
+        self._offline_attempts, self._offline_retry_at = 0, None
+        if self.reachability is not None:
+            self.reachability.report(True)
+        if reading is None:
+            return "[N/A][?]"
+        self.current_value = reading.value
+        self.current_trend_arrow = getattr(reading, "trend_arrow", None)
+        self.current_timestamp = _reading_timestamp(reading)
+        # Save a cached snapshot (if cache implementation exists) with the reading's own
+        # time; a reading without one is saved undated rather than as fetched just now.
+        try:
+            if self.cache:
+                self.cache.save({
+                    'username': self.username,
+                    'value': reading.value,
+                    'trend_arrow': self.current_trend_arrow,
+                    'timestamp': int(self.current_timestamp) if self.current_timestamp else None
+                })
+                # Refreshes and pydexcom's own re-logins change the session ID.
+                self._remember_session()
+        except Exception:
+            pass
+        # Share can hand back an old reading (sensor warm-up, phone out of range):
+        # show it with its age and no arrow, like a cached one.
+        if self.formatter.is_stale(self.current_timestamp, self.clock()):
+            self.stats["stale_readings"] += 1
+        return self._reading_text()
+
+    def _reading_text(self):
+        with metrics.timer("format"):
+            return self.formatter.format_reading(self.current_value, self.current_trend_arrow,
+                                                 self.current_timestamp, self.clock())
+
+    def _fetch_failed(self, e):
+        logging.error("Error fetching Dexcom data: %s", e)
+        self.stats["errors"] += 1
+        self.breaker.record_failure()
+        if self.reachability is not None:
+            # Maybe the network went away: probe again before the next attempt.
+            self.reachability.invalidate()
+        return self._cached_display_text()
+
+    def _reachable(self):
+        if self.reachability is None:
+            return True
+        try:
+            if self.reachability.is_reachable():
+                return True
+        except Exception as e:
+            logging.error("Reachability check failed: %s", e)
+            return True
+        return self._offline_attempt_due()
+
+    def _offline_attempt_due(self):
+        # The probe is advisory: every backoff(n) seconds of "offline", try for real.
+        now = time.monotonic()
+        if self._offline_retry_at is None:
+            self._offline_retry_at = now + self.breaker.backoff(1)
+            return False
+        if now < self._offline_retry_at:
+            return False
+        self._offline_attempts += 1
+        self._offline_retry_at = now + self.breaker.backoff(self._offline_attempts + 1)
+        self.stats["offline_attempts"] += 1
+        return True
+
+    def _offline_text(self):
+        self.offline = True
+        self.stats["offline_skips"] += 1
+        return self._cached_display_text()
+
+    def _short_circuit(self):
+        # Breaker open: no request; keep showing the last reading with its age.
+        self.stats["short_circuits"] += 1
+        return self._cached_display_text()
+
+    def _cached_display_text(self):
+        # On error, try using cached data if available and present age
+        try:
+            cached = self.cache.get(self.username) if self.cache else None
+            if not cached and self.current_value is not None and self.current_timestamp:
+                cached = {"value": self.current_value, "trend_arrow": self.current_trend_arrow,
+                          "timestamp": self.current_timestamp}
+            if cached:
+                self.stats["cache_fallbacks"] += 1
+                return self.formatter.format_cached(cached, self.clock())
+        except Exception:
+            pass
+        return "[Err][?]"
+
+    # Assigning either settings dict recompiles the title formatter; call
+    # recompile_formatter() after changing one of them in place.
+    @property
+    def style_settings(self):
+        return self._style_settings
+
+    @style_settings.setter
+    def style_settings(self, value):
+        self._style_settings = value
+        self._formatter = None
+
+    @property
+    def preferences(self):
+        return self._preferences
+
+    @preferences.setter
+    def preferences(self, value):
+        self._preferences = value
+        self._formatter = None
+
+    @property
+    def formatter(self):
+        formatter = self._formatter
+        if formatter is None:
+            formatter = self.recompile_formatter()
+        return formatter
+
+    def recompile_formatter(self):
+        self._formatter = DisplayFormatter(self.style_settings, self.preferences)
+        return self._formatter
+
+    def get_arrow_symbol(self, trend_arrow):
+        return self.formatter.arrow(trend_arrow)
+
+    def format_display_text(self, value, trend_arrow):
+        return self.formatter.format(value, trend_arrow)
+
+    def current_display_text(self):
+        """Display text for the last known reading, without fetching."""
+        if self.current_value is None:
+            # Nothing fetched yet this run: show the warm-start snapshot with its age.
+            try:
+                cached = self.cache.get(self.username) if self.cache else None
+                if cached:
+                    return self.formatter.format_cached(cached, self.clock())
+            except Exception:
+                pass
+            return "[--][?]"
+        return self._reading_text()
+
+    def restore_last_reading(self):
+        """Publish the newest stored reading, if still current, before the first fetch."""
+        if self.history is None or self.current_value is not None:
+            return None
+        entry = self.history.latest()
+        if entry is None:
+            return None
+        self.current_value = entry["value"]
+        self.current_trend_arrow = entry.get("trend_arrow")
+        self.current_timestamp = entry["timestamp"]
+        text = self.current_display_text()
+        self._publish(text)
+        return text
@@ -0,0 +1,116 @@
+# formatter.py
+"""
+Menu bar title formatting. DisplayFormatter compiles the style/preferences
+dicts from settings.json once per settings change; it has no Cocoa imports,
+so it runs (and is profiled) without a menu bar.
+"""
+import re
+import time
+
+MMOL_PER_MGDL = 0.0555
+# Readings older than this many whole minutes lose their trend arrow and show their age.
+ARROW_MAX_AGE_MIN = 5
+
+
+def units_normalized(preferences):
+    # Normalize units like "mg/dL", "mgdl", "MGDL" -> "mgdl"; "mmol", "mmol/L" -> "mmol"
+    units = str(preferences.get("units", "mgdl"))
+    units = re.sub(r"[^a-z]", "", units.lower())
+    if units.startswith("mmol"):
+        return "mmol"
+    return "mgdl"
+
+
+class DisplayFormatter:
+    """
+    Title formatting for one style/preferences pair. Arrow symbols, units and
+    threshold bands are resolved when it is built and rendered titles are
+    memoized per (value, trend), so a tick is usually one dict lookup.
+    Settings are copied: build a new one when they change.
+    """
+    MEMO_SIZE = 512
+
+    def __init__(self, style_settings, preferences):
+        self._arrow_map = {
+            "FLAT": style_settings.get("arrow_steady", "→"),
+            "DOUBLE_UP": style_settings.get("arrow_rising", "↑"),
+            "SINGLE_UP": style_settings.get("arrow_rising", "↑"),
+            "FORTY_FIVE_UP": style_settings.get("arrow_rising", "↑"),
+            "DOUBLE_DOWN": style_settings.get("arrow_falling", "↓"),
+            "SINGLE_DOWN": style_settings.get("arrow_falling", "↓"),
+            "FORTY_FIVE_DOWN": style_settings.get("arrow_falling", "↓"),
+        }
+        self._arrows = {}
+        self.mmol = units_normalized(preferences) == "mmol"
+        self.low = float(preferences.get("low_threshold", 70))
+        self.high = float(preferences.get("high_threshold", 180))
+        self._number_low = style_settings.get("number_low", "%s")
+        self._number_normal = style_settings.get("number_normal", "%s")
+        self._number_high = style_settings.get("number_high", "%s")
+        self._brackets = bool(style_settings.get("show_brackets", True))
+        self._memo = {}
+
+    def arrow(self, trend_arrow):
+        if not trend_arrow:
+            return "?"
+        try:
+            return self._arrows[trend_arrow]
+        except KeyError:
+            symbol = self._arrows[trend_arrow] = self._arrow_map.get(str(trend_arrow).upper(), str(trend_arrow))
+            return symbol
+
+    def format(self, value, trend_arrow):
+        key = (value, trend_arrow)
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        text = self._render(value, trend_arrow)
+        if len(self._memo) >= self.MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = text
+        return text
+
+    def _render(self, value, trend_arrow):
+        try:
+            numeric = float(value)
+        except Exception:
+            numeric = 0.0
+        display_value = round(numeric * MMOL_PER_MGDL, 1) if self.mmol else int(round(numeric))
+        if numeric < self.low:
+            number_text = self._number_low % display_value
+        elif numeric > self.high:
+            number_text = self._number_high % display_value
+        else:
+            number_text = self._number_normal % display_value
+        if self._brackets:
+            return f"[{number_text}][{self.arrow(trend_arrow)}]"
+        return f"{number_text} {self.arrow(trend_arrow)}"
+
+    def is_stale(self, timestamp, now=None):
+        """True if a reading taken at `timestamp` (epoch s) is too old for its arrow."""
+        if not timestamp:
+            return False
+        now_ts = int(time.time() if now is None else now)
+        return int((now_ts - int(timestamp)) / 60) > ARROW_MAX_AGE_MIN
+
+    def format_reading(self, value, trend_arrow, timestamp, now=None):
+        """format() for a current reading, or format_cached() once it is stale."""
+        if self.is_stale(timestamp, now):
+            return self.format_cached({"value": value, "trend_arrow": trend_arrow, "timestamp": timestamp}, now)
+        return self.format(value, trend_arrow)
+
+    def format_cached(self, cached, now=None):
+        """Render a cached snapshot ({'value', 'trend_arrow', 'timestamp'}) with its age."""
+        val = cached.get('value')
+        ts = cached.get('timestamp')
+        now_ts = int(time.time() if now is None else now)
+        age_min = int((now_ts - int(ts)) / 60) if ts else None
+        arrow_symbol = ''
+        if age_min is None or age_min <= ARROW_MAX_AGE_MIN:
+            arrow_symbol = self.arrow(cached.get('trend_arrow'))
+        if age_min is not None:
+            if arrow_symbol:
+                return f"{age_min}min: {val} {arrow_symbol}"
+            return f"{age_min}min: {val}"
+        return f"[{val}][{arrow_symbol or '?'}]"
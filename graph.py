@@ -0,0 +1,167 @@
+# graph.py
+"""
+History graph rendering off the main thread.
+
+One persistent matplotlib Figure (Agg canvas, no pyplot, no GUI backend) is
+reused across renders: each render only swaps the data of the existing
+history/prediction lines (zero-copy views of the in-memory history columns)
+instead of rebuilding the figure. The PNG is written atomically and cached
+under a key of (newest reading timestamp, style, units, thresholds), so
+opening the graph again without a new reading costs nothing.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+from formatter import MMOL_PER_MGDL, units_normalized
+
+PREDICTION_COUNT = 3
+
+
+class GraphRenderer:
+    def __init__(self, history, path, figsize=(8, 4), dpi=100):
+        self.history = history
+        self.path = path
+        self.figsize = figsize
+        self.dpi = dpi
+        self._lock = threading.Lock()
+        self._figure = None
+        self._cache_key = None
+        # Background requests: latest settings plus everyone waiting on them.
+        self._cond = threading.Condition()
+        self._pending = None
+        self._callbacks = []
+        self._thread = None
+        self._stopped = False
+        self.stats = {"renders": 0, "cache_hits": 0, "errors": 0, "last_render_ms": 0.0}
+
+    # --- figure ---
+
+    def _build_figure(self):
+        # Lazy: matplotlib is an optional dependency and slow to import.
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        figure = Figure(figsize=self.figsize, dpi=self.dpi)
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot(1, 1, 1)
+        self._ax = ax
+        self._past, = ax.plot([], [], marker="o", label="Past Readings")
+        self._future, = ax.plot([], [], marker="x", linestyle="--", label="Predictions")
+        self._band = None
+        self._low_line = ax.axhline(0, color="tab:red", linewidth=0.8, alpha=0.5)
+        self._high_line = ax.axhline(0, color="tab:orange", linewidth=0.8, alpha=0.5)
+        ax.set_xlabel("Timestamp")
+        ax.set_title("Glucose History and Future Predictions")
+        ax.legend(loc="upper left")
+        self._figure = figure
+
+    def _key(self, newest_ts, style_settings, preferences):
+        return (
+            newest_ts,
+            json.dumps(style_settings or {}, sort_keys=True, default=str),
+            units_normalized(preferences or {}),
+            preferences.get("low_threshold") if preferences else None,
+            preferences.get("high_threshold") if preferences else None,
+        )
+
+    def render(self, style_settings=None, preferences=None):
+        """Render (or reuse) the graph PNG on the calling thread. Returns its path, or None."""
+        preferences = preferences or {}
+        with self._lock:
+            newest = self.history.newest() if self.history is not None else None
+            if newest is None:
+                return None
+            key = self._key(newest["timestamp"], style_settings, preferences)
+            if key == self._cache_key and os.path.exists(self.path):
+                self.stats["cache_hits"] += 1
+                return self.path
+            t0 = time.perf_counter()
+            try:
+                self._draw(preferences)
+                tmp = self.path + ".tmp"
+                self._figure.savefig(tmp, format="png")
+                os.replace(tmp, self.path)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logging.error("Error rendering graph: %s", e)
+                return None
+            self._cache_key = key
+            self.stats["renders"] += 1
+            elapsed = time.perf_counter() - t0
+            self.stats["last_render_ms"] = elapsed * 1000
+            metrics.observe("graph_render", elapsed)
+            return self.path
+
+    def _draw(self, preferences):
+        if self._figure is None:
+            self._build_figure()
+        mmol = units_normalized(preferences) == "mmol"
+        scale = MMOL_PER_MGDL if mmol else 1.0
+        times, values, _ = self.history.columns()
+        predictions = self.history.predict(PREDICTION_COUNT)
+        self._past.set_data(times, values * scale if mmol else values)
+        future_times = [p.timestamp for p in predictions]
+        self._future.set_data(future_times, [p.value * scale for p in predictions])
+        if self._band is not None:
+            self._band.remove()
+            self._band = None
+        if predictions:
+            self._band = self._ax.fill_between(future_times, [p.low * scale for p in predictions],
+                                               [p.high * scale for p in predictions], alpha=0.2,
+                                               color=self._future.get_color())
+        self._low_line.set_ydata([float(preferences.get("low_threshold", 70)) * scale] * 2)
+        self._high_line.set_ydata([float(preferences.get("high_threshold", 180)) * scale] * 2)
+        ylabel = "Glucose (mmol/L)" if mmol else "Glucose (mg/dL)"
+        relayout = ylabel != self._ax.get_ylabel()
+        self._ax.set_ylabel(ylabel)
+        self._ax.relim()
+        self._ax.autoscale_view()
+        if relayout:
+            # Margins only depend on the labels; skip the layout pass otherwise.
+            self._figure.tight_layout()
+
+    # --- background rendering ---
+
+    def request(self, style_settings=None, preferences=None, callback=None):
+        """
+        Render on the graph thread. callback(path or None) runs on that thread
+        once the PNG is ready; requests made while one is rendering are merged
+        into the next render with the latest settings.
+        """
+        with self._cond:
+            if self._stopped:
+                return False
+            self._pending = (dict(style_settings or {}), dict(preferences or {}))
+            if callback is not None:
+                self._callbacks.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="graph-render", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                style_settings, preferences = self._pending
+                self._pending = None
+                callbacks, self._callbacks = self._callbacks, []
+            path = self.render(style_settings, preferences)
+            for callback in callbacks:
+                try:
+                    callback(path)
+                except Exception as e:
+                    logging.error("Graph callback error: %s", e)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
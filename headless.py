@@ -0,0 +1,133 @@
+# headless.py
+"""
+Headless runner: drives the same GlucoseEngine the menu bar app uses, without
+Cocoa, and reports per-tick latency and CPU. Point it at a local Share
+stand-in with --base-url to load-test on Linux.
+
+Usage: python headless.py --base-url http://127.0.0.1:8080/ShareWebServices/Services --ticks 50
+"""
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+
+import metrics
+import profiling
+from engine import GlucoseEngine
+from title import TitlePipeline
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (pct in 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100.0 * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+def build_engine(args):
+    return GlucoseEngine(
+        username=args.username,
+        password=args.password,
+        region=args.region,
+        base_url=args.base_url,
+    )
+
+
+def run_ticks(engine, ticks, interval=0.0, quiet=False, tick=None):
+    """Run `ticks` engine ticks; returns (wall_seconds, cpu_seconds) lists."""
+    tick = tick or engine.tick
+    wall, cpu = [], []
+    for i in range(ticks):
+        w0, c0 = time.perf_counter(), time.process_time()
+        text = tick()
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+        if not quiet:
+            print(f"tick {i + 1:>4}: {text}  ({wall[-1] * 1000:.1f} ms)")
+        if interval and i + 1 < ticks:
+            time.sleep(interval)
+    return wall, cpu
+
+
+def print_summary(wall, cpu, titles=None, breaker=None):
+    ms = [w * 1000 for w in wall]
+    cpu_ms = [c * 1000 for c in cpu]
+    print(f"ticks: {len(ms)}")
+    print(f"latency ms: p50={percentile(ms, 50):.2f} p99={percentile(ms, 99):.2f} max={max(ms or [0]):.2f}")
+    print(f"cpu ms/tick: mean={sum(cpu_ms) / max(1, len(cpu_ms)):.3f} p99={percentile(cpu_ms, 99):.3f}")
+    if titles is not None:
+        print(f"title updates: applied={titles.stats['applied']} skipped={titles.stats['skipped']}")
+    if breaker is not None:
+        print(f"breaker: state={breaker.state} opened={breaker.stats['opened']} "
+              f"half_opened={breaker.stats['half_opened']} closed={breaker.stats['closed']} "
+              f"rejected={breaker.stats['rejected']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Dexcom polling engine without a UI.")
+    parser.add_argument("--username", default=os.environ.get("DEXCOM_USERNAME", ""))
+    parser.add_argument("--password", default=os.environ.get("DEXCOM_PASSWORD", ""))
+    parser.add_argument("--region", default="us")
+    parser.add_argument("--base-url", default=None, help="Share API base URL (e.g. a local stand-in)")
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds to sleep between ticks")
+    parser.add_argument("--backend", choices=("threads", "asyncio"), default="threads",
+                        help="fetch backend, as the network.backend setting")
+    parser.add_argument("--metrics-dir", default=None,
+                        help="write metrics.json/metrics.prom here every --metrics-interval s and at exit")
+    parser.add_argument("--metrics-interval", type=float, default=metrics.DEFAULT_INTERVAL)
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve metrics on 127.0.0.1:PORT/metrics while running (0 picks a port)")
+    parser.add_argument("--profile-ticks", type=int, default=profiling.ticks_from_env(),
+                        help=f"profile the first N ticks (default ${profiling.ENV_VAR}); see profiling.py")
+    parser.add_argument("--profile-dir", default=None, help="where profiles go (default: the settings dir)")
+    parser.add_argument("--quiet", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    if not (args.username and args.password):
+        print("username/password required (flags or DEXCOM_USERNAME/DEXCOM_PASSWORD)", file=sys.stderr)
+        return 2
+    engine = build_engine(args)
+    # Same title diffing as the menu bar app; there is nothing to apply headless.
+    titles = TitlePipeline(lambda title: None)
+    engine.subscribe(titles.submit)
+    metrics.register("engine", engine.stats)
+    metrics.register("sessions", engine.sessions.stats)
+    metrics.register("breaker", engine.breaker.stats)
+    metrics.register("titles", titles.stats)
+    exporter = None
+    if args.metrics_dir is not None or args.metrics_port is not None:
+        exporter = metrics.Exporter(metrics.registry, directory=args.metrics_dir,
+                                    interval=args.metrics_interval, port=args.metrics_port).start()
+        if args.metrics_port is not None:
+            print(f"metrics: http://127.0.0.1:{exporter.port}/metrics", file=sys.stderr)
+    tick = None
+    if args.backend == "asyncio":
+        from async_client import AsyncSession, LoopThread
+        engine.http_session = AsyncSession()
+        loop = LoopThread()
+        tick = lambda: loop.run(engine.tick_async())
+    profiler = None
+    if args.profile_ticks > 0:
+        profiler = profiling.TickProfiler(args.profile_ticks, args.profile_dir,
+                                          on_done=lambda paths: print(f"profile: {paths['collapsed']}", file=sys.stderr))
+        tick = profiler.wrap(tick or engine.tick)
+    try:
+        wall, cpu = run_ticks(engine, args.ticks, args.interval, args.quiet, tick=tick)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+    print_summary(wall, cpu, titles, engine.breaker)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# history.py
+"""
+Incremental glucose history sync. The first sync backfills a window with one
+bulk get_glucose_readings() call; later syncs only ask for the minutes since
+the newest stored reading and dedupe by reading time, so the steady-state
+payload is a single record. Readings are appended to a RingStore (ring_store.py)
+rather than rewriting a JSON file, and the most recent ones are mirrored in an
+in-memory HistoryWindow (history_window.py) for prediction and graphing.
+New readings also feed an incremental TrendPredictor (predictor.py).
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from pydexcom.const import MAX_MAX_COUNT, MAX_MINUTES
+
+from history_window import HistoryWindow
+from predictor import TrendPredictor
+from ring_store import RingStore, trend_code, trend_arrow
+
+READING_INTERVAL = 300
+CURRENT_MAX_AGE = 600  # same window as get_current_glucose_reading()
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_WINDOW_DAYS = 30
+PREDICTOR_SEED_SECONDS = 6 * 3600  # older readings carry no weight in the trend anyway
+
+
+def reading_to_entry(reading):
+    return {
+        'value': reading.value,
+        'trend_arrow': getattr(reading, 'trend_arrow', None),
+        'timestamp': int(reading.datetime.timestamp()),
+    }
+
+
+def _record_to_entry(record):
+    ts, value, code = record
+    return {'value': value, 'trend_arrow': trend_arrow(code), 'timestamp': ts}
+
+
+class HistorySync:
+    def __init__(self, path, backfill_minutes=MAX_MINUTES, retention_days=DEFAULT_RETENTION_DAYS,
+                 window_days=DEFAULT_WINDOW_DAYS, legacy_json_path=None):
+        self.path = path
+        self.backfill_minutes = backfill_minutes
+        self.store = RingStore(path, capacity=int(retention_days * 86400 // READING_INTERVAL))
+        self._lock = threading.Lock()
+        self.stats = {"syncs": 0, "backfills": 0, "records_fetched": 0, "records_added": 0}
+        if legacy_json_path:
+            self._import_legacy(legacy_json_path)
+        self.window = HistoryWindow(max_readings=int(window_days * 86400 // READING_INTERVAL))
+        self.window.extend(self.store.range(time.time() - window_days * 86400))
+        self.predictor = TrendPredictor()
+        newest = self.window.newest()
+        if newest is not None:
+            times, values, _ = self.window.columns(newest.timestamp - PREDICTOR_SEED_SECONDS)
+            self.predictor.extend(times, values)
+
+    # --- storage ---
+
+    def _import_legacy(self, json_path):
+        """One-time import of an older glucose_history.json, which is then removed."""
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r") as f:
+                entries = json.load(f)
+            entries.sort(key=lambda e: e["timestamp"])
+            with self._lock:
+                self.store.extend((int(e["timestamp"]), e["value"], trend_code(e.get("trend_arrow")))
+                                  for e in entries)
+            os.remove(json_path)
+        except Exception as e:
+            logging.error("Error importing glucose history: %s", e)
+
+    def range(self, start_ts=None, end_ts=None):
+        """Raw (timestamp, value, trend_code) records, oldest first."""
+        with self._lock:
+            return self.store.range(start_ts, end_ts)
+
+    def entries(self, start_ts=None, end_ts=None):
+        """Stored readings as [{'value', 'trend_arrow', 'timestamp'}], oldest first."""
+        return [_record_to_entry(r) for r in self.range(start_ts, end_ts)]
+
+    def columns(self, start_ts=None, end_ts=None):
+        """Recent (times, values, trends) from memory as zero-copy NumPy arrays. Requires numpy."""
+        with self._lock:
+            return self.window.numpy_columns(start_ts, end_ts)
+
+    def newest(self):
+        with self._lock:
+            record = self.store.newest()
+        return _record_to_entry(record) if record else None
+
+    def latest(self, max_age=CURRENT_MAX_AGE, now=None):
+        """Newest reading if it is recent enough to count as current, else None."""
+        entry = self.newest()
+        now = time.time() if now is None else now
+        if entry is None or now - entry["timestamp"] > max_age:
+            return None
+        return entry
+
+    def predict(self, count=None, step=None):
+        """Next readings from the trend predictor as [Prediction(timestamp, value, low, high)]."""
+        with self._lock:
+            return self.predictor.predict(count, step)
+
+    # --- sync ---
+
+    def fetch_window(self, now=None):
+        """(minutes, max_count) to request so only unseen readings come back."""
+        newest = self.newest()
+        if newest is None:
+            return self.backfill_minutes, MAX_MAX_COUNT
+        now = time.time() if now is None else now
+        # Whole minutes since the newest stored reading: excludes it, includes anything newer.
+        minutes = max(1, min(MAX_MINUTES, math.floor((now - newest["timestamp"]) / 60.0)))
+        max_count = max(1, min(MAX_MAX_COUNT, minutes * 60 // READING_INTERVAL + 1))
+        return minutes, max_count
+
+    def sync(self, client, now=None):
+        """Fetch readings newer than the newest stored one. Returns the new entries."""
+        now = time.time() if now is None else now
+        minutes, max_count = self.fetch_window(now)
+        backfill = self.newest() is None
+        readings = client.get_glucose_readings(minutes=minutes, max_count=max_count)
+        return self._store(readings, backfill)
+
+    async def sync_async(self, client, now=None):
+        """sync() with an async_client client."""
+        now = time.time() if now is None else now
+        minutes, max_count = self.fetch_window(now)
+        backfill = self.newest() is None
+        readings = await client.get_glucose_readings(minutes=minutes, max_count=max_count)
+        return self._store(readings, backfill)
+
+    def _store(self, readings, backfill):
+        # Share returns newest first; the store is append-only in time order,
+        # and rejects anything not newer than what it holds (dedupe).
+        entries = sorted((reading_to_entry(r) for r in readings), key=lambda e: e["timestamp"])
+        with self._lock:
+            new = [e for e in entries
+                   if self.store.append(e["timestamp"], e["value"], trend_code(e["trend_arrow"]), flush=False)]
+            if new:
+                self.store.flush()
+                for e in new:
+                    self.window.append_entry(e)
+                    self.predictor.update(e["timestamp"], e["value"])
+            self.stats["syncs"] += 1
+            self.stats["backfills"] += int(backfill)
+            self.stats["records_fetched"] += len(readings)
+            self.stats["records_added"] += len(new)
+        return new
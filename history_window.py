@@ -0,0 +1,123 @@
+# history_window.py
+"""
+Compact in-memory glucose history: parallel array columns for time, value and
+trend code instead of a list of dicts, plus a __slots__ Reading view.
+
+Columns live in preallocated arrays that are only ever written past the
+current end, so a slice handed out (memoryview or NumPy view, no copy) stays
+valid while new readings are appended. When the arrays fill up, the newest
+`max_readings` are copied into fresh arrays; outstanding views keep the old
+buffers alive and simply stop seeing newer readings.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+from ring_store import trend_arrow, trend_code
+
+DEFAULT_MAX_READINGS = 30 * 288  # 30 days of 5-minute readings
+DEFAULT_SLACK = 288              # appends between compactions
+
+
+class Reading:
+    __slots__ = ("timestamp", "value", "trend")
+
+    def __init__(self, timestamp, value, trend=0):
+        self.timestamp = timestamp
+        self.value = value
+        self.trend = trend
+
+    @property
+    def trend_arrow(self):
+        return trend_arrow(self.trend)
+
+    def as_entry(self):
+        return {'value': self.value, 'trend_arrow': self.trend_arrow, 'timestamp': self.timestamp}
+
+    def __repr__(self):
+        return f"Reading({self.timestamp}, {self.value}, {self.trend})"
+
+
+class HistoryWindow:
+    def __init__(self, max_readings=DEFAULT_MAX_READINGS, slack=DEFAULT_SLACK):
+        self.max_readings = max_readings
+        self.slack = slack
+        self._allocate(max_readings + slack)
+        self._start = 0
+        self._end = 0
+
+    def _allocate(self, capacity):
+        self._times = array("q", bytes(8 * capacity))
+        self._values = array("H", bytes(2 * capacity))
+        self._trends = array("B", bytes(capacity))
+
+    def _compact(self):
+        keep = min(self.max_readings, self._end - self._start)
+        lo, hi = self._end - keep, self._end
+        times, values, trends = self._times[lo:hi], self._values[lo:hi], self._trends[lo:hi]
+        self._allocate(self.max_readings + self.slack)
+        self._times[:keep], self._values[:keep], self._trends[:keep] = times, values, trends
+        self._start, self._end = 0, keep
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getitem__(self, index):
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("history index out of range")
+        i = self._start + index
+        return Reading(self._times[i], self._values[i], self._trends[i])
+
+    def __iter__(self):
+        for i in range(self._start, self._end):
+            yield Reading(self._times[i], self._values[i], self._trends[i])
+
+    def newest(self):
+        return self[-1] if len(self) else None
+
+    def append(self, timestamp, value, trend=0):
+        """Append a reading newer than the newest one; returns False otherwise."""
+        if self._end > self._start and timestamp <= self._times[self._end - 1]:
+            return False
+        if self._end == len(self._times):
+            self._compact()
+        i = self._end
+        self._times[i] = int(timestamp)
+        self._values[i] = max(0, min(0xFFFF, int(value)))
+        self._trends[i] = int(trend) & 0xFF
+        self._end = i + 1
+        if self._end - self._start > self.max_readings:
+            self._start = self._end - self.max_readings
+        return True
+
+    def append_entry(self, entry):
+        return self.append(entry["timestamp"], entry["value"], trend_code(entry.get("trend_arrow")))
+
+    def extend(self, records):
+        """Append (timestamp, value, trend_code) records, e.g. RingStore.range() output."""
+        return sum(self.append(ts, value, trend) for ts, value, trend in records)
+
+    def _bounds(self, start_ts=None, end_ts=None):
+        lo, hi = self._start, self._end
+        if start_ts is not None:
+            lo = bisect_left(self._times, start_ts, lo, hi)
+        if end_ts is not None:
+            hi = bisect_right(self._times, end_ts, lo, hi)
+        return lo, hi
+
+    def columns(self, start_ts=None, end_ts=None):
+        """(times, values, trends) as zero-copy memoryviews over the window."""
+        lo, hi = self._bounds(start_ts, end_ts)
+        return (memoryview(self._times)[lo:hi], memoryview(self._values)[lo:hi],
+                memoryview(self._trends)[lo:hi])
+
+    def numpy_columns(self, start_ts=None, end_ts=None):
+        """(times, values, trends) as zero-copy NumPy arrays. Requires numpy."""
+        import numpy as np  # optional dependency
+        return tuple(np.frombuffer(column, dtype=column.format) for column in self.columns(start_ts, end_ts))
+
+    def entries(self, start_ts=None, end_ts=None):
+        lo, hi = self._bounds(start_ts, end_ts)
+        return [Reading(self._times[i], self._values[i], self._trends[i]).as_entry() for i in range(lo, hi)]
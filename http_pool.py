@@ -0,0 +1,79 @@
+# http_pool.py
+"""
+One long-lived requests.Session shared by every Dexcom client. Re-creating a
+client (sign-in, startup, re-auth after an expired session) reuses the pooled
+keep-alive connections instead of paying a fresh TCP + TLS handshake.
+"""
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_KEEPALIVE_IDLE = 60  # seconds of idle before TCP keep-alive probes; 0 disables
+
+_lock = threading.Lock()
+_shared_session = None
+_shared_config = (DEFAULT_POOL_SIZE, DEFAULT_KEEPALIVE_IDLE)
+
+
+def _keepalive_socket_options(idle):
+    if not idle:
+        return []
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, int(idle)))
+    elif hasattr(socket, "TCP_KEEPALIVE"):
+        # macOS spells TCP_KEEPIDLE as TCP_KEEPALIVE
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, int(idle)))
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(idle) // 4)))
+    return options
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with a fixed pool size and TCP keep-alive on every socket."""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keepalive_idle=DEFAULT_KEEPALIVE_IDLE):
+        # Read by init_poolmanager, which HTTPAdapter.__init__ calls.
+        self._socket_options = HTTPConnection.default_socket_options + _keepalive_socket_options(keepalive_idle)
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", self._socket_options)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, keepalive_idle=DEFAULT_KEEPALIVE_IDLE):
+    session = requests.Session()
+    adapter = PooledAdapter(pool_size=pool_size, keepalive_idle=keepalive_idle)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure_shared_session(pool_size=None, keepalive_idle=None):
+    """Apply pool settings; rebuilds the shared session only if they changed."""
+    global _shared_session, _shared_config
+    config = (
+        int(pool_size) if pool_size else DEFAULT_POOL_SIZE,
+        DEFAULT_KEEPALIVE_IDLE if keepalive_idle is None else int(keepalive_idle),
+    )
+    with _lock:
+        if config == _shared_config and _shared_session is not None:
+            return _shared_session
+        old, _shared_config = _shared_session, config
+        _shared_session = create_session(*config)
+    if old is not None:
+        old.close()
+    return _shared_session
+
+
+def get_shared_session():
+    global _shared_session
+    with _lock:
+        if _shared_session is None:
+            _shared_session = create_session(*_shared_config)
+        return _shared_session
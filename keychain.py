@@ -1,34 +1,152 @@
 """
 Simple wrapper around macOS Keychain using the `keyring` package.
 This stores only the Dexcom password; the username remains in settings.
+
+Passwords are read from the backend at most once per process and kept in
+memory (set/delete update the cache). The keyring backend is resolved on
+first use. Tests and benchmarks on machines without a keyring daemon install
+a CredentialProvider over a MemoryBackend with set_provider().
 """
+import logging
+import sys
+import threading
 from typing import Optional
 
-import keyring
-
 SERVICE_NAME = "DexcomNavBarIcon"
 
 
+class KeyringBackend:
+    """The system keyring; on macOS the Keychain backend, without touching keyring's global choice."""
+
+    def __init__(self):
+        self._keyring = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        with self._lock:
+            if self._keyring is None:
+                import keyring  # deferred: slow to import and to pick a backend
+                backend = None
+                if sys.platform == "darwin":
+                    try:
+                        from keyring.backends import macOS
+                        backend = macOS.Keyring()
+                    except Exception as e:
+                        logging.warning("Could not use macOS keyring backend: %s", e)
+                self._keyring = backend if backend is not None else keyring.get_keyring()
+            return self._keyring
+
+    def get(self, service, username):
+        return self._resolve().get_password(service, username)
+
+    def set(self, service, username, password):
+        self._resolve().set_password(service, username, password)
+
+    def delete(self, service, username):
+        self._resolve().delete_password(service, username)
+
+
+class MemoryBackend:
+    """In-process store for tests and benchmarks; nothing is written anywhere."""
+
+    def __init__(self):
+        self._items = {}
+
+    def get(self, service, username):
+        return self._items.get((service, username))
+
+    def set(self, service, username, password):
+        self._items[(service, username)] = password
+
+    def delete(self, service, username):
+        self._items.pop((service, username), None)
+
+
+class CredentialProvider:
+    def __init__(self, backend=None, service=SERVICE_NAME):
+        self._backend = backend
+        self.service = service
+        self._cache = {}  # username -> password (None: known to be absent)
+        self._lock = threading.Lock()
+        self.stats = {"reads": 0, "hits": 0, "writes": 0, "deletes": 0}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = KeyringBackend()
+        return self._backend
+
+    def get_password(self, username: str) -> Optional[str]:
+        if not username:
+            return None
+        with self._lock:
+            if username in self._cache:
+                self.stats["hits"] += 1
+                return self._cache[username]
+            self.stats["reads"] += 1
+            try:
+                password = self.backend.get(self.service, username)
+            except Exception as e:
+                # Not cached: a locked Keychain or a denied prompt may succeed later.
+                logging.error("Error reading password from Keychain: %s", e)
+                return None
+            self._cache[username] = password
+            return password
+
+    def set_password(self, username: str, password: str) -> None:
+        if not username:
+            return
+        with self._lock:
+            self._cache.pop(username, None)
+            self.stats["writes"] += 1
+            self.backend.set(self.service, username, password or "")
+            self._cache[username] = password or ""
+
+    def delete_password(self, username: str) -> None:
+        if not username:
+            return
+        with self._lock:
+            self._cache[username] = None
+            self.stats["deletes"] += 1
+            try:
+                self.backend.delete(self.service, username)
+            except Exception:
+                # Ignore if it doesn't exist
+                pass
+
+    def invalidate(self, username=None):
+        with self._lock:
+            if username is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(username, None)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> CredentialProvider:
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = CredentialProvider()
+        return _provider
+
+
+def set_provider(provider: CredentialProvider) -> None:
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
 def set_password(username: str, password: str) -> None:
-    if not username:
-        return
-    keyring.set_password(SERVICE_NAME, username, password or "")
+    get_provider().set_password(username, password)
 
 
 def get_password(username: str) -> Optional[str]:
-    if not username:
-        return None
-    try:
-        return keyring.get_password(SERVICE_NAME, username)
-    except Exception:
-        return None
+    return get_provider().get_password(username)
 
 
 def delete_password(username: str) -> None:
-    if not username:
-        return
-    try:
-        keyring.delete_password(SERVICE_NAME, username)
-    except Exception:
-        # Ignore if it doesn't exist
-        pass
+    get_provider().delete_password(username)
@@ -1,13 +1,10 @@
-import sys
-try:
-    import keyring
-    from keyring.backends import macOS
-    keyring.set_keyring(macOS.Keyring())
-except Exception as e:
-    print(f"Warning: Could not set macOS keyring backend: {e}", file=sys.stderr)
+import startup  # first, so its clock covers every import below
 # main.py
+# The Keychain backend is picked lazily by keychain.py on first use.
 from Cocoa import NSApplication, NSApplicationActivationPolicyAccessory
+startup.mark("import Cocoa")
 from app import DexcomMenuApp
+startup.mark("import app")
 
 if __name__ == "__main__":
     # Ensure the application doesn’t show in the Dock.
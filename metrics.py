@@ -0,0 +1,249 @@
+# metrics.py
+"""
+In-process metrics for the fetch pipeline. Timers keep a rolling window of
+recent durations (quantiles) plus lifetime count/sum; counters only count.
+The components' own stats dicts (engine, sessions, breaker, ...) are
+registered as sources and read at export time, so the hot path only ever
+does a perf_counter() pair and a deque append.
+
+An Exporter publishes a snapshot as metrics.json and metrics.prom (Prometheus
+text format) in the settings dir every `interval` seconds, and/or serves the
+same on http://127.0.0.1:<port>/metrics (and /metrics.json). Stdlib only and
+cheap to import.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+
+DEFAULT_WINDOW = 1024  # samples kept per timer
+DEFAULT_INTERVAL = 60.0
+DEFAULT_PORT = 9464
+PREFIX = "dexcom"
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """Rolling window of the last `window` samples, plus lifetime count, sum and max."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        # Callers hold the registry lock.
+        self._samples.append(value)
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def summary(self):
+        samples = sorted(self._samples)
+        out = {"count": self.count, "sum": self.sum, "max": self.max, "window": len(samples)}
+        for q in QUANTILES:
+            out[f"p{q * 100:g}"] = samples[min(len(samples) - 1, int(math.ceil(q * len(samples))) - 1)] if samples else 0.0
+        return out
+
+
+class _Timer:
+    __slots__ = ("_metrics", "_name", "_t0")
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics.observe(self._name, time.perf_counter() - self._t0)
+        if exc_type is not None:
+            self._metrics.inc(self._name + "_errors")
+        return False
+
+
+class Metrics:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._sources = {}
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self._timers.get(name)
+            if hist is None:
+                hist = self._timers[name] = Histogram(self.window)
+            hist.observe(seconds)
+
+    def timer(self, name):
+        """Context manager timing its block into `name` (seconds); exceptions also count `name`_errors."""
+        return _Timer(self, name)
+
+    def register(self, name, source):
+        """Export a stats dict, or a callable returning one, under `name`. Non-numeric values are skipped."""
+        with self._lock:
+            self._sources[name] = source
+
+    def unregister(self, name):
+        with self._lock:
+            self._sources.pop(name, None)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            timers = {name: hist.summary() for name, hist in self._timers.items()}
+            sources = list(self._sources.items())
+        stats = {}
+        for name, source in sources:
+            try:
+                values = source() if callable(source) else source
+                stats[name] = {k: v for k, v in dict(values or {}).items() if isinstance(v, (int, float))}
+            except Exception as e:
+                logging.error("Metrics source %s failed: %s", name, e)
+        return {"time": time.time(), "counters": counters, "timers": timers, "stats": stats}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+
+def _metric_name(*parts):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join((PREFIX,) + parts))
+
+
+def to_json(snapshot):
+    return json.dumps(snapshot, indent=2, sort_keys=True)
+
+
+def to_prometheus(snapshot):
+    """Prometheus text exposition: counters, timers as summaries (seconds), sources as gauges."""
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = _metric_name(name, "total")
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, summary in sorted(snapshot["timers"].items()):
+        metric = _metric_name(name, "seconds")
+        lines.append(f"# TYPE {metric} summary")
+        for q in QUANTILES:
+            lines.append(f'{metric}{{quantile="{q:g}"}} {summary[f"p{q * 100:g}"]:.6f}')
+        lines += [f"{metric}_sum {summary['sum']:.6f}", f"{metric}_count {summary['count']}"]
+    for source, values in sorted(snapshot["stats"].items()):
+        for key, value in sorted(values.items()):
+            metric = _metric_name(source, key)
+            lines += [f"# TYPE {metric} gauge", f"{metric} {float(value):g}"]
+    return "\n".join(lines) + "\n"
+
+
+class Exporter:
+    """Writes metrics.json/metrics.prom to `directory` every `interval` s and/or serves them on 127.0.0.1:`port`."""
+
+    def __init__(self, metrics, directory=None, interval=DEFAULT_INTERVAL, port=None):
+        self.metrics = metrics
+        self.directory = directory
+        self.interval = interval
+        self.port = port
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        self.stats = {"writes": 0, "write_errors": 0, "scrapes": 0}
+
+    def start(self):
+        if self.directory is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+            self._thread.start()
+        if self.port is not None and self._server is None:
+            self._serve()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.directory is not None:
+            self.write()
+
+    def write(self):
+        """Write both files now."""
+        from settings import write_text_atomic
+        snapshot = self.metrics.snapshot()
+        try:
+            write_text_atomic(os.path.join(self.directory, "metrics.json"), to_json(snapshot))
+            write_text_atomic(os.path.join(self.directory, "metrics.prom"), to_prometheus(snapshot))
+            self.stats["writes"] += 1
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            logging.error("Error writing metrics: %s", e)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def _serve(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, ctype = to_prometheus(exporter.metrics.snapshot()), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, ctype = to_json(exporter.metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                exporter.stats["scrapes"] += 1
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            # Loopback only: the numbers are about this user's session.
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            self._server.daemon_threads = True
+        except OSError as e:
+            logging.error("Metrics server on port %s failed: %s", self.port, e)
+            return
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+# Process-wide registry; the app, headless.py and the engine all record here.
+registry = Metrics()
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+register = registry.register
+
+
+def exporter_from_settings(diagnostics, directory):
+    """Exporter for the "diagnostics" settings block, or None when metrics are off."""
+    mode = str((diagnostics or {}).get("metrics", "off")).lower()
+    if mode not in ("file", "http", "both"):
+        return None
+    return Exporter(registry,
+                    directory=directory if mode in ("file", "both") else None,
+                    interval=float(diagnostics.get("metrics_interval", DEFAULT_INTERVAL)),
+                    port=int(diagnostics.get("metrics_port", DEFAULT_PORT)) if mode in ("http", "both") else None)
@@ -0,0 +1,112 @@
+# predictor.py
+"""
+Incremental glucose trend predictor.
+
+Exponentially weighted linear regression over time: each reading's weight
+halves every `half_life` seconds, so recent readings dominate and old history
+fades out instead of being refit. The fit is kept as running weighted sums
+(re-centred on the newest reading for numerical stability), so update() and
+predict() are O(1) regardless of how much history has been seen.
+"""
+import math
+
+READING_INTERVAL = 300
+DEFAULT_HALF_LIFE = 10 * 60  # seconds
+DEFAULT_HORIZON = 3          # readings ahead
+Z_95 = 1.96
+
+
+class Prediction:
+    __slots__ = ("timestamp", "value", "low", "high")
+
+    def __init__(self, timestamp, value, low, high):
+        self.timestamp = timestamp
+        self.value = value
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return f"Prediction({self.timestamp}, {self.value:.1f} [{self.low:.1f}, {self.high:.1f}])"
+
+
+class TrendPredictor:
+    def __init__(self, half_life=DEFAULT_HALF_LIFE, horizon=DEFAULT_HORIZON, step=READING_INTERVAL):
+        self.half_life = half_life
+        self.horizon = horizon
+        self.step = step
+        self.reset()
+
+    def reset(self):
+        self.last_ts = None
+        # Weighted sums over x = minutes relative to last_ts, y = mg/dL
+        self._s0 = self._sx = self._sxx = self._sy = self._sxy = self._syy = 0.0
+        self._s0_sq = 0.0  # sum of squared weights, for the effective sample size
+        self.count = 0
+
+    def update(self, timestamp, value):
+        """Add one reading. Readings not newer than the last one are ignored."""
+        if self.last_ts is not None and timestamp <= self.last_ts:
+            return False
+        y = float(value)
+        if self.last_ts is not None:
+            dt = timestamp - self.last_ts
+            decay = 0.5 ** (dt / self.half_life)
+            shift = dt / 60.0
+            # Decay the old weights, then move the origin to the new reading (x -= shift).
+            s0, sx, sxx, sy, sxy = (v * decay for v in (self._s0, self._sx, self._sxx, self._sy, self._sxy))
+            self._sxx = sxx - 2 * shift * sx + shift * shift * s0
+            self._sx = sx - shift * s0
+            self._sxy = sxy - shift * sy
+            self._s0, self._sy = s0, sy
+            self._syy *= decay
+            self._s0_sq *= decay * decay
+        # New point sits at x = 0 with weight 1.
+        self._s0 += 1.0
+        self._sy += y
+        self._syy += y * y
+        self._s0_sq += 1.0
+        self.last_ts = timestamp
+        self.count += 1
+        return True
+
+    def extend(self, timestamps, values):
+        for ts, value in zip(timestamps, values):
+            self.update(int(ts), value)
+
+    def _fit(self):
+        """(intercept at last_ts, slope per minute, residual sigma, n_eff, x_mean, sxx_centred)."""
+        s0 = self._s0
+        x_mean = self._sx / s0
+        sxx_c = self._sxx - self._sx * x_mean
+        if self.count < 2 or sxx_c <= 1e-9:
+            return self._sy / s0, 0.0, 0.0, 1.0, x_mean, 0.0
+        slope = (self._sxy - self._sx * self._sy / s0) / sxx_c
+        intercept = self._sy / s0 - slope * x_mean
+        sse = (self._syy - 2 * intercept * self._sy - 2 * slope * self._sxy + intercept * intercept * s0
+               + 2 * intercept * slope * self._sx + slope * slope * self._sxx)
+        n_eff = s0 * s0 / self._s0_sq
+        dof = max(n_eff - 2.0, 1.0)
+        sigma = math.sqrt(max(sse, 0.0) / s0 * n_eff / dof)
+        return intercept, slope, sigma, n_eff, x_mean, sxx_c
+
+    @property
+    def slope_per_minute(self):
+        return self._fit()[1] if self.count else 0.0
+
+    def predict(self, count=None, step=None):
+        """Next `count` readings as Prediction(timestamp, value, low, high) with an approximate 95% band."""
+        if not self.count:
+            return []
+        count = self.horizon if count is None else count
+        step = self.step if step is None else step
+        intercept, slope, sigma, n_eff, x_mean, sxx_c = self._fit()
+        out = []
+        for i in range(1, count + 1):
+            x = i * step / 60.0
+            value = intercept + slope * x
+            if sxx_c > 0:
+                spread = sigma * math.sqrt(1.0 + 1.0 / n_eff + (x - x_mean) ** 2 * self._s0 / (sxx_c * n_eff))
+            else:
+                spread = sigma
+            out.append(Prediction(self.last_ts + i * step, value, value - Z_95 * spread, value + Z_95 * spread))
+        return out
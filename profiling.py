@@ -0,0 +1,169 @@
+# profiling.py
+"""
+Tick profiling. A TickProfiler runs the next N ticks under cProfile and,
+while each of them runs, a sampling profiler that snapshots every thread's
+stack every few milliseconds. The ticks keep their normal schedule (one per
+worker fetch), so profiling adds no requests and time between ticks is not
+sampled. Profiles are written to the settings dir when the last tick
+finishes:
+
+    profile-<stamp>.pstats     cProfile of the ticks
+                               (python -m pstats, snakeviz)
+    profile-<stamp>.collapsed  sampled stacks of all threads, one
+                               "thread;frame;frame count" line per stack
+                               (flamegraph.pl, speedscope, inferno)
+    profile-<stamp>.txt        top functions by cumulative time
+
+Before Python 3.12 cProfile sees only the thread it runs on; with the
+asyncio backend that is the worker waiting on the event loop. The collapsed
+stacks cover every thread either way, including the main thread (title
+dispatch and rendering).
+
+Switch it on with DEXCOM_PROFILE_TICKS=N (profiles the first N ticks after
+start), the hidden "Profile Ticks" menu item (diagnostics.profiling_menu in
+settings.json), or headless.py --profile-ticks N. cProfile and pstats are
+imported only when a profile is taken.
+"""
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+ENV_VAR = "DEXCOM_PROFILE_TICKS"
+DEFAULT_TICKS = 20
+DEFAULT_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+MAX_DEPTH = 128
+
+
+def ticks_from_env(value=None):
+    """Ticks requested by DEXCOM_PROFILE_TICKS (or `value`); 0 when unset or invalid."""
+    value = os.environ.get(ENV_VAR, "") if value is None else value
+    if not str(value).strip():
+        return 0
+    try:
+        return max(0, int(value))
+    except ValueError:
+        logging.error("Ignoring %s=%r: expected a tick count", ENV_VAR, value)
+        return 0
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples the stacks of all other threads every `interval` s into collapsed-stack counts."""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+class TickProfiler:
+    """
+    Profiles the next `ticks` calls made through run(). on_done(paths) is
+    called on the ticking thread once the files are written.
+    """
+
+    def __init__(self, ticks=DEFAULT_TICKS, directory=None, sample_interval=DEFAULT_SAMPLE_INTERVAL, on_done=None):
+        self.ticks = ticks
+        self.directory = directory
+        self.on_done = on_done
+        self.done = 0
+        self.paths = None
+        import cProfile
+        self._profile = cProfile.Profile()
+        self._sampler = StackSampler(sample_interval)
+        self._lock = threading.Lock()
+        self._started = None
+
+    @property
+    def finished(self):
+        return self.paths is not None
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn, profiled if this profiler still has ticks left."""
+        with self._lock:
+            if self.finished or self.done >= self.ticks:
+                return fn(*args, **kwargs)
+            if self._started is None:
+                self._started = time.time()
+        self._sampler.start()
+        try:
+            return self._profile.runcall(fn, *args, **kwargs)
+        finally:
+            self._sampler.stop()
+            with self._lock:
+                self.done += 1
+                last = self.done == self.ticks
+            if last:
+                self._finish()
+
+    def wrap(self, fn):
+        return lambda *args, **kwargs: self.run(fn, *args, **kwargs)
+
+    def _finish(self):
+        directory = self.directory
+        if directory is None:
+            from settings import get_settings_dir
+            directory = get_settings_dir()
+        base = os.path.join(directory, "profile-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started)))
+        paths = {"pstats": base + ".pstats", "collapsed": base + ".collapsed", "summary": base + ".txt"}
+        try:
+            self._profile.dump_stats(paths["pstats"])
+            with open(paths["collapsed"], "w") as f:
+                f.write(self._sampler.collapsed())
+            with open(paths["summary"], "w") as f:
+                f.write(self.summary())
+            logging.info("Profiled %d ticks (%d stack samples): %s", self.done, self._sampler.samples, base)
+        except Exception as e:
+            logging.error("Error writing profile: %s", e)
+        self.paths = paths
+        if self.on_done is not None:
+            try:
+                self.on_done(paths)
+            except Exception as e:
+                logging.error("Profile callback failed: %s", e)
+
+    def summary(self, top=25):
+        import pstats
+        out = io.StringIO()
+        out.write(f"{self.done} ticks, {self._sampler.samples} stack samples\n\n")
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(top)
+        return out.getvalue()
@@ -0,0 +1,159 @@
+# reachability.py
+"""
+Shared connectivity check. A probe is one TCP connect (DNS lookup included,
+no TLS) to the host in question, with a short timeout. Results are cached:
+"reachable" for `ttl` seconds, "unreachable" only for `offline_ttl` so the
+poller notices quickly when the network comes back. Concurrent checks share
+one probe, and probes are never closer together than `min_interval`.
+
+The engine consults it before each Dexcom call, so an offline laptop skips
+the fetch instead of blocking a thread in connect/read timeouts, and dialogs
+use check_async() to ask without blocking the main thread. A failed Dexcom
+call invalidates the cached result so the next check probes again.
+
+A direct connect says nothing about a host reached through a proxy, so when
+an HTTPS proxy applies to the host (environment or macOS system settings,
+as requests sees them) the host is taken as reachable without probing.
+"""
+import logging
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_TTL = 60.0
+DEFAULT_OFFLINE_TTL = 10.0
+DEFAULT_MIN_INTERVAL = 2.0
+DEFAULT_TIMEOUT = 3.0
+
+
+def _tcp_probe(host, port, timeout):
+    with socket.create_connection((host, port), timeout=timeout):
+        pass
+
+
+def _proxied(host):
+    from urllib.request import getproxies, proxy_bypass
+    try:
+        return bool(getproxies().get("https")) and not proxy_bypass(host)
+    except Exception as e:
+        logging.error("Error reading proxy settings: %s", e)
+        return False
+
+
+class Reachability:
+    def __init__(self, host, port=443, ttl=DEFAULT_TTL, offline_ttl=DEFAULT_OFFLINE_TTL,
+                 min_interval=DEFAULT_MIN_INTERVAL, timeout=DEFAULT_TIMEOUT, clock=time.monotonic, probe=_tcp_probe,
+                 proxied=_proxied):
+        self.host = host
+        self.port = port
+        self.ttl = ttl
+        self.offline_ttl = offline_ttl
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.clock = clock
+        self._probe = probe
+        self._proxied = proxied
+        self._cond = threading.Condition()
+        self._reachable = None   # last known state; None before the first check
+        self._checked_at = None  # when it was learned (probe or report)
+        self._probed_at = None
+        self._probing = False
+        self.stats = {"checks": 0, "cache_hits": 0, "probes": 0, "offline": 0, "coalesced": 0, "proxied": 0}
+
+    def _fresh(self, now):
+        # Caller holds the condition.
+        if self._checked_at is None:
+            return False
+        ttl = self.ttl if self._reachable else self.offline_ttl
+        return now - self._checked_at < ttl
+
+    def is_reachable(self):
+        """Cached state if fresh, else probe (or wait for the probe already running). Blocks up to ~timeout."""
+        with self._cond:
+            self.stats["checks"] += 1
+            if self._probing:
+                self.stats["coalesced"] += 1
+                self._cond.wait_for(lambda: not self._probing, timeout=self.timeout + 1.0)
+                return bool(self._reachable)
+            now = self.clock()
+            if self._fresh(now) or (self._probed_at is not None and now - self._probed_at < self.min_interval):
+                self.stats["cache_hits"] += 1
+                return bool(self._reachable)
+            self._probing = True
+            self._probed_at = now
+        reachable = False
+        proxied = self._proxied(self.host)
+        try:
+            if not proxied:
+                self._probe(self.host, self.port, self.timeout)
+            reachable = True
+        except Exception as e:
+            logging.info("%s:%s unreachable: %s", self.host, self.port, e)
+        with self._cond:
+            self.stats["proxied" if proxied else "probes"] += 1
+            self.stats["offline"] += int(not reachable)
+            self._probing = False
+            self._set(reachable)
+            self._cond.notify_all()
+        return reachable
+
+    def check_async(self, callback):
+        """Call callback(reachable) from a background thread; never blocks the caller."""
+        def run():
+            try:
+                reachable = self.is_reachable()
+            except Exception as e:
+                logging.error("Reachability check failed: %s", e)
+                reachable = False
+            callback(reachable)
+        threading.Thread(target=run, name="reachability", daemon=True).start()
+
+    def report(self, reachable):
+        """Feed back a result learned for free, e.g. a successful Dexcom request."""
+        with self._cond:
+            self._set(reachable)
+
+    def invalidate(self):
+        """Forget the cached state so the next check probes (e.g. after a failed request)."""
+        with self._cond:
+            self._checked_at = None
+
+    def offline(self):
+        """True if the last known state is unreachable (does not probe)."""
+        with self._cond:
+            return self._reachable is False
+
+    def recheck_in(self):
+        """Seconds until a check would probe again."""
+        with self._cond:
+            now = self.clock()
+            waits = [0.0]
+            if self._checked_at is not None:
+                waits.append(self._checked_at + (self.ttl if self._reachable else self.offline_ttl) - now)
+            if self._probed_at is not None:
+                waits.append(self._probed_at + self.min_interval - now)
+            return max(waits)
+
+    def _set(self, reachable):
+        # Caller holds the condition.
+        self._reachable = reachable
+        self._checked_at = self.clock()
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get(host, port=443):
+    """The shared Reachability for host:port."""
+    with _registry_lock:
+        r = _registry.get((host, port))
+        if r is None:
+            r = _registry[(host, port)] = Reachability(host, port)
+        return r
+
+
+def for_url(url):
+    parts = urlsplit(url)
+    return get(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
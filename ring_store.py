@@ -0,0 +1,234 @@
+# ring_store.py
+"""
+Append-only, memory-mapped ring buffer of glucose readings.
+
+Fixed-size 16-byte records (timestamp, value, trend code, checksum) live in a
+preallocated file after a small header, so appending is O(1) with no rewrite,
+time-range lookups are a binary search over the (time-ordered) ring, and the
+file never grows past `capacity` records; the oldest are overwritten.
+
+Crash safety: a record is written before the header's sequence counter is
+bumped, and each record's CRC covers its own sequence number. On open the
+tail is re-validated in both directions, so a torn append or a stale header
+is repaired and a record left over from the previous lap is never mistaken
+for a new one.
+
+Not thread-safe; callers serialize access (HistorySync holds a lock).
+"""
+import mmap
+import os
+import struct
+import zlib
+
+from pydexcom.const import TREND_ARROWS
+
+MAGIC = b"DXRING1\0"
+VERSION = 1
+# magic, version, record size, capacity, next sequence number
+HEADER = struct.Struct("<8sIIIxxxxQ")
+HEADER_SIZE = 64
+# timestamp (epoch s), value (mg/dL), trend code, reserved, crc32
+RECORD = struct.Struct("<qHBxI")
+RECORD_BODY = struct.Struct("<qHBxQ")  # what the CRC covers: record fields + sequence number
+
+DEFAULT_CAPACITY = 90 * 288  # 90 days of 5-minute readings
+
+_TREND_CODES = {arrow: code for code, arrow in enumerate(TREND_ARROWS) if arrow}
+
+
+def trend_code(trend_arrow):
+    """pydexcom trend arrow -> small int (index into pydexcom TREND_ARROWS, 0 if unknown)."""
+    return _TREND_CODES.get(trend_arrow or "", 0)
+
+
+def trend_arrow(code):
+    return TREND_ARROWS[code] if 0 < code < len(TREND_ARROWS) else None
+
+
+def _crc(seq, ts, value, trend):
+    return zlib.crc32(RECORD_BODY.pack(ts, value, trend, seq))
+
+
+class RingStore:
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = int(capacity)
+        self._file = None
+        self._mm = None
+        self._next_seq = 0
+        self._min_seq = 0
+        self._open()
+
+    # --- file management ---
+
+    def _open(self):
+        size = HEADER_SIZE + self.capacity * RECORD.size
+        existing = None
+        if os.path.exists(self.path):
+            existing = self._read_existing()
+            if existing is not None and existing[0] == self.capacity:
+                self._map(size)
+                self._next_seq = existing[1]
+                self._recover()
+                return
+        # New file, unreadable file, or a capacity change: (re)build it.
+        carried = existing[2] if existing is not None else []
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.capacity, 0).ljust(HEADER_SIZE, b"\0"))
+            f.truncate(size)
+        os.replace(tmp, self.path)
+        self._map(size)
+        self._next_seq = 0
+        for ts, value, trend in carried[-self.capacity:]:
+            self._append_unflushed(ts, value, trend)
+        self.flush()
+
+    def _read_existing(self):
+        """(capacity, next_seq, records) of a readable store at self.path, else None."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            magic, version, record_size, capacity, next_seq = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                return None
+            if len(data) < HEADER_SIZE + capacity * RECORD.size:
+                return None
+            if capacity == self.capacity:
+                return capacity, next_seq, None
+            old = RingStore.__new__(RingStore)
+            old.capacity, old._next_seq, old._min_seq, old._mm = capacity, next_seq, 0, data
+            old._recover()
+            return capacity, next_seq, old.range()
+        except Exception:
+            return None
+
+    def _map(self, size):
+        self._file = open(self.path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+    def close(self):
+        if self._mm is not None:
+            self.flush()
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+            self._file = None
+
+    def flush(self):
+        self._mm.flush()
+
+    def _flush_range(self, offset, length):
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        self._mm.flush(start, offset + length - start)
+
+    # --- record access ---
+
+    def _offset(self, seq):
+        return HEADER_SIZE + (seq % self.capacity) * RECORD.size
+
+    def _read(self, seq):
+        ts, value, trend, crc = RECORD.unpack_from(self._mm, self._offset(seq))
+        return ts, value, trend, crc
+
+    def _valid(self, seq):
+        if seq < 0:
+            return False
+        ts, value, trend, crc = self._read(seq)
+        return crc == _crc(seq, ts, value, trend)
+
+    def _write_header_seq(self):
+        # next_seq is the last header field
+        struct.pack_into("<Q", self._mm, HEADER.size - 8, self._next_seq)
+
+    def _recover(self):
+        # Header behind the data: a record was written but the counter bump was lost.
+        while self._valid(self._next_seq) and self._timestamp_ok(self._next_seq):
+            self._next_seq += 1
+        # Header ahead of the data: the last record(s) never made it to disk.
+        while self._next_seq > self._oldest_seq() and not self._valid(self._next_seq - 1):
+            self._next_seq -= 1
+        # A torn write can also have clobbered the oldest record when the ring is full.
+        while self._oldest_seq() < self._next_seq and not self._valid(self._oldest_seq()):
+            self._min_seq = self._oldest_seq() + 1
+        if isinstance(self._mm, mmap.mmap):
+            self._write_header_seq()
+
+    def _timestamp_ok(self, seq):
+        if seq == 0 or not self._valid(seq - 1):
+            return True
+        return self._read(seq)[0] >= self._read(seq - 1)[0]
+
+    def _oldest_seq(self):
+        return max(self._min_seq, self._next_seq - self.capacity)
+
+    def __len__(self):
+        return self._next_seq - self._oldest_seq()
+
+    # --- public API ---
+
+    def newest(self):
+        """(timestamp, value, trend_code) of the newest record, or None."""
+        if not len(self):
+            return None
+        return self._read(self._next_seq - 1)[:3]
+
+    def _append_unflushed(self, ts, value, trend):
+        seq = self._next_seq
+        ts, value, trend = int(ts), max(0, min(0xFFFF, int(value))), int(trend) & 0xFF
+        RECORD.pack_into(self._mm, self._offset(seq), ts, value, trend, _crc(seq, ts, value, trend))
+        self._next_seq = seq + 1
+        self._write_header_seq()
+        return seq
+
+    def append(self, ts, value, trend=0, flush=True):
+        """Append one reading. Timestamps must not go backwards; returns False if rejected."""
+        newest = self.newest()
+        if newest is not None and int(ts) <= newest[0]:
+            return False
+        seq = self._append_unflushed(ts, value, trend)
+        if flush:
+            self._flush_range(self._offset(seq), RECORD.size)
+            self._flush_range(0, HEADER_SIZE)
+        return True
+
+    def extend(self, records):
+        """Append many (ts, value, trend) records with a single flush. Returns the count added."""
+        added = 0
+        for ts, value, trend in records:
+            added += self.append(ts, value, trend, flush=False)
+        if added:
+            self.flush()
+        return added
+
+    def _timestamp_at(self, seq):
+        return self._read(seq)[0]
+
+    def _bisect(self, ts, lo, hi):
+        # first seq in [lo, hi) whose timestamp is >= ts
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamp_at(mid) < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start_ts=None, end_ts=None):
+        """[(timestamp, value, trend_code)] with start_ts <= timestamp <= end_ts, oldest first."""
+        lo, hi = self._oldest_seq(), self._next_seq
+        if start_ts is not None:
+            lo = self._bisect(int(start_ts), lo, hi)
+        if end_ts is not None:
+            hi = self._bisect(int(end_ts) + 1, lo, hi)
+        out = []
+        seq = lo
+        while seq < hi:
+            # Read contiguous runs straight out of the map, splitting at the wrap point.
+            run = min(hi - seq, self.capacity - seq % self.capacity)
+            offset = self._offset(seq)
+            out.extend(r[:3] for r in RECORD.iter_unpack(self._mm[offset:offset + run * RECORD.size]))
+            seq += run
+        return out
+
+
@@ -0,0 +1,343 @@
+# scheduler.py
+"""
+Fetch scheduling. A single long-lived worker thread runs every fetch, so at
+most one is ever in flight; requests that arrive while one is running are
+merged into it instead of starting another thread. PollScheduler decides when
+the worker polls next, aligned to when the sensor's next reading should land,
+and WakeDetector tells it when the machine has just woken from sleep.
+"""
+import logging
+import math
+import threading
+import time
+
+READING_INTERVAL = 300  # Dexcom CGM cadence, seconds
+WAKE_THRESHOLD = 30.0   # wall-clock time unaccounted for by the monotonic clock
+WAKE_CHECK_INTERVAL = 15.0  # longest the worker waits without looking for a wake
+
+
+class WakeDetector:
+    """
+    Notices sleep/wake by comparing two clocks. The monotonic clock stops while
+    the machine sleeps (mach_absolute_time on macOS, CLOCK_MONOTONIC on Linux)
+    and the wall clock does not, so between two checks the wall clock running
+    ahead by more than `threshold` means the machine was asleep for about that
+    long. A timer armed on the monotonic clock before sleep would otherwise fire
+    only after the rest of its delay has run out after wake.
+
+    Wall-clock steps (NTP, the user changing the time) look the same; a step
+    forward costs one extra fetch, a step back is ignored.
+    """
+
+    def __init__(self, threshold=WAKE_THRESHOLD, wall=time.time, monotonic=time.monotonic):
+        self.threshold = threshold
+        self.wall = wall
+        self.monotonic = monotonic
+        self._lock = threading.Lock()
+        self._last = (wall(), monotonic())
+        self.stats = {"checks": 0, "wakes": 0}
+
+    def check(self):
+        """Seconds slept since the previous check, or 0.0 if there was no gap."""
+        with self._lock:
+            wall, mono = self.wall(), self.monotonic()
+            last_wall, last_mono = self._last
+            self._last = (wall, mono)
+            self.stats["checks"] += 1
+            gap = (wall - last_wall) - (mono - last_mono)
+            if gap <= self.threshold:
+                return 0.0
+            self.stats["wakes"] += 1
+        logging.info("Woke after %.0f s asleep", gap)
+        return gap
+
+
+class FetchWorker:
+    def __init__(self, fetch, next_delay=None, name="dexcom-fetch", wake_detector=None, on_wake=None,
+                 wake_check_interval=WAKE_CHECK_INTERVAL, clock=time.monotonic):
+        self._fetch = fetch
+        # Optional callable returning seconds until the next scheduled fetch;
+        # without it the worker only fetches on request().
+        self._next_delay = next_delay
+        # Optional WakeDetector: while idle the worker checks it at least every
+        # wake_check_interval seconds and fetches at once after a sleep, merged
+        # with any fetch already queued. on_wake(gap) runs on the worker first.
+        self._wake = wake_detector
+        self._on_wake = on_wake
+        self._wake_check_interval = wake_check_interval
+        self._clock = clock
+        self._woke = 0.0
+        self._deadline = None
+        self._name = name
+        self._cond = threading.Condition()
+        self._pending = False
+        self._running = False
+        self._stopped = False
+        self._thread = None
+        # Callables from submit(), run on the worker before its next fetch.
+        self._calls = []
+        self.stats = {"requested": 0, "scheduled": 0, "fetches": 0, "coalesced": 0, "dropped": 0, "wakes": 0,
+                      "calls": 0}
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def request(self):
+        """Ask for a fetch. Returns False if it was merged into one already queued or running."""
+        with self._cond:
+            self.stats["requested"] += 1
+            if self._stopped:
+                self.stats["dropped"] += 1
+                return False
+            if self._pending or self._running:
+                self.stats["coalesced"] += 1
+                return False
+            self._pending = True
+            self._cond.notify()
+        if self._thread is None:
+            self.start()
+        return True
+
+    def submit(self, fn, fetch=False):
+        """
+        Run fn on the worker, after the fetch in flight if there is one, so it
+        never races a fetch. With fetch=True a fetch follows it, even when a
+        request() would have been merged into the running one.
+        """
+        with self._cond:
+            if self._stopped:
+                self.stats["dropped"] += 1
+                return False
+            self._calls.append(fn)
+            if fetch:
+                self.stats["requested"] += 1
+                self._pending = True
+            self._cond.notify()
+        if self._thread is None:
+            self.start()
+        return True
+
+    def busy(self):
+        with self._cond:
+            return self._pending or self._running
+
+    def next_due_in(self):
+        """Seconds until the next scheduled fetch, or None."""
+        with self._cond:
+            if self._deadline is None:
+                return None
+            return max(0.0, self._deadline - self._clock())
+
+    def _woke_up(self):
+        # Caller holds the condition. True once per detected sleep gap.
+        gap = self._wake.check() if self._wake is not None else 0.0
+        if not gap:
+            return False
+        self.stats["wakes"] += 1
+        if self._pending or self._running:
+            self.stats["coalesced"] += 1
+        self._woke = max(self._woke, gap)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._calls and not self._stopped:
+                    if self._woke_up():
+                        self._pending = True
+                        break
+                    timeout = None
+                    if self._deadline is not None:
+                        timeout = self._deadline - self._clock()
+                        if timeout <= 0:
+                            self._pending = True
+                            self.stats["scheduled"] += 1
+                            break
+                    if self._wake is not None:
+                        timeout = self._wake_check_interval if timeout is None else min(timeout, self._wake_check_interval)
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    if self._pending:
+                        self.stats["dropped"] += 1
+                    self.stats["dropped"] += len(self._calls)
+                    return
+                calls, self._calls = self._calls, []
+            if calls:
+                self._run_calls(calls)
+                with self._cond:
+                    if not self._pending:
+                        # Only submitted calls: the schedule stays as it was.
+                        continue
+            with self._cond:
+                self._woke_up()
+                self._pending = False
+                self._running = True
+                woke, self._woke = self._woke, 0.0
+            if woke and self._on_wake is not None:
+                try:
+                    self._on_wake(woke)
+                except Exception as e:
+                    logging.error("Wake handler error: %s", e)
+            try:
+                self.stats["fetches"] += 1
+                self._fetch()
+            except Exception as e:
+                logging.error("Fetch worker error: %s", e)
+            finally:
+                delay = None
+                if self._next_delay is not None:
+                    try:
+                        delay = self._next_delay()
+                    except Exception as e:
+                        logging.error("Poll scheduler error: %s", e)
+                        delay = READING_INTERVAL
+                with self._cond:
+                    self._running = False
+                    self._deadline = None if delay is None else self._clock() + delay
+
+    def _run_calls(self, calls):
+        for fn in calls:
+            self.stats["calls"] += 1
+            try:
+                fn()
+            except Exception as e:
+                logging.error("Worker call failed: %s", e)
+
+
+class PollScheduler:
+    """
+    Reading-aligned poll timing.
+
+    Dexcom readings land on Share roughly every 5 minutes at a fixed phase per
+    sensor, plus a variable upload lag. The scheduler polls at `offset` seconds
+    after the next reading's nominal time, retries a few times if the reading
+    is late, then waits for the following slot. The offset walks earlier after
+    a first-try hit and later after a miss, settling where about
+    miss_step / (hit_step + miss_step) of readings (95% by default) are caught
+    on the first request.
+
+    Miss retries are budgeted against the fixed timer's rate of `budget` polls
+    per interval. Each poll made when it was scheduled spends one credit,
+    credit accrues with time up to `burst` (where it starts), and a retry is
+    made only with a whole credit to spend; otherwise the poll waits for the
+    next slot. Slot polls are never held back, and polls made before they were
+    due (start-up, a manual update, sign-in) are not charged. Retries are paid
+    for by time spent not polling (offline, erroring, asleep), so scheduled
+    polls stay within the fixed timer's rate.
+    Errors back off exponentially (jittered, when a breaker is attached).
+    """
+
+    def __init__(self, interval=READING_INTERVAL, initial_offset=30.0, hit_step=1.0, miss_step=19.0,
+                 min_offset=5.0, miss_retries=(30,), first_poll=60.0, error_backoff=30.0,
+                 min_delay=5.0, max_delay=900.0, clock=time.time, breaker=None, reachability=None,
+                 budget=1.0, burst=1.0):
+        self.interval = interval
+        self.offset = initial_offset
+        self.hit_step = hit_step
+        self.miss_step = miss_step
+        self.min_offset = min_offset
+        self.miss_retries = tuple(miss_retries)
+        self.first_poll = first_poll
+        self.error_backoff = error_backoff
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        # Optional breaker.CircuitBreaker; when set, retries after errors follow
+        # its jittered backoff (and its open period) instead of error_backoff.
+        self.breaker = breaker
+        # Optional reachability.Reachability; while offline, poll again as soon
+        # as it would re-probe, so fetching resumes right after the network does.
+        self.reachability = reachability
+        # Retry credit, see the class docstring.
+        self.budget = budget
+        self.burst = burst
+        self._credit = burst
+        self._credit_at = None
+        self._due = None  # when the last delay handed out runs out
+        self.last_reading_ts = None
+        self._errors = 0
+        self._miss_slot = None
+        self._slot_misses = 0
+
+    def observe(self, reading_ts, ok=True, now=None, offline=False):
+        """Feed back the result of a fetch: newest reading time (epoch s) or None."""
+        now = self.clock() if now is None else now
+        if offline:
+            # Skipped, not failed: no error backoff to climb down from later.
+            return
+        if self._due is not None and now >= self._due - 1.0:
+            self._credit = self._credit_now(now) - 1.0
+            self._credit_at = now
+        if not ok:
+            self._errors += 1
+            return
+        self._errors = 0
+        if reading_ts is not None and (self.last_reading_ts is None or reading_ts > self.last_reading_ts + 1):
+            if self.last_reading_ts is not None:
+                if self._slot_misses:
+                    self.offset = min(self.interval / 2, self.offset + self.miss_step)
+                else:
+                    self.offset = max(self.min_offset, self.offset - self.hit_step)
+            self.last_reading_ts = reading_ts
+            self._miss_slot = None
+            self._slot_misses = 0
+            return
+        slot = self._slot_index(now)
+        if slot != self._miss_slot:
+            self._miss_slot, self._slot_misses = slot, 0
+        self._slot_misses += 1
+
+    def _credit_now(self, now):
+        if self._credit_at is None:
+            return self._credit
+        return min(self.burst, self._credit + (now - self._credit_at) * self.budget / self.interval)
+
+    def _slot_index(self, now):
+        # slot k is the window in which reading last + k * interval should land
+        if self.last_reading_ts is None:
+            return None
+        return math.floor((now - self.last_reading_ts - self.offset) / self.interval)
+
+    def next_delay(self, now=None):
+        """Seconds until the next poll should run."""
+        now = self.clock() if now is None else now
+        if self.reachability is not None and self.reachability.offline():
+            delay = self.reachability.recheck_in()
+        elif self._errors and self.breaker is not None:
+            # The breaker only knows about failed Dexcom calls; ticks that failed
+            # without one (retry_in() == 0) still back off exponentially. Its own
+            # delay is used as is when set, so the jitter is not clipped away.
+            delay = self.breaker.retry_in() or self.error_backoff * (2 ** (self._errors - 1))
+        elif self._errors:
+            delay = self.error_backoff * (2 ** (self._errors - 1))
+        elif self.last_reading_ts is None:
+            delay = self.first_poll
+        else:
+            slot = self._slot_index(now)
+            delay = self.last_reading_ts + self.offset + max(1, slot + 1) * self.interval - now
+            if delay > self.max_delay:
+                # Clamp to an earlier slot of this sensor, not to a flat max_delay,
+                # so accounts sharing a scheduler keep their own phases.
+                delay -= self.interval * math.ceil((delay - self.max_delay) / self.interval)
+            spare = self._credit_now(now + min(delay, self.interval / 2)) >= 1.0
+            if slot >= 1 and self._miss_slot == slot and self._slot_misses <= len(self.miss_retries):
+                # Expected reading is late: retry soon, but never past the next slot.
+                if spare:
+                    delay = min(delay, self.miss_retries[self._slot_misses - 1])
+            elif delay < self.interval / 2 and not spare:
+                # The reading just found was a slot late, so the one due in `delay`
+                # was already polled for: a retry too, unless there is credit.
+                delay += self.interval
+        delay = max(self.min_delay, min(self.max_delay, delay))
+        self._due = now + delay
+        return delay
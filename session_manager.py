@@ -0,0 +1,215 @@
+# session_manager.py
+"""
+Keeps the Dexcom Share session warm. Tracks session age, re-logs in on a
+background thread shortly before the session is expected to expire, and
+counts how often a fetch still had to log in on the critical path ("cold").
+"""
+import logging
+import threading
+import time
+
+DEFAULT_SESSION_MAX_AGE = 3600   # seconds a session is assumed to stay valid
+DEFAULT_REFRESH_MARGIN = 300     # refresh this long before the assumed expiry
+MIN_SESSION_MAX_AGE = 120       # floor when learning a shorter lifetime
+
+
+class SessionManager:
+    def __init__(self, max_age=DEFAULT_SESSION_MAX_AGE, refresh_margin=DEFAULT_REFRESH_MARGIN,
+                 auto_refresh=True, clock=time.monotonic, min_max_age=MIN_SESSION_MAX_AGE):
+        self.max_age = max_age
+        self.min_max_age = min(min_max_age, max_age)
+        self.refresh_margin = refresh_margin
+        self.auto_refresh = auto_refresh
+        self.clock = clock
+        self.client = None
+        self._started_at = None
+        self._logins_seen = 0
+        self._lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        # Optional breaker.CircuitBreaker (the engine sets its own): background
+        # refreshes wait while it is open and report their outcome to it.
+        self.breaker = None
+        self.stats = {"warm": 0, "cold": 0, "refreshes": 0, "refresh_failures": 0}
+
+    # --- lifecycle ---
+
+    def attach(self, client, age=0.0):
+        """Adopt a logged-in client whose session is `age` seconds old (0 for a fresh login)."""
+        with self._lock:
+            self.client = client
+            self._mark_login(client, age)
+        if self.auto_refresh:
+            self._ensure_thread()
+            self._wake.set()
+
+    def clear(self):
+        with self._lock:
+            self.client = None
+            self._started_at = None
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _mark_login(self, client, age=0.0):
+        self._started_at = self.clock() - age
+        self._logins_seen = getattr(client, "logins", 0)
+
+    # --- age bookkeeping ---
+
+    def age(self):
+        if self._started_at is None:
+            return None
+        return self.clock() - self._started_at
+
+    def refresh_due_in(self):
+        """Seconds until the background refresh should run (None without a session)."""
+        age = self.age()
+        if age is None:
+            return None
+        return max(0.0, self.max_age - self.refresh_margin - age)
+
+    def expired(self):
+        age = self.age()
+        return age is not None and age >= self.max_age
+
+    def cold_ratio(self):
+        total = self.stats["warm"] + self.stats["cold"]
+        return self.stats["cold"] / total if total else 0.0
+
+    def record_cold(self):
+        """Count a fetch that had to log in first (e.g. no client at all)."""
+        self.stats["cold"] += 1
+
+    # --- session use ---
+
+    def refresh(self):
+        """Log in again on the current client (one request, by account ID)."""
+        with self._lock:
+            client = self.client
+            if client is None:
+                return False
+        # The login is network I/O (with the asyncio backend, a wait on the event
+        # loop): never under _lock, which callbacks on that loop take. _login_lock
+        # only keeps two refreshes from logging in on the client at once.
+        with self._login_lock:
+            try:
+                client._session()
+            except Exception as e:
+                with self._lock:
+                    return self._refresh_failed(client, e)
+        return self._refreshed(client)
+
+    async def refresh_async(self):
+        """refresh() for an async_client client, on its event loop."""
+        client = self.client
+        if client is None:
+            return False
+        try:
+            await client.login()
+        except Exception as e:
+            with self._lock:
+                return self._refresh_failed(client, e)
+        return self._refreshed(client)
+
+    def _refreshed(self, client):
+        with self._lock:
+            if self.client is not client:
+                # Cleared or replaced during the login: that state is newer.
+                return False
+            self._mark_login(client)
+            self.stats["refreshes"] += 1
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return True
+
+    def _refresh_failed(self, client, e):
+        # Caller holds the lock.
+        from pydexcom.errors import AccountError
+        if self.client is not client:
+            # Cleared or replaced during the login; nothing to report about it.
+            return False
+        self.stats["refresh_failures"] += 1
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if isinstance(e, AccountError):
+            # Credentials no longer valid; let the next fetch surface it.
+            logging.error("Session refresh rejected: %s", e)
+            self.client = None
+            self._started_at = None
+        else:
+            logging.warning("Session refresh failed: %s", e)
+        return False
+
+    def call(self, fn):
+        """Run fn(client) with a live session and classify the call warm or cold."""
+        cold = False
+        if self.expired():
+            # The background refresh didn't get to it; pay for it here.
+            cold = True
+            self.refresh()
+        client = self._live_client()
+        result = fn(client)
+        self._after_call(client, cold)
+        return result
+
+    async def call_async(self, fn):
+        """call() for the asyncio backend: fn(client) returns an awaitable."""
+        cold = False
+        if self.expired():
+            cold = True
+            await self.refresh_async()
+        client = self._live_client()
+        result = await fn(client)
+        self._after_call(client, cold)
+        return result
+
+    def _live_client(self):
+        client = self.client
+        if client is None:
+            raise RuntimeError("No Dexcom session")
+        return client
+
+    def _after_call(self, client, cold):
+        logins = getattr(client, "logins", 0)
+        if logins != self._logins_seen:
+            # pydexcom re-logged in mid-call: the session died earlier than we assumed.
+            cold = True
+            with self._lock:
+                age = self.age()
+                if age is not None:
+                    self.max_age = max(self.min_max_age, min(self.max_age, age))
+                self._mark_login(client)
+        self.stats["cold" if cold else "warm"] += 1
+
+    # --- background refresh ---
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="dexcom-session-refresh", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            due = self.refresh_due_in()
+            if due is None:
+                self._wake.wait()
+            else:
+                self._wake.wait(timeout=due)
+            self._wake.clear()
+            if self._stopped:
+                return
+            due = self.refresh_due_in()
+            if due is not None and due <= 0:
+                if self.breaker is not None and not self.breaker.allow():
+                    # Dexcom is failing; the fetch path will log in again once it recovers.
+                    self._wake.wait(timeout=max(1.0, self.breaker.retry_in()))
+                    continue
+                if not self.refresh():
+                    # Don't spin on a failing login; try again after a short pause.
+                    self._wake.wait(timeout=min(60.0, self.refresh_margin))
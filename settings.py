@@ -1,6 +1,8 @@
+import atexit
 import os
 import json
 import logging
+import threading
 
 try:
     from Foundation import NSSearchPathForDirectoriesInDomains, NSApplicationSupportDirectory, NSUserDomainMask
@@ -48,19 +50,63 @@ DEFAULT_SETTINGS = {
         "high_threshold": 180.0,
         "notifications": True,
         "units": "mg/dL"
+    },
+    "network": {
+        # Shared keep-alive connection pool used for every Dexcom request
+        "pool_size": 2,
+        "keepalive_idle": 60,
+        # Assumed Share session lifetime; refreshed in the background before it
+        "session_max_age": 3600,
+        # "threads" (requests/pydexcom) or "asyncio" (async_client.py)
+        "backend": "threads"
+    },
+    "diagnostics": {
+        # metrics.py exporter: "off", "file" (metrics.json/.prom in this
+        # directory), "http" (127.0.0.1:metrics_port/metrics) or "both"
+        "metrics": "off",
+        "metrics_interval": 60,
+        "metrics_port": 9464,
+        # Adds a "Profile Ticks" menu item that profiles the next profile_ticks
+        # scheduled ticks (see profiling.py)
+        "profiling_menu": False,
+        "profile_ticks": 20
     }
 }
 
 
+def write_text_atomic(path, text, mode=None):
+    """Write text to a temp file in the same directory, fsync it, then rename over `path`."""
+    directory = os.path.dirname(path) or "."
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600 if mode is None else mode)
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path, data, indent=None, mode=None):
+    write_text_atomic(path, json.dumps(data, indent=indent), mode)
+
+
 def _deepcopy_defaults():
     import copy
     return copy.deepcopy(DEFAULT_SETTINGS)
 
 
-def load_settings():
-    if os.path.exists(SETTINGS_FILE):
+def load_settings(path=None):
+    path = path or SETTINGS_FILE
+    if os.path.exists(path):
         try:
-            with open(SETTINGS_FILE, "r") as f:
+            with open(path, "r") as f:
                 data = json.load(f)
                 # merge with defaults to ensure new keys are present
                 base = _deepcopy_defaults()
@@ -70,22 +116,100 @@ def load_settings():
                     base["style_settings"].update(data["style_settings"])
                 if isinstance(data.get("preferences"), dict):
                     base["preferences"].update(data["preferences"])
+                if isinstance(data.get("network"), dict):
+                    base["network"].update(data["network"])
+                if isinstance(data.get("diagnostics"), dict):
+                    base["diagnostics"].update(data["diagnostics"])
                 return base
         except Exception as e:
             logging.error("Error loading settings: %s", e)
     return _deepcopy_defaults()
 
 
+def _persisted(settings):
+    # never store password
+    return {
+        "username": settings.get("username", ""),
+        "region": settings.get("region", "us"),
+        "style_settings": settings.get("style_settings", DEFAULT_SETTINGS["style_settings"]),
+        "preferences": settings.get("preferences", DEFAULT_SETTINGS["preferences"]),
+        "network": settings.get("network", DEFAULT_SETTINGS["network"]),
+        "diagnostics": settings.get("diagnostics", DEFAULT_SETTINGS["diagnostics"]),
+    }
+
+
 def save_settings(settings):
     try:
-        # never store password
-        to_save = {
-            "username": settings.get("username", ""),
-            "region": settings.get("region", "us"),
-            "style_settings": settings.get("style_settings", DEFAULT_SETTINGS["style_settings"]),
-            "preferences": settings.get("preferences", DEFAULT_SETTINGS["preferences"]),
-        }
-        with open(SETTINGS_FILE, "w") as f:
-            json.dump(to_save, f, indent=4)
+        write_text_atomic(SETTINGS_FILE, json.dumps(_persisted(settings), indent=4))
     except Exception as e:
         logging.error("Error saving settings: %s", e)
+
+
+class SettingsStore:
+    """
+    In-memory settings with debounced, atomic writes. update() captures the
+    new state right away and schedules one write `debounce` seconds after the
+    last change; writes whose serialized content matches what is on disk are
+    skipped. Safe to call from any thread.
+    """
+
+    def __init__(self, path=None, debounce=1.0):
+        self.path = path or SETTINGS_FILE
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = None
+        self._settings = load_settings(self.path)
+        self._written = self._read_text()
+        self.stats = {"updates": 0, "writes": 0, "skipped": 0, "write_errors": 0}
+        atexit.register(self.flush)
+
+    def _read_text(self):
+        try:
+            with open(self.path, "r") as f:
+                return f.read()
+        except Exception:
+            return None
+
+    def settings(self):
+        """A deep copy of the current settings."""
+        with self._lock:
+            return json.loads(json.dumps(self._settings))
+
+    def update(self, settings):
+        """Replace the persisted settings; written after the debounce delay."""
+        text = json.dumps(_persisted(settings), indent=4)
+        with self._lock:
+            self.stats["updates"] += 1
+            self._settings = json.loads(text)
+            self._pending = text
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending changes now. Returns True if the file was written."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            text, self._pending = self._pending, None
+            if text is None:
+                return False
+            if text == self._written:
+                self.stats["skipped"] += 1
+                return False
+            try:
+                write_text_atomic(self.path, text)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                logging.error("Error saving settings: %s", e)
+                # Keep it for the next flush unless something newer arrived.
+                if self._pending is None:
+                    self._pending = text
+                return False
+            self._written = text
+            self.stats["writes"] += 1
+            return True
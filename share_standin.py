@@ -0,0 +1,349 @@
+# share_standin.py
+"""
+Local stand-in for the Dexcom Share login/session/readings endpoints, for
+load and soak testing the polling engine without touching Dexcom.
+
+Latency, error rate and session lifetime are configurable, and readings come
+from a deterministic synthetic CGM trace on a 5-minute cadence.
+
+Usage: python share_standin.py --port 8080 --latency 0.05 --error-rate 0.1 --session-ttl 600
+Then:  python headless.py --base-url http://127.0.0.1:8080/ShareWebServices/Services \\
+           --username demo --password demo
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+BASE_PATH = "/ShareWebServices/Services"
+AUTHENTICATE_ENDPOINT = "General/AuthenticatePublisherAccount"
+LOGIN_ENDPOINT = "General/LoginPublisherAccountById"
+READINGS_ENDPOINT = "Publisher/ReadPublisherLatestGlucoseValues"
+STATS_PATH = "/_standin/stats"
+
+READING_INTERVAL = 300  # seconds between CGM readings
+
+
+def _trend_for_slope(slope_per_min):
+    if slope_per_min > 3:
+        return "DoubleUp"
+    if slope_per_min > 2:
+        return "SingleUp"
+    if slope_per_min > 1:
+        return "FortyFiveUp"
+    if slope_per_min < -3:
+        return "DoubleDown"
+    if slope_per_min < -2:
+        return "SingleDown"
+    if slope_per_min < -1:
+        return "FortyFiveDown"
+    return "Flat"
+
+
+def _account_id_for(username):
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"standin:{username}"))
+
+
+class SyntheticTrace:
+    """Deterministic CGM trace: slow sinusoid plus noise, one reading every 5 minutes."""
+
+    def __init__(self, seed=0, phase=None, base=130.0, amplitude=60.0, period=3 * 3600, noise=4.0):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.phase = rng.uniform(0, READING_INTERVAL) if phase is None else float(phase) % READING_INTERVAL
+        self.base = base
+        self.amplitude = amplitude
+        self.period = period
+        self.noise = noise
+        self.offset = rng.uniform(0, period)
+
+    def _value_at(self, ts):
+        k = int(math.floor((ts - self.phase) / READING_INTERVAL))
+        jitter = random.Random(hash((self.seed, k))).gauss(0, self.noise)
+        angle = 2 * math.pi * (ts + self.offset) / self.period
+        return max(40.0, min(400.0, self.base + self.amplitude * math.sin(angle) + jitter))
+
+    def reading_times(self, now, minutes, max_count):
+        """Timestamps of readings in (now - minutes, now], newest first."""
+        newest = math.floor((now - self.phase) / READING_INTERVAL) * READING_INTERVAL + self.phase
+        oldest_allowed = now - minutes * 60
+        times = []
+        ts = newest
+        while ts > oldest_allowed and len(times) < max_count:
+            times.append(ts)
+            ts -= READING_INTERVAL
+        return times
+
+    def reading(self, ts):
+        value = self._value_at(ts)
+        slope = (value - self._value_at(ts - READING_INTERVAL)) / (READING_INTERVAL / 60.0)
+        return int(round(value)), _trend_for_slope(slope)
+
+    def readings(self, now, minutes, max_count):
+        """Readings as the Share API returns them (JSON dicts), newest first."""
+        out = []
+        for ts in self.reading_times(now, minutes, max_count):
+            value, trend = self.reading(ts)
+            ms = int(ts * 1000)
+            out.append({
+                "WT": f"Date({ms})",
+                "ST": f"Date({ms})",
+                "DT": f"Date({ms}+0000)",
+                "Value": value,
+                "Trend": trend,
+            })
+        return out
+
+
+class StandinConfig:
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0, session_ttl=None,
+                 accounts=None, trace_seed=0, clock=time.time):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        # username -> password; None accepts any non-empty credentials
+        self.accounts = accounts
+        self.trace_seed = trace_seed
+        self.clock = clock
+
+
+class ShareStandin:
+    """In-process Share API stand-in. start() returns the base URL to hand to the client."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StandinConfig()
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.trace_seed)
+        self._accounts = {}   # account_id -> username
+        self._sessions = {}   # session_id -> (account_id, created_at)
+        self._traces = {}     # account_id -> SyntheticTrace
+        self.stats = {
+            "requests": 0,
+            "authenticate": 0,
+            "login": 0,
+            "readings": 0,
+            "session_errors": 0,
+            "injected_errors": 0,
+            "auth_failures": 0,
+        }
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}{BASE_PATH}"
+
+    def start(self):
+        standin = self
+
+        class Handler(_ShareHandler):
+            pass
+        Handler.standin = standin
+        self._server = _StandinServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="share-standin", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_forever(self):
+        if self._server is None:
+            self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def snapshot_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def expire_sessions(self):
+        """Invalidate every session, as if Dexcom rotated them."""
+        with self._lock:
+            self._sessions.clear()
+
+    def trace_for(self, account_id):
+        with self._lock:
+            trace = self._traces.get(account_id)
+            if trace is None:
+                seed = zlib.crc32(f"{self.config.trace_seed}:{account_id}".encode())
+                trace = self._traces[account_id] = SyntheticTrace(seed=seed)
+            return trace
+
+    # --- request handling (called from handler threads) ---
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _delay(self):
+        cfg = self.config
+        if cfg.latency or cfg.latency_jitter:
+            with self._lock:
+                jitter = self._rng.uniform(-cfg.latency_jitter, cfg.latency_jitter) if cfg.latency_jitter else 0.0
+            time.sleep(max(0.0, cfg.latency + jitter))
+
+    def _inject_error(self):
+        if not self.config.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.config.error_rate
+
+    def _check_password(self, username, password):
+        if not password:
+            return False
+        accounts = self.config.accounts
+        if accounts is None:
+            return bool(username)
+        return accounts.get(username) == password
+
+    def _account_username(self, account_id):
+        # Account IDs are derived from the username, so (like the real service)
+        # a login by ID also works for accounts this process never looked up.
+        with self._lock:
+            username = self._accounts.get(account_id)
+        if username is not None or not account_id:
+            return username
+        if self.config.accounts is None:
+            return account_id
+        for name in self.config.accounts:
+            if _account_id_for(name) == account_id:
+                return name
+        return None
+
+    def handle(self, endpoint, params, body):
+        """Return (status, payload) for a Share API call."""
+        self._count("requests")
+        self._delay()
+        if self._inject_error():
+            self._count("injected_errors")
+            return 500, {"Code": "InternalError", "Message": "Injected failure"}
+
+        if endpoint == AUTHENTICATE_ENDPOINT:
+            self._count("authenticate")
+            username = body.get("accountName")
+            if not self._check_password(username, body.get("password")):
+                self._count("auth_failures")
+                return 500, {"Code": "AccountPasswordInvalid", "Message": "Invalid password"}
+            account_id = _account_id_for(username)
+            with self._lock:
+                self._accounts[account_id] = username
+            return 200, account_id
+
+        if endpoint == LOGIN_ENDPOINT:
+            self._count("login")
+            account_id = body.get("accountId")
+            username = self._account_username(account_id)
+            if username is None or not self._check_password(username, body.get("password")):
+                self._count("auth_failures")
+                return 500, {"Code": "AccountPasswordInvalid", "Message": "Invalid password"}
+            session_id = str(uuid.uuid4())
+            with self._lock:
+                self._sessions[session_id] = (account_id, self.config.clock())
+            return 200, session_id
+
+        if endpoint == READINGS_ENDPOINT:
+            self._count("readings")
+            session_id = (params.get("sessionId") or [""])[0]
+            now = self.config.clock()
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session and self.config.session_ttl is not None and now - session[1] > self.config.session_ttl:
+                    del self._sessions[session_id]
+                    session = None
+            if session is None:
+                self._count("session_errors")
+                return 500, {"Code": "SessionIdNotFound", "Message": "Session not found"}
+            try:
+                minutes = int((params.get("minutes") or ["1440"])[0])
+                max_count = int((params.get("maxCount") or ["288"])[0])
+            except ValueError:
+                return 500, {"Code": "InvalidArgument", "Message": "Invalid minutes/maxCount"}
+            return 200, self.trace_for(session[0]).readings(now, minutes, max_count)
+
+        return 404, {"Code": "NotFound", "Message": endpoint}
+
+
+class _StandinServer(ThreadingHTTPServer):
+    # socketserver's default listen backlog of 5 drops connects when a load
+    # test opens dozens of connections at once.
+    request_queue_size = 128
+
+
+class _ShareHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive like they would with Dexcom.
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle plus delayed
+    # ACKs add ~40 ms to every response and swamp the numbers being measured.
+    disable_nagle_algorithm = True
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == STATS_PATH:
+            self._send_json(200, self.standin.snapshot_stats())
+        else:
+            self._send_json(404, {"Code": "NotFound"})
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+        if not parts.path.startswith(BASE_PATH + "/"):
+            self._send_json(404, {"Code": "NotFound"})
+            return
+        endpoint = parts.path[len(BASE_PATH) + 1:]
+        status, payload = self.standin.handle(endpoint, parse_qs(parts.query), body if isinstance(body, dict) else {})
+        self._send_json(status, payload)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Dexcom Share API stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with HTTP 500")
+    parser.add_argument("--session-ttl", type=float, default=None, help="seconds before a session ID expires")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    config = StandinConfig(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                           session_ttl=args.session_ttl, trace_seed=args.seed)
+    standin = ShareStandin(config, host=args.host, port=args.port)
+    standin.start()
+    print(f"Share stand-in listening on {standin.base_url}")
+    standin.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
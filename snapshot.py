@@ -0,0 +1,110 @@
+# snapshot.py
+"""
+Warm-start snapshot: the last reading and the current Share session, kept in
+snapshot.json in the settings directory so a restart can show a title
+immediately and reuse the session instead of logging in again.
+
+The session ID is a short-lived credential, so the file is written owner-only
+(0600), atomically (temp file, fsync, rename), and the session is dropped on
+sign-out or when Dexcom rejects the account.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from settings import get_settings_dir, write_json_atomic
+
+SNAPSHOT_FILE = "snapshot.json"
+VERSION = 1
+
+
+class SnapshotCache:
+    def __init__(self, path=None, clock=time.time):
+        self.path = path or os.path.join(get_settings_dir(), SNAPSHOT_FILE)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._data = self._load()
+        self.stats = {"writes": 0, "unchanged": 0, "write_errors": 0}
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("version") == VERSION:
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error("Error loading snapshot: %s", e)
+        return {"version": VERSION, "reading": None, "session": None}
+
+    def _write(self, data):
+        # Caller holds the lock.
+        if data == self._data:
+            self.stats["unchanged"] += 1
+            return
+        try:
+            write_json_atomic(self.path, data)
+            self.stats["writes"] += 1
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            logging.error("Error saving snapshot: %s", e)
+        self._data = data
+
+    # --- last reading (the engine's cache interface) ---
+
+    def get(self, username=None):
+        """
+        Last reading as {'value', 'trend_arrow', 'timestamp'}, or None. With a
+        username, only a reading saved for that user is returned.
+        """
+        with self._lock:
+            reading = self._data.get("reading")
+        if not reading or (username is not None and reading.get("username") != username):
+            return None
+        return {k: reading.get(k) for k in ("value", "trend_arrow", "timestamp")}
+
+    def save(self, reading):
+        with self._lock:
+            self._write(dict(self._data, reading={
+                "username": reading.get("username"),
+                "value": reading.get("value"),
+                "trend_arrow": reading.get("trend_arrow"),
+                "timestamp": reading.get("timestamp"),
+            }))
+
+    # --- session ---
+
+    def session(self, username, region, max_age):
+        """
+        (account_id, session_id, age_seconds) of a stored session for this
+        account that is younger than max_age, else None.
+        """
+        with self._lock:
+            session = self._data.get("session")
+        if not session or session.get("username") != username or session.get("region") != region:
+            return None
+        age = self.clock() - float(session.get("issued_at", 0))
+        if not session.get("session_id") or not session.get("account_id") or not 0 <= age < max_age:
+            return None
+        return session["account_id"], session["session_id"], age
+
+    def save_session(self, username, region, account_id, session_id, age=0.0):
+        with self._lock:
+            self._write(dict(self._data, session={
+                "username": username,
+                "region": region,
+                "account_id": account_id,
+                "session_id": session_id,
+                "issued_at": self.clock() - (age or 0.0),
+            }))
+
+    def clear_session(self):
+        with self._lock:
+            self._write(dict(self._data, session=None))
+
+    def clear(self):
+        with self._lock:
+            self._write({"version": VERSION, "reading": None, "session": None})
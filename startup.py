@@ -0,0 +1,86 @@
+# startup.py
+"""
+Startup profiling. With DEXCOM_PROFILE_STARTUP=1 the app prints a
+"startup phase:" line to stderr as each startup phase ends. Add -X importtime
+to get per-module import cost in the same stream, then summarize both:
+
+    DEXCOM_PROFILE_STARTUP=1 python -X importtime main.py 2> startup.log
+    python startup.py startup.log
+
+Stdlib only and cheap to import, since it is imported first.
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+ENV_VAR = "DEXCOM_PROFILE_STARTUP"
+PHASE_PREFIX = "startup phase:"
+
+_t0 = time.perf_counter()
+_last = _t0
+_lock = threading.Lock()
+_seen = set()
+
+enabled = os.environ.get(ENV_VAR, "") not in ("", "0")
+
+
+def mark(phase):
+    """Record the end of a startup phase (once per name). No-op unless profiling is enabled."""
+    global _last
+    if not enabled:
+        return
+    with _lock:
+        if phase in _seen:
+            return
+        _seen.add(phase)
+        now = time.perf_counter()
+        step, _last = now - _last, now
+    print(f"{PHASE_PREFIX} {phase} +{step * 1000:.1f} ms t={(now - _t0) * 1000:.1f} ms "
+          f"[{threading.current_thread().name}]", file=sys.stderr, flush=True)
+
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def summarize(lines, top=15):
+    """Report text for a stderr log holding -X importtime lines and phase marks."""
+    imports, phases = [], []
+    for line in lines:
+        m = _IMPORT_LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), len(m.group(3)), m.group(4)
+            imports.append((cumulative_us, self_us, indent, name))
+        elif line.startswith(PHASE_PREFIX):
+            phases.append(line[len(PHASE_PREFIX):].strip())
+    out = []
+    if imports:
+        # Top-level imports are the least indented ones; their cumulative times add up.
+        outer = min(indent for _, _, indent, _ in imports)
+        top_level = sorted((i for i in imports if i[2] == outer), reverse=True)
+        out.append(f"imports: {sum(i[0] for i in top_level) / 1000:.1f} ms total")
+        out.append(f"  {'cumulative ms':>13}  {'self ms':>8}  module")
+        for cumulative_us, self_us, _, name in top_level[:top]:
+            out.append(f"  {cumulative_us / 1000:>13.1f}  {self_us / 1000:>8.1f}  {name}")
+        out.append("slowest modules by self time:")
+        for cumulative_us, self_us, _, name in sorted(imports, key=lambda i: -i[1])[:top]:
+            out.append(f"  {cumulative_us / 1000:>13.1f}  {self_us / 1000:>8.1f}  {name}")
+    if phases:
+        out.append("phases:")
+        out.extend(f"  {phase}" for phase in phases)
+    return "\n".join(out) if out else "no -X importtime lines or startup phases found"
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print(__doc__.strip())
+        return 2
+    with open(argv[0], "r", errors="replace") as f:
+        print(summarize(f.read().splitlines()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
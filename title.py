@@ -0,0 +1,62 @@
+# title.py
+"""
+Status item title pipeline. Every tick publishes a title, but most ticks
+render the same text as the last one; those are dropped here, before the
+main-thread hop and the status bar relayout. UI-free: the caller supplies
+how to dispatch onto the main thread and how to apply the title.
+"""
+import threading
+
+
+class TitlePipeline:
+    def __init__(self, apply, dispatch=None):
+        # apply(title) sets the status item title (on the main thread);
+        # dispatch(fn) runs fn there. Without dispatch, apply runs inline.
+        self._apply = apply
+        self._dispatch = dispatch
+        self._lock = threading.Lock()
+        self._last = None
+        # Submissions are numbered; one that reaches the main thread after a
+        # newer one has been applied is dropped (see _apply_in_order).
+        self._seq = 0
+        self._applied_seq = 0
+        self.stats = {"applied": 0, "skipped": 0, "out_of_order": 0}
+
+    def submit(self, title):
+        """
+        Forward `title` unless it equals the last one forwarded. A title can be
+        any hashable value, e.g. (text, colour) for an attributed title.
+        Returns True if it was dispatched.
+        """
+        with self._lock:
+            if title == self._last:
+                self.stats["skipped"] += 1
+                return False
+            self._last = title
+            self._seq += 1
+            seq = self._seq
+            self.stats["applied"] += 1
+        if self._dispatch is None:
+            self._apply_in_order(seq, title)
+        else:
+            self._dispatch(lambda: self._apply_in_order(seq, title))
+        return True
+
+    def _apply_in_order(self, seq, title):
+        # Two threads can submit back to back and their dispatches land in
+        # either order; the older title must not overwrite the newer one.
+        with self._lock:
+            if seq < self._applied_seq:
+                self.stats["out_of_order"] += 1
+                return
+            self._applied_seq = seq
+        self._apply(title)
+
+    def invalidate(self):
+        """Forget the last title, e.g. after the title was set some other way."""
+        with self._lock:
+            self._last = None
+
+    def current(self):
+        with self._lock:
+            return self._last